@@ -1,15 +1,28 @@
+import os
 import sys
+import asyncio
 from colorama import Fore
 
 from src.api import RedAPI, OpsAPI
 from src.args import parse_args
 from src.config import Config
-from src.scanner import scan_torrent_directory, scan_torrent_file
+from src.scanner import (
+  create_torrent_directory_watcher,
+  scan_torrent_directory,
+  scan_torrent_directory_async,
+  scan_torrent_file,
+)
 from src.webserver import run_webserver
 from src.injection import Injection
+from src.response_cache import ResponseCache
+from src.probe_stats import SourceFlagStats
+from src.metrics import set_enabled, write_textfile
 
 
 def cli_entrypoint(args):
+  # Metrics cost next to nothing while disabled, so CLI runs only collect them when they'll be written out
+  set_enabled(bool(args.metrics_file))
+
   try:
     # using input_file means this is probably running as a script and extra printing wouldn't be appreciated
     should_print = args.input_directory or args.server
@@ -20,22 +33,148 @@ def cli_entrypoint(args):
     else:
       injector = None
 
-    red_api, ops_api = command_log_wrapper("Verifying API keys:", should_print, lambda: __verify_api_keys(config))
+    state_directory = os.path.join(args.output_directory, ".fertilizer")
+    response_cache = __build_response_cache(config, args, state_directory)
+    # Every process pointed at the same directory shares each tracker's rate limit
+    rate_limit_directory = config.rate_limit_directory or state_directory
+    red_api, ops_api = command_log_wrapper(
+      "Verifying API keys:", should_print, lambda: __verify_api_keys(config, response_cache, rate_limit_directory)
+    )
+    index_path = config.index_path or os.path.join(state_directory, "index.db")
+    probe_stats = SourceFlagStats(os.path.join(state_directory, "probe_stats.db"))
 
     if args.server:
-      run_webserver(args.input_directory, args.output_directory, red_api, ops_api, injector, port=config.server_port)
+      run_webserver(
+        args.input_directory,
+        args.output_directory,
+        red_api,
+        ops_api,
+        injector,
+        port=config.server_port,
+        index_path=index_path,
+        probe_stats=probe_stats,
+        webhook_workers=config.webhook_workers,
+        threads=config.server_threads,
+        keep_alive_timeout=config.server_keep_alive_timeout,
+        drain_timeout=config.server_drain_timeout,
+        index_false_positive_rate=config.index_false_positive_rate,
+      )
+    elif args.watch:
+      watcher = create_torrent_directory_watcher(
+        args.input_directory,
+        args.output_directory,
+        red_api,
+        ops_api,
+        injector,
+        index_path,
+        probe_stats,
+        recursive=args.recursive,
+        include=args.include,
+        exclude=args.exclude,
+        index_false_positive_rate=config.index_false_positive_rate,
+      )
+      print(f"Watching {args.input_directory} for new .torrent files")
+      watcher.run()
     elif args.input_file:
-      print(scan_torrent_file(args.input_file, args.output_directory, red_api, ops_api, injector))
+      print(
+        scan_torrent_file(
+          args.input_file,
+          args.output_directory,
+          red_api,
+          ops_api,
+          injector,
+          index_path,
+          probe_stats=probe_stats,
+          index_false_positive_rate=config.index_false_positive_rate,
+        )
+      )
     elif args.input_directory:
-      print(scan_torrent_directory(args.input_directory, args.output_directory, red_api, ops_api, injector))
+      scan_options = {
+        "index_path": index_path,
+        "index_workers": config.index_workers,
+        "recursive": args.recursive,
+        "include": args.include,
+        "exclude": args.exclude,
+        "modified_after": args.modified_after,
+        "journal_path": os.path.join(state_directory, "journal.jsonl"),
+        "resume": args.resume,
+        # Rescanning a torrent that wasn't found is pointless while its cached miss is still fresh
+        "not_found_ttl": config.api_cache_miss_ttl_days * 86400,
+        "probe_stats": probe_stats,
+        "inject_workers": config.inject_workers,
+        "index_false_positive_rate": config.index_false_positive_rate,
+      }
+
+      if args.asyncio:
+        report = asyncio.run(
+          __scan_torrent_directory_async(
+            args.input_directory,
+            args.output_directory,
+            red_api,
+            ops_api,
+            injector,
+            max_concurrent_scans=config.scan_queue_size,
+            **scan_options,
+          )
+        )
+      else:
+        report = scan_torrent_directory(
+          args.input_directory,
+          args.output_directory,
+          red_api,
+          ops_api,
+          injector,
+          lookup_workers=config.lookup_workers,
+          queue_size=config.scan_queue_size,
+          **scan_options,
+        )
+
+      print(report)
   except Exception as e:
     print(f"{Fore.RED}{str(e)}{Fore.RESET}")
     exit(1)
-
-
-def __verify_api_keys(config):
-  red_api = RedAPI(config.red_key)
-  ops_api = OpsAPI(config.ops_key)
+  finally:
+    if args.metrics_file:
+      write_textfile(args.metrics_file)
+
+
+async def __scan_torrent_directory_async(input_directory, output_directory, red_api, ops_api, injector, **kwargs):
+  async with red_api.asynchronous() as async_red_api, ops_api.asynchronous() as async_ops_api:
+    return await scan_torrent_directory_async(
+      input_directory, output_directory, async_red_api, async_ops_api, injector, **kwargs
+    )
+
+
+def __build_response_cache(config, args, state_directory):
+  if args.no_cache:
+    return None
+
+  response_cache = ResponseCache(
+    os.path.join(state_directory, "api_cache.db"),
+    hit_ttl=config.api_cache_hit_ttl_days * 86400,
+    miss_ttl=config.api_cache_miss_ttl_days * 86400,
+    max_entries=config.api_cache_max_entries,
+  )
+
+  if args.purge_cache:
+    response_cache.purge()
+
+  return response_cache
+
+
+def __verify_api_keys(config, response_cache=None, rate_limit_directory=None):
+  red_api = RedAPI(
+    config.red_key,
+    response_cache=response_cache,
+    burst=config.api_rate_limit_burst,
+    rate_limit_path=os.path.join(rate_limit_directory, "red.ratelimit") if rate_limit_directory else None,
+  )
+  ops_api = OpsAPI(
+    config.ops_key,
+    response_cache=response_cache,
+    burst=config.api_rate_limit_burst,
+    rate_limit_path=os.path.join(rate_limit_directory, "ops.ratelimit") if rate_limit_directory else None,
+  )
 
   # This will perform a lookup with the API and raise if there was a failure.
   # Also caches the announce URL for future use which is a nice bonus
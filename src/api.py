@@ -1,10 +1,28 @@
 from math import exp
 from time import time, sleep
+from email.utils import parsedate_to_datetime
 import json
+import asyncio
+import threading
 
+import httpx
 import requests
 
-from .errors import handle_error, AuthenticationError
+from .metrics import API_CACHE_LOOKUPS, API_RATE_LIMIT_WAIT_SECONDS, API_REQUEST_SECONDS, API_REQUESTS, API_RETRIES
+from .errors import handle_error, AuthenticationError, CircuitOpenError, TrackerUnavailableError
+from .rate_limiter import TokenBucket, SharedTokenBucket
+from .circuit_breaker import CircuitBreaker
+from .scheduler import INTERACTIVE, PriorityScheduler
+
+# How long to back off when a tracker rate limits us without saying for how long
+DEFAULT_RETRY_AFTER = 10
+# How often an asyncio caller checks back for a rate limit token that's being held for another priority
+ASYNC_POLL_INTERVAL = 0.05
+
+# What the shared request steps ask their front-end to do next (see `GazelleAPI._request_steps`)
+SLEEP = "sleep"
+ACQUIRE = "acquire"
+SEND = "send"
 
 
 class GazelleAPI:
@@ -12,18 +30,38 @@ class GazelleAPI:
   Methods for interacting with Gazelle-based trackers like RED and OPS.
   """
 
-  def __init__(self, site_url, tracker_url, auth_header, rate_limit):
-    self._s = requests.session()
-    self._s.headers.update(auth_header)
-    self._rate_limit = rate_limit
+  def __init__(
+    self,
+    site_url,
+    tracker_url,
+    auth_header,
+    rate_limit,
+    response_cache=None,
+    rate_limit_burst=1,
+    rate_limit_path=None,
+  ):
+    # `requests` sessions aren't safe to share between threads, so each thread gets its own
+    self._auth_header = auth_header
+    self._thread_local = threading.local()
+
+    # With a `rate_limit_path`, every process using the same file shares one request budget
+    if rate_limit_path:
+      self._rate_limiter = SharedTokenBucket.from_interval(rate_limit_path, rate_limit, rate_limit_burst)
+    else:
+      self._rate_limiter = TokenBucket.from_interval(rate_limit, rate_limit_burst)
+
+    self._scheduler = PriorityScheduler(self._rate_limiter)
+    self._circuit_breaker = CircuitBreaker()
     self._timeout = 15
-    self._last_used = 0
 
-    self._max_retries = 20
+    # Public so callers that schedule their own retries (like directory scans) can honor the same limit
+    self.max_retries = 20
     self._max_retry_time = 600
     self._retry_wait_time = lambda x: min(int(exp(x)), self._max_retry_time)
 
     self._announce_url = None
+    self._announce_url_lock = threading.Lock()
+    self._response_cache = response_cache
     self.sitename = self.__class__.__name__
     self.site_url = site_url
     self.tracker_url = tracker_url
@@ -33,85 +71,303 @@ class GazelleAPI:
     """
     Returns the account information of the user. Useful for fetching the passkey for the announce URL.
     """
+    return self.__run(self._account_info_steps())
 
-    r = self.__get("index")
-    if r["status"] != "success":
-      raise AuthenticationError(r["error"])
-    return r
+  def find_torrent(self, torrent_hash: str, should_retry: bool = True, priority: int = INTERACTIVE) -> dict:
+    """
+    Looks up a torrent by infohash.
 
-  def find_torrent(self, torrent_hash: str) -> dict:
-    return self.__get("torrent", hash=torrent_hash)
+    With `should_retry` unset, a failed request raises `TrackerUnavailableError` straight away rather than
+    sleeping between retries, so the caller can schedule its own retry and get on with other work.
+    `priority` decides who goes first when several requests are waiting on the rate limit (see `PriorityScheduler`).
+    """
+    return self.__run(self._find_torrent_steps(torrent_hash, should_retry, priority))
 
   @property
   def announce_url(self) -> str:
     if self._announce_url is None:
-      self._announce_url = self.__get_announce_url()
+      with self._announce_url_lock:
+        # Only the first of several concurrent callers fetches it
+        return self.__run(self._announce_url_steps())
 
     return self._announce_url
 
-  def __get(self, action, **params):
-    current_retries = 1
+  def asynchronous(self, transport: httpx.AsyncBaseTransport | None = None) -> "AsyncGazelleAPI":
+    """
+    Returns an asyncio front-end that shares this API's rate limit, circuit breaker and response cache.
+    `transport` replaces the network, e.g. with an `httpx.MockTransport` in tests.
+    """
+    client = httpx.AsyncClient(headers=self._auth_header, timeout=self._timeout, transport=transport)
+    return AsyncGazelleAPI(self, client)
 
-    while current_retries <= self._max_retries:
-      now = time()
-      if (now - self._last_used) > self._rate_limit:
-        self._last_used = now
-        params["action"] = action
-
-        try:
-          response = self._s.get(self.api_url, params=params, timeout=self._timeout)
-
-          return json.loads(response.text)
-        except requests.exceptions.Timeout as e:
-          err = "Request timed out", e
-        except requests.exceptions.ConnectionError as e:
-          err = "Unable to connect", e
-        except requests.exceptions.RequestException as e:
-          err = "Request failed", f"{type(e).__name__}: {e}"
-        except json.JSONDecodeError as e:
-          err = "JSON decoding of response failed", e
-
-        handle_error(
-          description=err[0],
-          exception_details=err[1],
-          wait_time=self._retry_wait_time(current_retries),
-          extra_description=f" (attempt {current_retries}/{self._max_retries})",
-        )
-        current_retries += 1
-      else:
-        sleep(0.2)
+  # The steps below are the request logic shared by this class and `AsyncGazelleAPI`. They're generators that
+  # yield what has to happen next, which each front-end does in its own way, and return the result:
+  #
+  #   (SLEEP, seconds): wait for that long.
+  #   (ACQUIRE, scheduler, priority): wait for a token from the `PriorityScheduler`.
+  #   (SEND, params): make the request, then send back `(response, failure)`. `response` is a
+  #     `(status_code, retry_after_header, text)` tuple, or `None` with a `(description, details)` failure.
 
-    handle_error(description="Maximum number of retries reached", should_raise=True)
+  def _account_info_steps(self):
+    r = yield from self._request_steps("index")
+    if r["status"] != "success":
+      raise AuthenticationError(r["error"])
+    return r
+
+  def _find_torrent_steps(self, torrent_hash, should_retry=True, priority=INTERACTIVE):
+    if self._response_cache:
+      cached_response = self._response_cache.get(self.sitename, torrent_hash)
+      API_CACHE_LOOKUPS.labels(self.sitename, "miss" if cached_response is None else "hit").inc()
+      if cached_response is not None:
+        return cached_response
+
+    response = yield from self._request_steps("torrent", should_retry, priority, hash=torrent_hash)
+
+    if self._response_cache:
+      self._response_cache.put(self.sitename, torrent_hash, response)
+
+    return response
+
+  def _announce_url_steps(self):
+    if self._announce_url is not None:
+      return self._announce_url
 
-  def __get_announce_url(self):
     try:
-      account_info = self.get_account_info()
+      account_info = yield from self._account_info_steps()
     except AuthenticationError as e:
       handle_error(description=f"Authentication to {self.sitename} failed", exception_details=e, should_raise=True)
 
     passkey = account_info["response"]["passkey"]
-    return f"{self.tracker_url}/{passkey}/announce"
+    self._announce_url = f"{self.tracker_url}/{passkey}/announce"
+    return self._announce_url
+
+  def _request_steps(self, action, should_retry=True, priority=INTERACTIVE, **params):
+    current_retries = 1
+
+    while current_retries <= self.max_retries:
+      circuit_wait_time = self._circuit_breaker.before_request()
+      if circuit_wait_time:
+        if not should_retry:
+          raise CircuitOpenError(f"{self.sitename} is unavailable after repeated failures", circuit_wait_time)
+
+        yield SLEEP, circuit_wait_time
+        continue
+
+      with API_RATE_LIMIT_WAIT_SECONDS.labels(self.sitename).time():
+        yield ACQUIRE, self._scheduler, priority
+
+      with API_REQUEST_SECONDS.labels(self.sitename, action).time():
+        http_response, failure = yield SEND, {**params, "action": action}
+
+      response, err, retry_after = self.__interpret_response(http_response, failure)
+      outcome = "success" if err is None else "rate_limited" if retry_after is not None else "error"
+      API_REQUESTS.labels(self.sitename, action, outcome).inc()
+      current_retries += 1
+
+      if err is None:
+        self._circuit_breaker.record_success()
+        return response
+
+      if retry_after is not None:
+        # Being rate limited means the tracker is up. The limiter was already paused so we just go again.
+        self._circuit_breaker.record_success()
+        API_RETRIES.labels(self.sitename, action).inc()
+        continue
+
+      self._circuit_breaker.record_failure()
+      wait_time = self._retry_wait_time(self._circuit_breaker.consecutive_failures)
+
+      if not should_retry:
+        handle_error(description=err[0], exception_details=err[1], wait_time=wait_time, should_sleep=False)
+        raise TrackerUnavailableError(f"{err[0]} on {self.sitename}", wait_time)
+
+      handle_error(
+        description=err[0],
+        exception_details=err[1],
+        wait_time=wait_time,
+        extra_description=f" (attempt {current_retries - 1}/{self.max_retries})",
+        should_sleep=False,
+      )
+      API_RETRIES.labels(self.sitename, action).inc()
+      yield SLEEP, wait_time
+
+    handle_error(description="Maximum number of retries reached", should_raise=True)
+
+  def __run(self, steps):
+    # Drives shared request steps with blocking calls
+    result = None
+
+    try:
+      while True:
+        step = steps.send(result)
+
+        if step[0] == SLEEP:
+          result = sleep(step[1])
+        elif step[0] == ACQUIRE:
+          result = step[1].acquire(step[2])
+        else:
+          result = self.__send(step[1])
+    except StopIteration as e:
+      return e.value
+
+  def __send(self, params):
+    try:
+      response = self._session.get(self.api_url, params=params, timeout=self._timeout)
+      return (response.status_code, response.headers.get("Retry-After"), response.text), None
+    except requests.exceptions.Timeout as e:
+      return None, ("Request timed out", e)
+    except requests.exceptions.ConnectionError as e:
+      return None, ("Unable to connect", e)
+    except requests.exceptions.RequestException as e:
+      return None, ("Request failed", f"{type(e).__name__}: {e}")
+
+  def __interpret_response(self, http_response, failure):
+    # Returns the decoded response (or `None`), a `(description, details)` tuple if the request failed (or `None`),
+    # and how many seconds the tracker asked us to back off for (or `None`). If it did, the rate limiter is paused.
+    if failure is not None:
+      return None, failure, None
+
+    status_code, retry_after_header, text = http_response
+
+    if status_code == 429:
+      retry_after = self.__parse_retry_after(retry_after_header)
+      self._rate_limiter.pause(retry_after)
+      return None, ("Rate limited", f"Backing off for {retry_after} seconds"), retry_after
+
+    try:
+      return json.loads(text), None, None
+    except json.JSONDecodeError as e:
+      return None, ("JSON decoding of response failed", e), None
+
+  @property
+  def _session(self) -> requests.Session:
+    session = getattr(self._thread_local, "session", None)
+
+    if session is None:
+      session = requests.session()
+      session.headers.update(self._auth_header)
+      self._thread_local.session = session
+
+    return session
+
+  def __parse_retry_after(self, header):
+    # `Retry-After` is either a number of seconds or an HTTP date
+    if header is None:
+      return DEFAULT_RETRY_AFTER
+
+    try:
+      return max(0, float(header))
+    except ValueError:
+      pass
+
+    try:
+      return max(0, parsedate_to_datetime(header).timestamp() - time())
+    except (TypeError, ValueError):
+      return DEFAULT_RETRY_AFTER
+
+
+class AsyncGazelleAPI:
+  """
+  asyncio front-end for a `GazelleAPI`, with its `find_torrent`, `get_account_info` and `announce_url` calls as coroutines.
+
+  Requests go through the wrapped API's retry, circuit breaker, rate limit and response cache logic, so both
+  front-ends draw on one request budget. They're made with an `httpx.AsyncClient` that keeps connections open
+  between requests, and nothing ever blocks the event loop. Created with `GazelleAPI.asynchronous`, and best
+  used as an async context manager so the client gets closed.
+  """
+
+  def __init__(self, api: GazelleAPI, client: httpx.AsyncClient):
+    self.api = api
+    self.sitename = api.sitename
+    self.site_url = api.site_url
+    self._client = client
+    self._acquire_lock = asyncio.Lock()
+
+  async def __aenter__(self) -> "AsyncGazelleAPI":
+    return self
+
+  async def __aexit__(self, *_args):
+    await self.aclose()
+
+  async def aclose(self):
+    await self._client.aclose()
+
+  async def get_account_info(self) -> dict:
+    """
+    Returns the account information of the user. Useful for fetching the passkey for the announce URL.
+    """
+    return await self.__run(self.api._account_info_steps())
+
+  async def find_torrent(self, torrent_hash: str, should_retry: bool = True, priority: int = INTERACTIVE) -> dict:
+    """
+    Looks up a torrent by infohash. See `GazelleAPI.find_torrent`.
+    """
+    return await self.__run(self.api._find_torrent_steps(torrent_hash, should_retry, priority))
+
+  async def announce_url(self) -> str:
+    return await self.__run(self.api._announce_url_steps())
+
+  async def __run(self, steps):
+    # Drives shared request steps without blocking the event loop
+    result = None
+
+    try:
+      while True:
+        step = steps.send(result)
+
+        if step[0] == SLEEP:
+          result = await asyncio.sleep(step[1])
+        elif step[0] == ACQUIRE:
+          result = await self.__acquire(step[1], step[2])
+        else:
+          result = await self.__send(step[1])
+    except StopIteration as e:
+      return e.value
+
+  async def __acquire(self, scheduler, priority):
+    # Only the coroutine at the front of the line polls the scheduler, so thousands of queued lookups don't all
+    # wake up for every token. The scheduler still lets requests of a higher priority from other threads go first.
+    async with self._acquire_lock:
+      while not scheduler.try_acquire(priority):
+        await asyncio.sleep(scheduler.time_until_available() or ASYNC_POLL_INTERVAL)
+
+  async def __send(self, params):
+    try:
+      response = await self._client.get(self.api.api_url, params=params)
+      return (response.status_code, response.headers.get("Retry-After"), response.text), None
+    except httpx.TimeoutException as e:
+      return None, ("Request timed out", e)
+    except httpx.NetworkError as e:
+      return None, ("Unable to connect", e)
+    except httpx.HTTPError as e:
+      return None, ("Request failed", f"{type(e).__name__}: {e}")
 
 
 class OpsAPI(GazelleAPI):
-  def __init__(self, api_key, delay_in_seconds=2):
+  def __init__(self, api_key, delay_in_seconds=2, response_cache=None, burst=1, rate_limit_path=None):
     super().__init__(
       site_url="https://orpheus.network",
       tracker_url="https://home.opsfet.ch",
       auth_header={"Authorization": f"token {api_key}"},
       rate_limit=delay_in_seconds,
+      response_cache=response_cache,
+      rate_limit_burst=burst,
+      rate_limit_path=rate_limit_path,
     )
 
     self.sitename = "OPS"
 
 
 class RedAPI(GazelleAPI):
-  def __init__(self, api_key, delay_in_seconds=2):
+  def __init__(self, api_key, delay_in_seconds=2, response_cache=None, burst=1, rate_limit_path=None):
     super().__init__(
       site_url="https://redacted.ch",
       tracker_url="https://flacsfor.me",
       auth_header={"Authorization": api_key},
       rate_limit=delay_in_seconds,
+      response_cache=response_cache,
+      rate_limit_burst=burst,
+      rate_limit_path=rate_limit_path,
     )
 
     self.sitename = "RED"
@@ -1,5 +1,6 @@
 import sys
 import argparse
+from datetime import datetime
 
 
 def parse_args(args=None):
@@ -55,6 +56,75 @@ def parse_args(args=None):
     default=False,
   )
 
+  options.add_argument(
+    "-w",
+    "--watch",
+    action="store_true",
+    help="keeps running and scans .torrent files as they're added to the input directory. Requires -i/--input-directory",
+    default=False,
+  )
+
+  options.add_argument(
+    "-r",
+    "--recursive",
+    action="store_true",
+    help="also scan subdirectories of the input directory (e.g. qBittorrent's BT_backup)",
+    default=False,
+  )
+  options.add_argument(
+    "--include",
+    action="append",
+    metavar="GLOB",
+    help="only scan input files whose path relative to the input directory matches this glob. Can be repeated",
+  )
+  options.add_argument(
+    "--exclude",
+    action="append",
+    metavar="GLOB",
+    help="skip input files whose path relative to the input directory matches this glob. Can be repeated",
+  )
+  options.add_argument(
+    "--modified-after",
+    type=__parse_timestamp,
+    metavar="DATE",
+    help="only scan input files modified after this ISO 8601 date (e.g. 2024-01-31)",
+  )
+
+  options.add_argument(
+    "--resume",
+    "--incremental",
+    dest="resume",
+    action="store_true",
+    help="skip input files whose outcome was recorded by a previous scan and that haven't changed since",
+    default=False,
+  )
+
+  options.add_argument(
+    "--asyncio",
+    action="store_true",
+    help="look up the input directory's torrents from a single asyncio event loop instead of worker threads",
+    default=False,
+  )
+
+  options.add_argument(
+    "--no-cache",
+    action="store_true",
+    help="bypass the tracker API response cache",
+    default=False,
+  )
+  options.add_argument(
+    "--purge-cache",
+    action="store_true",
+    help="empty the tracker API response cache before running",
+    default=False,
+  )
+  options.add_argument(
+    "--metrics-file",
+    type=str,
+    help="write Prometheus metrics to this file when done, for node_exporter's textfile collector",
+    default=None,
+  )
+
   config.add_argument(
     "-c",
     "--config-file",
@@ -67,5 +137,18 @@ def parse_args(args=None):
 
   if parsed.server and not parsed.input_directory:
     parser.error("--server requires --input-directory")
+  if parsed.watch and not parsed.input_directory:
+    parser.error("--watch requires --input-directory")
+  if parsed.watch and parsed.server:
+    parser.error("--watch can't be combined with --server")
+  if parsed.asyncio and (parsed.server or parsed.watch or not parsed.input_directory):
+    parser.error("--asyncio only applies to one-off --input-directory scans")
 
   return parsed
+
+
+def __parse_timestamp(value):
+  try:
+    return datetime.fromisoformat(value).timestamp()
+  except ValueError:
+    raise argparse.ArgumentTypeError(f"invalid date: '{value}'")
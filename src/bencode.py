@@ -0,0 +1,272 @@
+import re
+from collections.abc import Mapping
+
+from .errors import TorrentDecodingError, NonCanonicalBencodeError
+
+# Low-level helpers for walking raw bencoded bytes without decoding them.
+#
+# Everything in here works on byte offsets into the original buffer so callers can
+# slice (or `memoryview`) exactly the region they care about. Strings are skipped
+# via their length prefix, which means huge values like `pieces` cost nothing to step over.
+#
+# When `strict` is set, the walker also verifies the data is in the canonical form that
+# `bencoder.encode` would produce (sorted unique dict keys, no leading zeros, no `-0`).
+# That guarantee is what lets us hash raw spans instead of re-encoding decoded data.
+
+_INT = ord("i")
+_LIST = ord("l")
+_DICT = ord("d")
+_END = ord("e")
+
+_CANONICAL_INTEGER = re.compile(rb"0|-?[1-9][0-9]*")
+_LENIENT_INTEGER = re.compile(rb"-?[0-9]+")
+_CANONICAL_LENGTH = re.compile(rb"0|[1-9][0-9]*")
+_LENIENT_LENGTH = re.compile(rb"[0-9]+")
+
+
+def string_span(buf: bytes, pos: int, strict: bool = True) -> tuple[int, int]:
+  """
+  Returns the `(start, end)` offsets of the contents of the bencoded string at `pos`.
+  """
+  colon = buf.find(b":", pos)
+  if colon == -1:
+    raise TorrentDecodingError("Unterminated string length in bencoded data")
+
+  length = buf[pos:colon]
+  if not (_CANONICAL_LENGTH if strict else _LENIENT_LENGTH).fullmatch(length):
+    __raise_for_token(length, strict, _LENIENT_LENGTH)
+
+  start = colon + 1
+  end = start + int(length)
+  if end > len(buf):
+    raise TorrentDecodingError("Bencoded string runs past the end of the data")
+
+  return start, end
+
+
+def skip_value(buf: bytes, pos: int, strict: bool = True) -> int:
+  """
+  Returns the offset just past the bencoded value that starts at `pos`.
+  """
+  token = __peek(buf, pos)
+
+  if token == _INT:
+    end = buf.find(b"e", pos + 1)
+    if end == -1:
+      raise TorrentDecodingError("Unterminated integer in bencoded data")
+
+    digits = buf[pos + 1 : end]
+    if not (_CANONICAL_INTEGER if strict else _LENIENT_INTEGER).fullmatch(digits):
+      __raise_for_token(digits, strict, _LENIENT_INTEGER)
+
+    return end + 1
+
+  if token == _LIST:
+    pos += 1
+    while __peek(buf, pos) != _END:
+      pos = skip_value(buf, pos, strict)
+
+    return pos + 1
+
+  if token == _DICT:
+    end = pos + 1
+    for _key, _value_start, value_end in iter_dict_items(buf, pos, strict):
+      end = value_end
+
+    return end + 1
+
+  return string_span(buf, pos, strict)[1]
+
+
+def iter_dict_items(buf: bytes, pos: int, strict: bool = True):
+  """
+  Yields `(key, value_start, value_end)` for each entry of the bencoded dict at `pos`.
+  The dict's closing `e` sits at the last `value_end` (or at `pos + 1` if the dict is empty).
+  """
+  if __peek(buf, pos) != _DICT:
+    raise TorrentDecodingError("Expected a bencoded dict")
+
+  pos += 1
+  previous_key = None
+
+  while __peek(buf, pos) != _END:
+    key_start, key_end = string_span(buf, pos, strict)
+    key = buf[key_start:key_end]
+
+    if strict and previous_key is not None and key <= previous_key:
+      raise NonCanonicalBencodeError("Bencoded dict keys are not sorted and unique")
+
+    value_end = skip_value(buf, key_end, strict)
+    yield key, key_end, value_end
+
+    previous_key = key
+    pos = value_end
+
+
+def find_info_span(buf: bytes) -> tuple[int, int]:
+  """
+  Returns the `(start, end)` offsets of the canonically encoded `info` dict of a raw .torrent file.
+
+  Raises:
+    `TorrentDecodingError`: if the data is malformed or has no `info` dict.
+    `NonCanonicalBencodeError`: if hashing the raw span wouldn't match re-encoding the decoded data.
+  """
+  if __peek(buf, 0) != _DICT:
+    raise TorrentDecodingError("Expected a bencoded dict")
+
+  pos = 1
+  info_span = None
+  previous_key = None
+
+  # Only the `info` dict has to be canonical for its hash to be correct, but the top-level
+  # keys still have to be unique so we know which `info` a full decode would have kept.
+  while __peek(buf, pos) != _END:
+    key_start, key_end = string_span(buf, pos, strict=False)
+    key = buf[key_start:key_end]
+
+    if previous_key is not None and key <= previous_key:
+      raise NonCanonicalBencodeError("Bencoded dict keys are not sorted and unique")
+
+    is_info = key == b"info"
+    if is_info and __peek(buf, key_end) != _DICT:
+      raise TorrentDecodingError("Torrent 'info' value is not a dict")
+
+    pos = skip_value(buf, key_end, strict=is_info)
+    if is_info:
+      info_span = (key_end, pos)
+
+    previous_key = key
+
+  if pos + 1 != len(buf):
+    raise TorrentDecodingError("Trailing data after bencoded dict")
+  if info_span is None:
+    raise TorrentDecodingError("Torrent data does not contain 'info' key")
+
+  return info_span
+
+
+def find_dict_entry_span(buf: bytes, pos: int, key: bytes) -> tuple[int, int]:
+  """
+  Returns the `(start, end)` offsets of the whole `key`/value entry in the canonical dict at `pos`.
+  If the key is absent, both offsets point to where the entry would be inserted to keep keys sorted.
+  """
+  entry_start = pos + 1
+
+  for current_key, _value_start, value_end in iter_dict_items(buf, pos):
+    if current_key == key:
+      return entry_start, value_end
+    if current_key > key:
+      break
+
+    entry_start = value_end
+
+  return entry_start, entry_start
+
+
+def splice_dict(buf: bytes, pos: int, replacements: dict) -> list:
+  """
+  Returns the canonical dict at `pos` as a list of byte segments with `replacements` applied, without
+  copying the entries that are left alone. `replacements` maps each key to the list of segments of its
+  new bencoded value. Existing keys have their values swapped out and missing keys are inserted in sorted order.
+  """
+  view = memoryview(buf)
+  pending_keys = sorted(replacements, reverse=True)
+  segments = [b"d"]
+  untouched_start = entry_start = pos + 1
+
+  for key, _value_start, value_end in iter_dict_items(buf, pos):
+    if pending_keys and pending_keys[-1] <= key:
+      segments.append(view[untouched_start:entry_start])
+
+      while pending_keys and pending_keys[-1] <= key:
+        new_key = pending_keys.pop()
+        segments.extend([b"%d:%s" % (len(new_key), new_key), *replacements[new_key]])
+
+      # A replaced entry is skipped, an inserted one leaves the current entry in place
+      untouched_start = value_end if new_key == key else entry_start
+
+    entry_start = value_end
+
+  segments.append(view[untouched_start:entry_start])
+  for new_key in reversed(pending_keys):
+    segments.extend([b"%d:%s" % (len(new_key), new_key), *replacements[new_key]])
+
+  segments.append(b"e")
+  return segments
+
+
+def decode_value(buf: bytes, pos: int):
+  """
+  Decodes the bencoded value at `pos`. Dicts are returned as `LazyBencodeDict` proxies
+  so their contents are only parsed once they're accessed.
+  """
+  token = __peek(buf, pos)
+
+  if token == _INT:
+    end = skip_value(buf, pos, strict=False)
+    return int(buf[pos + 1 : end - 1])
+
+  if token == _LIST:
+    items = []
+    pos += 1
+    while __peek(buf, pos) != _END:
+      items.append(decode_value(buf, pos))
+      pos = skip_value(buf, pos, strict=False)
+
+    return items
+
+  if token == _DICT:
+    return LazyBencodeDict(buf, pos)
+
+  start, end = string_span(buf, pos, strict=False)
+  return buf[start:end]
+
+
+class LazyBencodeDict(Mapping):
+  """
+  Read-only view of a bencoded dict that only decodes the values that are looked up.
+  Values that are never accessed (like `pieces` or the `files` list) are skipped over by
+  their length prefix and never materialized.
+  """
+
+  def __init__(self, buf: bytes, pos: int = 0):
+    self._buf = buf
+    self._values = {}
+    self._spans = {}
+    self.end = pos + 1
+
+    # Walking the keys up front also validates the structure, just like a full decode would
+    for key, value_start, value_end in iter_dict_items(buf, pos, strict=False):
+      self._spans[key] = value_start
+      self.end = value_end
+
+    self.end += 1
+
+  def __getitem__(self, key):
+    if key not in self._values:
+      self._values[key] = decode_value(self._buf, self._spans[key])
+
+    return self._values[key]
+
+  def __iter__(self):
+    return iter(self._spans)
+
+  def __len__(self):
+    return len(self._spans)
+
+  def __repr__(self):
+    return f"LazyBencodeDict({list(self._spans)!r})"
+
+
+def __peek(buf: bytes, pos: int) -> int:
+  try:
+    return buf[pos]
+  except IndexError:
+    raise TorrentDecodingError("Unexpected end of bencoded data")
+
+
+def __raise_for_token(token: bytes, strict: bool, lenient_pattern: re.Pattern):
+  if strict and lenient_pattern.fullmatch(token):
+    raise NonCanonicalBencodeError(f"Non-canonical bencoded number: {token!r}")
+
+  raise TorrentDecodingError(f"Invalid bencoded number: {token!r}")
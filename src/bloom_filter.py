@@ -0,0 +1,98 @@
+import os
+import math
+import struct
+import tempfile
+
+# Magic, format version, false positive rate, capacity, count, bit count and hash count
+HEADER = struct.Struct("<4sHdQQQH")
+MAGIC = b"FBLM"
+FORMAT_VERSION = 1
+
+
+class BloomFilter:
+  """
+  Probabilistic set of infohashes. A negative answer is always right, while a positive one is wrong
+  at most `false_positive_rate` of the time as long as no more than `capacity` infohashes are added.
+
+  Infohashes are already uniformly distributed SHA-1 digests, so bit positions are derived straight
+  from their bytes with double hashing rather than by hashing them again.
+  """
+
+  def __init__(self, capacity: int, false_positive_rate: float = 0.01):
+    self.capacity = max(capacity, 1)
+    self.false_positive_rate = false_positive_rate
+    self.count = 0
+    self.bit_count = max(math.ceil(-self.capacity * math.log(false_positive_rate) / math.log(2) ** 2), 8)
+    self.hash_count = max(round(self.bit_count / self.capacity * math.log(2)), 1)
+    self._bits = bytearray((self.bit_count + 7) // 8)
+
+  @classmethod
+  def load(cls, path: str) -> "BloomFilter | None":
+    """
+    Reads a filter written by `save`. Returns `None` if the file is missing, truncated or from another format version.
+    """
+    try:
+      with open(path, "rb") as f:
+        data = f.read()
+
+      magic, version, false_positive_rate, capacity, count, bit_count, hash_count = HEADER.unpack_from(data)
+    except (OSError, struct.error):
+      return None
+
+    bits = data[HEADER.size :]
+    if magic != MAGIC or version != FORMAT_VERSION or len(bits) != (bit_count + 7) // 8:
+      return None
+
+    bloom_filter = cls.__new__(cls)
+    bloom_filter.capacity = capacity
+    bloom_filter.false_positive_rate = false_positive_rate
+    bloom_filter.count = count
+    bloom_filter.bit_count = bit_count
+    bloom_filter.hash_count = hash_count
+    bloom_filter._bits = bytearray(bits)
+
+    return bloom_filter
+
+  def save(self, path: str):
+    header = HEADER.pack(
+      MAGIC,
+      FORMAT_VERSION,
+      self.false_positive_rate,
+      self.capacity,
+      self.count,
+      self.bit_count,
+      self.hash_count,
+    )
+    # A unique temporary file, so concurrent saves of the same filter can't write over each other's
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+
+    try:
+      with os.fdopen(fd, "wb") as f:
+        f.write(header)
+        f.write(self._bits)
+
+      os.replace(temp_path, path)
+    except BaseException:
+      os.unlink(temp_path)
+      raise
+
+  def add(self, infohash: str):
+    for position in self.__positions(bytes.fromhex(infohash)):
+      self._bits[position >> 3] |= 1 << (position & 7)
+
+    self.count += 1
+
+  def __contains__(self, infohash) -> bool:
+    try:
+      digest = bytes.fromhex(infohash)
+    except (TypeError, ValueError):
+      return False
+
+    return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self.__positions(digest))
+
+  def __positions(self, digest: bytes):
+    first_hash = int.from_bytes(digest[:8], "little")
+    # Odd, so every step visits a different bit whenever the bit count is a power of two
+    second_hash = int.from_bytes(digest[8:16], "little") | 1
+
+    return ((first_hash + i * second_hash) % self.bit_count for i in range(self.hash_count))
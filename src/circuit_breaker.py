@@ -0,0 +1,64 @@
+import threading
+from time import monotonic
+
+HALF_OPEN_POLL_INTERVAL = 1
+
+
+class CircuitBreaker:
+  """
+  Thread-safe circuit breaker for a single tracker.
+
+  After `failure_threshold` consecutive failures the circuit opens and requests are refused for
+  `reset_timeout` seconds. Then it half-opens and lets a single trial request through: success
+  closes the circuit again and failure re-opens it for another `reset_timeout`.
+  """
+
+  CLOSED = "closed"
+  OPEN = "open"
+  HALF_OPEN = "half_open"
+
+  def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60, clock=monotonic):
+    self.failure_threshold = failure_threshold
+    self.reset_timeout = reset_timeout
+    self.consecutive_failures = 0
+    self._clock = clock
+    self._state = self.CLOSED
+    self._opened_at = 0.0
+    self._lock = threading.Lock()
+
+  @property
+  def state(self) -> str:
+    with self._lock:
+      return self._state
+
+  def before_request(self) -> float:
+    """
+    Asks to make a request. Returns 0 if it may go ahead, otherwise how many seconds until it's worth asking again.
+    """
+    with self._lock:
+      if self._state == self.CLOSED:
+        return 0
+
+      if self._state == self.HALF_OPEN:
+        # Only the trial request is let through, so everyone else checks back shortly
+        return HALF_OPEN_POLL_INTERVAL
+
+      reopens_in = self._opened_at + self.reset_timeout - self._clock()
+      if reopens_in > 0:
+        return reopens_in
+
+      self._state = self.HALF_OPEN
+      return 0
+
+  def record_success(self):
+    with self._lock:
+      self._state = self.CLOSED
+      self.consecutive_failures = 0
+
+  def record_failure(self):
+    with self._lock:
+      self.consecutive_failures += 1
+
+      if self._state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+        self._state = self.OPEN
+        self._opened_at = self._clock()
@@ -1,10 +1,12 @@
 import json
 import base64
+import itertools
 import requests
 from pathlib import Path
 
 from ..filesystem import sane_join
-from ..parser import get_bencoded_data, calculate_infohash
+from ..metrics import CLIENT_RPC_SECONDS
+from ..parser import get_infohash_from_file
 from ..errors import TorrentClientError, TorrentClientAuthenticationError, TorrentExistsInClientError
 from .torrent_client import TorrentClient
 from requests.exceptions import RequestException
@@ -20,7 +22,7 @@ class Deluge(TorrentClient):
     super().__init__()
     self._rpc_url = rpc_url
     self._deluge_cookie = None
-    self._deluge_request_id = 0
+    self._deluge_request_ids = itertools.count()
     self._label_plugin_enabled = False
 
   def setup(self):
@@ -67,7 +69,7 @@ class Deluge(TorrentClient):
     }
 
   def inject_torrent(self, source_torrent_infohash, new_torrent_filepath, save_path_override=None):
-    new_torrent_infohash = calculate_infohash(get_bencoded_data(new_torrent_filepath)).lower()
+    new_torrent_infohash = get_infohash_from_file(new_torrent_filepath).lower()
     new_torrent_already_exists = self.__does_torrent_exist_in_client(new_torrent_infohash)
 
     if new_torrent_already_exists:
@@ -122,10 +124,16 @@ class Deluge(TorrentClient):
     return self.__wrap_request("label.set_torrent", [infohash, label])
 
   def __wrap_request(self, method, params=[]):
+    rejected_cookie = self._deluge_cookie
+
     try:
       return self.__request(method, params)
     except TorrentClientAuthenticationError:
-      self.__authenticate()
+      with self._auth_lock:
+        # Another thread may have already logged in again while we waited
+        if self._deluge_cookie == rejected_cookie:
+          self.__authenticate()
+
       return self.__request(method, params)
 
   def __request(self, method, params=[]):
@@ -137,17 +145,17 @@ class Deluge(TorrentClient):
       headers["Cookie"] = self._deluge_cookie
 
     try:
-      response = requests.post(
-        href,
-        json={
-          "method": method,
-          "params": params,
-          "id": self._deluge_request_id,
-        },
-        headers=headers,
-        timeout=10,
-      )
-      self._deluge_request_id += 1
+      with CLIENT_RPC_SECONDS.labels("deluge", method).time():
+        response = requests.post(
+          href,
+          json={
+            "method": method,
+            "params": params,
+            "id": next(self._deluge_request_ids),
+          },
+          headers=headers,
+          timeout=10,
+        )
     except RequestException as network_error:
       if network_error.response and network_error.response.status_code == 408:
         raise TorrentClientError(f"Deluge method {method} timed out after 10 seconds")
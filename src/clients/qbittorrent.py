@@ -4,7 +4,8 @@ from pathlib import Path
 from requests.structures import CaseInsensitiveDict
 
 from ..filesystem import sane_join
-from ..parser import get_bencoded_data, calculate_infohash
+from ..metrics import CLIENT_RPC_SECONDS
+from ..parser import get_infohash_from_file
 from ..errors import TorrentClientError, TorrentClientAuthenticationError, TorrentExistsInClientError
 from .torrent_client import TorrentClient
 
@@ -42,7 +43,7 @@ class Qbittorrent(TorrentClient):
 
   def inject_torrent(self, source_torrent_infohash, new_torrent_filepath, save_path_override=None):
     source_torrent_info = self.get_torrent_info(source_torrent_infohash)
-    new_torrent_infohash = calculate_infohash(get_bencoded_data(new_torrent_filepath)).lower()
+    new_torrent_infohash = get_infohash_from_file(new_torrent_filepath).lower()
     new_torrent_already_exists = self.__does_torrent_exist_in_client(new_torrent_infohash)
 
     if new_torrent_already_exists:
@@ -82,22 +83,29 @@ class Qbittorrent(TorrentClient):
       raise TorrentClientAuthenticationError("qBittorrent login failed: Invalid username or password")
 
   def __wrap_request(self, path, data=None, files=None):
+    rejected_cookie = self._qbit_cookie
+
     try:
       return self.__request(path, data, files)
     except TorrentClientAuthenticationError:
-      self.__authenticate()
+      with self._auth_lock:
+        # Another thread may have already logged in again while we waited
+        if self._qbit_cookie == rejected_cookie:
+          self.__authenticate()
+
       return self.__request(path, data, files)
 
   def __request(self, path, data=None, files=None):
     href, _username, _password = self._qbit_url_parts
 
     try:
-      response = requests.post(
-        sane_join(href, path),
-        headers=CaseInsensitiveDict({"Cookie": f"SID={self._qbit_cookie}"}),
-        data=data,
-        files=files,
-      )
+      with CLIENT_RPC_SECONDS.labels("qbittorrent", path).time():
+        response = requests.post(
+          sane_join(href, path),
+          headers=CaseInsensitiveDict({"Cookie": f"SID={self._qbit_cookie}"}),
+          data=data,
+          files=files,
+        )
 
       response.raise_for_status()
 
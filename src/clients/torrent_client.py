@@ -1,4 +1,5 @@
 import os
+import threading
 from urllib.parse import urlparse, unquote
 
 from src.filesystem import sane_join
@@ -7,6 +8,8 @@ from src.filesystem import sane_join
 class TorrentClient:
   def __init__(self):
     self.torrent_label = "fertilizer"
+    # Serializes logging in again, since one expired session can get several threads rejected at once
+    self._auth_lock = threading.Lock()
 
   def setup(self):
     raise NotImplementedError
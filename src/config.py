@@ -41,6 +41,22 @@ class Config:
   def qbittorrent_url(self) -> str | None:
     return self.__get_key("qbittorrent_url", must_exist=False) or None
 
+  @property
+  def webhook_workers(self) -> int:
+    return int(self.__get_key("webhook_workers", must_exist=False) or 4)
+
+  @property
+  def server_threads(self) -> int:
+    return int(self.__get_key("server_threads", must_exist=False) or 8)
+
+  @property
+  def server_keep_alive_timeout(self) -> float:
+    return float(self.__get_key("server_keep_alive_timeout", must_exist=False) or 5)
+
+  @property
+  def server_drain_timeout(self) -> float:
+    return float(self.__get_key("server_drain_timeout", must_exist=False) or 30)
+
   @property
   def inject_torrents(self) -> str | bool:
     return self.__get_key("inject_torrents", must_exist=False) or False
@@ -49,6 +65,50 @@ class Config:
   def injection_link_directory(self) -> str | None:
     return self.__get_key("injection_link_directory", must_exist=False) or None
 
+  @property
+  def index_path(self) -> str | None:
+    return self.__get_key("index_path", must_exist=False) or None
+
+  @property
+  def index_workers(self) -> int:
+    return int(self.__get_key("index_workers", must_exist=False) or os.cpu_count() or 1)
+
+  @property
+  def index_false_positive_rate(self) -> float:
+    return float(self.__get_key("index_false_positive_rate", must_exist=False) or 0.01)
+
+  @property
+  def lookup_workers(self) -> int:
+    return int(self.__get_key("lookup_workers", must_exist=False) or 1)
+
+  @property
+  def inject_workers(self) -> int:
+    return int(self.__get_key("inject_workers", must_exist=False) or 1)
+
+  @property
+  def scan_queue_size(self) -> int:
+    return int(self.__get_key("scan_queue_size", must_exist=False) or 256)
+
+  @property
+  def api_cache_hit_ttl_days(self) -> float:
+    return float(self.__get_key("api_cache_hit_ttl_days", must_exist=False) or 30)
+
+  @property
+  def api_cache_miss_ttl_days(self) -> float:
+    return float(self.__get_key("api_cache_miss_ttl_days", must_exist=False) or 3)
+
+  @property
+  def api_cache_max_entries(self) -> int:
+    return int(self.__get_key("api_cache_max_entries", must_exist=False) or 1_000_000)
+
+  @property
+  def api_rate_limit_burst(self) -> int:
+    return int(self.__get_key("api_rate_limit_burst", must_exist=False) or 1)
+
+  @property
+  def rate_limit_directory(self) -> str | None:
+    return self.__get_key("rate_limit_directory", must_exist=False) or None
+
   def __get_key(self, key, must_exist=True):
     try:
       return self._json[key]
@@ -9,6 +9,7 @@ def handle_error(
   wait_time: int = 0,
   extra_description: str = "",
   should_raise: bool = False,
+  should_sleep: bool = True,
 ) -> None:
   action = "" if should_raise else "Retrying"
   action += f" in {wait_time} seconds..." if wait_time else ""
@@ -18,7 +19,8 @@ def handle_error(
     raise Exception(f"{description}{extra_description}. {action}{exception_message}{Fore.RESET}")
   else:
     print(f"{Fore.RED}Error: {description}{extra_description}. {action}{exception_message}{Fore.RESET}")
-    sleep(wait_time)
+    if should_sleep:
+      sleep(wait_time)
 
 
 class AuthenticationError(Exception):
@@ -59,3 +61,17 @@ class TorrentClientAuthenticationError(Exception):
 
 class TorrentInjectionError(Exception):
   pass
+
+
+class NonCanonicalBencodeError(Exception):
+  pass
+
+
+class TrackerUnavailableError(Exception):
+  def __init__(self, message: str, retry_after: float = 0):
+    super().__init__(message)
+    self.retry_after = retry_after
+
+
+class CircuitOpenError(TrackerUnavailableError):
+  pass
@@ -1,4 +1,6 @@
 import os
+from fnmatch import fnmatch
+from typing import Iterator
 
 
 def sane_join(*args: str) -> str:
@@ -22,10 +24,82 @@ def assert_path_exists(path: str) -> str:
   return path
 
 
-def list_files_of_extension(input_directory: str, extension: str = ".torrent") -> list[str]:
-  return [
-    os.path.join(input_directory, filename) for filename in os.listdir(input_directory) if filename.endswith(extension)
-  ]
+def iter_files_of_extension(
+  input_directory: str,
+  extension: str = ".torrent",
+  recursive: bool = False,
+  include: list[str] | None = None,
+  exclude: list[str] | None = None,
+  modified_after: float | None = None,
+) -> Iterator[os.DirEntry]:
+  """
+  Lazily yields the files in `input_directory` whose names end with `extension`.
+
+  Args:
+    `input_directory` (`str`): The directory to walk.
+    `extension` (`str`, optional): The file extension to look for. Defaults to ".torrent".
+    `recursive` (`bool`, optional): Whether to descend into subdirectories (e.g. qBittorrent's `BT_backup`). Defaults to False.
+    `include` (`list[str]`, optional): Glob patterns matched against the path relative to `input_directory`. Files must match at least one.
+    `exclude` (`list[str]`, optional): Glob patterns matched against the path relative to `input_directory`. Files must match none.
+    `modified_after` (`float`, optional): A UNIX timestamp. Files last modified before it are skipped.
+  Returns:
+    An iterator of `os.DirEntry` objects. Their `stat()` results are cached, so callers can reuse them for free.
+  """
+  root_prefix_length = root_prefix_length_of(input_directory)
+  pending_directories = [input_directory]
+
+  while pending_directories:
+    with os.scandir(pending_directories.pop()) as entries:
+      for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+          if recursive:
+            pending_directories.append(entry.path)
+          continue
+
+        if not entry.name.endswith(extension) or not entry.is_file():
+          continue
+
+        if not matches_entry_filters(entry, root_prefix_length, include, exclude, modified_after):
+          continue
+
+        yield entry
+
+
+def matches_path_filters(
+  relative_path: str, include: list[str] | None = None, exclude: list[str] | None = None
+) -> bool:
+  """
+  Returns whether `relative_path` matches at least one of the `include` globs (if any) and none of the `exclude` globs.
+  """
+  if include and not any(fnmatch(relative_path, pattern) for pattern in include):
+    return False
+
+  return not (exclude and any(fnmatch(relative_path, pattern) for pattern in exclude))
+
+
+def matches_entry_filters(
+  entry: os.DirEntry,
+  root_prefix_length: int,
+  include: list[str] | None = None,
+  exclude: list[str] | None = None,
+  modified_after: float | None = None,
+) -> bool:
+  """
+  Returns whether `entry` passes the filters of `iter_files_of_extension`. `root_prefix_length` is the length
+  of the walked directory's path as given by `root_prefix_length_of`.
+  """
+  if not matches_path_filters(entry.path[root_prefix_length:], include, exclude):
+    return False
+
+  return modified_after is None or entry.stat().st_mtime >= modified_after
+
+
+def root_prefix_length_of(input_directory: str) -> int:
+  return len(os.path.join(input_directory, ""))
+
+
+def list_files_of_extension(input_directory: str, extension: str = ".torrent", **walk_options) -> list[str]:
+  return [entry.path for entry in iter_files_of_extension(input_directory, extension, **walk_options)]
 
 
 def replace_extension(filepath: str, new_extension: str) -> str:
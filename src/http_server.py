@@ -0,0 +1,109 @@
+import signal
+import threading
+from time import monotonic
+from waitress import wasyncore
+from waitress.channel import HTTPChannel
+from waitress.server import BaseWSGIServer, create_server
+
+
+class WSGIServer:
+  """
+  Serves a WSGI app with waitress. Connections are handled by an event loop, so idle keep-alive connections
+  don't hold on to any of the `threads` that run the app, and are closed after `keep_alive_timeout` idle seconds.
+
+  When it's told to stop, the server closes its listening socket and gives the requests already in progress
+  up to `drain_timeout` seconds to finish before closing every connection and its threads.
+  """
+
+  def __init__(
+    self,
+    host: str,
+    port: int,
+    app,
+    threads: int = 8,
+    keep_alive_timeout: float = 5,
+    drain_timeout: float = 30,
+  ):
+    self.drain_timeout = drain_timeout
+    # When draining has to be done by, once the server has been told to stop
+    self.drain_deadline = None
+    self._stopping = threading.Event()
+    self._map = {}
+    self._server = create_server(
+      app,
+      map=self._map,
+      host=host,
+      port=port,
+      threads=threads,
+      channel_timeout=keep_alive_timeout,
+      # Idle connections are only checked for timing out this often
+      cleanup_interval=keep_alive_timeout,
+    )
+
+  @property
+  def port(self) -> int:
+    return self.__listeners()[0].effective_port
+
+  def serve_until_signalled(self, signals=(signal.SIGTERM, signal.SIGINT)) -> bool:
+    """
+    Serves until one of `signals` is received, then drains. Must be called from the main thread.
+    Returns whether everything finished in time.
+    """
+    previous_handlers = {signum: signal.signal(signum, lambda _signum, _frame: self.shutdown()) for signum in signals}
+
+    try:
+      return self.serve_forever()
+    finally:
+      for signum, handler in previous_handlers.items():
+        signal.signal(signum, handler)
+
+  def serve_forever(self) -> bool:
+    """
+    Serves until `shutdown` is called, then drains. Returns whether everything finished in time.
+    """
+    try:
+      while not self._stopping.is_set():
+        self.__poll()
+    finally:
+      drained = self.__drain()
+
+    return drained
+
+  def shutdown(self):
+    # Safe to call from a signal handler or another thread. The trigger wakes the event loop straight away.
+    self._stopping.set()
+    for listener in self.__listeners():
+      listener.pull_trigger()
+
+  def __drain(self):
+    self.drain_deadline = deadline = monotonic() + self.drain_timeout
+
+    # Only the listening sockets are closed for now, since the triggers still wake the loop as requests finish
+    for listener in self.__listeners():
+      wasyncore.dispatcher.close(listener)
+
+    while self.__channels() and monotonic() < deadline:
+      for channel in self.__channels():
+        if not channel.requests:
+          # Idle connections are closed right away, and busy ones once their response has been sent
+          channel.will_close = True
+
+      self.__poll()
+
+    drained = not self.__channels()
+    self._server.task_dispatcher.shutdown(timeout=max(deadline - monotonic(), 0))
+    wasyncore.close_all(self._map)
+
+    return drained
+
+  def __poll(self):
+    adjustments = self._server.adj
+    wasyncore.loop(
+      timeout=adjustments.asyncore_loop_timeout, map=self._map, use_poll=adjustments.asyncore_use_poll, count=1
+    )
+
+  def __listeners(self):
+    return [dispatcher for dispatcher in list(self._map.values()) if isinstance(dispatcher, BaseWSGIServer)]
+
+  def __channels(self):
+    return [dispatcher for dispatcher in list(self._map.values()) if isinstance(dispatcher, HTTPChannel)]
@@ -0,0 +1,371 @@
+import os
+import sqlite3
+import threading
+from hashlib import sha1
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor
+
+from .bloom_filter import BloomFilter
+from .errors import TorrentDecodingError
+from .trackers import Tracker, get_tracker_by_shortname
+from .parser import (
+  get_raw_data,
+  get_source,
+  calculate_infohash_from_bytes,
+  calculate_hashes_for_sources,
+  decode_bencoded_data_lazily,
+  get_origin_tracker_for_file,
+)
+
+# Bump whenever the schema changes. Older indexes are dropped and rebuilt since they're only a cache.
+SCHEMA_VERSION = 2
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS torrents (
+  path TEXT PRIMARY KEY,
+  directory TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  mtime_ns INTEGER NOT NULL,
+  inode INTEGER NOT NULL,
+  infohash TEXT,
+  tracker TEXT,
+  source BLOB
+);
+CREATE INDEX IF NOT EXISTS torrents_by_directory_and_infohash ON torrents (directory, infohash);
+CREATE TABLE IF NOT EXISTS variants (
+  path TEXT NOT NULL REFERENCES torrents (path) ON DELETE CASCADE,
+  source BLOB NOT NULL,
+  infohash TEXT NOT NULL,
+  PRIMARY KEY (path, source)
+);
+"""
+# Bloom filters are sized with room to grow, so a rescan can usually add new files without a rebuild
+BLOOM_FILTER_HEADROOM = 2
+MIN_BLOOM_FILTER_CAPACITY = 1024
+
+
+def index_torrent_file(filepath: str) -> tuple[str | None, str | None, dict[bytes, str], bytes | None]:
+  """
+  Reads a single .torrent file and returns the compact data we keep about it: its infohash,
+  the shortname of its origin tracker, its infohashes for each of the reciprocal tracker's source flags
+  and its own source flag. Files that can't be decoded get an infohash of `None`, and files from unknown
+  trackers get no variants or source flag.
+  """
+  raw_torrent = get_raw_data(filepath)
+  if raw_torrent is None:
+    return None, None, {}, None
+
+  try:
+    infohash = calculate_infohash_from_bytes(raw_torrent)
+  except TorrentDecodingError:
+    return None, None, {}, None
+
+  torrent_data = decode_bencoded_data_lazily(raw_torrent)
+  tracker = get_origin_tracker_for_file(filepath, torrent_data) if torrent_data else None
+  if not tracker:
+    return infohash, None, {}, None
+
+  variants = calculate_hashes_for_sources(raw_torrent, tracker.reciprocal_tracker().source_flags_for_creation())
+  return infohash, tracker.site_shortname(), variants, get_source(torrent_data) or b""
+
+
+def index_torrent_batch(
+  filepaths: list[str],
+) -> list[tuple[str, str | None, str | None, dict[bytes, str], bytes | None]]:
+  return [(filepath, *index_torrent_file(filepath)) for filepath in filepaths]
+
+
+def index_torrent_files(
+  filepaths: list[str], workers: int = 1, chunk_size: int = 256
+) -> list[tuple[str, str | None, str | None, dict[bytes, str], bytes | None]]:
+  """
+  Indexes many .torrent files, spreading chunks of them over `workers` processes.
+  Only the compact `(path, infohash, tracker, variants, source)` tuples cross process boundaries,
+  and results are returned in the same order as `filepaths`.
+  """
+  return list(iter_indexed_torrent_files(filepaths, workers, chunk_size))
+
+
+def iter_indexed_torrent_files(
+  filepaths: list[str], workers: int = 1, chunk_size: int = 256
+) -> Iterator[tuple[str, str | None, str | None, dict[bytes, str], bytes | None]]:
+  """
+  Same as `index_torrent_files`, but yields each chunk's tuples as soon as it's done, so callers that only
+  keep part of each tuple never hold all of them at once.
+  """
+  chunks = (filepaths[i : i + chunk_size] for i in range(0, len(filepaths), chunk_size))
+
+  if workers <= 1 or len(filepaths) <= chunk_size:
+    for chunk in chunks:
+      yield from index_torrent_batch(chunk)
+    return
+
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    for batch in executor.map(index_torrent_batch, chunks):
+      yield from batch
+
+
+def store_torrent(db: sqlite3.Connection, directory: str, filepath: str, file_key: tuple, indexed_data):
+  """
+  Writes the row for `filepath`, replacing any earlier one. `file_key` is its `(size, mtime_ns, inode)` and
+  `indexed_data` is what `index_torrent_file` returned for it.
+  """
+  infohash, tracker, variants, source = indexed_data
+
+  db.execute("DELETE FROM torrents WHERE path = ?", (filepath,))
+  db.execute(
+    "INSERT INTO torrents (path, directory, size, mtime_ns, inode, infohash, tracker, source) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+    (filepath, directory, *file_key, infohash, tracker, source),
+  )
+  db.executemany(
+    "INSERT INTO variants (path, source, infohash) VALUES (?, ?, ?)",
+    [(filepath, source, variant_hash) for source, variant_hash in variants.items()],
+  )
+
+
+class InfohashIndex:
+  """
+  Persistent SQLite index of the .torrent files in the input and output directories.
+
+  Rows are keyed by path and invalidated by (size, mtime, inode), so a rescan only
+  re-hashes files that were added or changed since the last run.
+
+  Each directory also gets a `BloomFilter` of its infohashes, saved next to the database, which answers
+  most lookups for infohashes that aren't in the directory without querying SQLite at all.
+  """
+
+  def __init__(self, db_path: str, workers: int = 1, false_positive_rate: float = 0.01):
+    self.db_path = db_path
+    self.workers = workers
+    self.false_positive_rate = false_positive_rate
+    parent_dir = os.path.dirname(db_path)
+    if parent_dir:
+      os.makedirs(parent_dir, exist_ok=True)
+
+    # Scans look up infohashes from several threads at once, so access is serialized with a lock
+    self._lock = threading.Lock()
+    self._db = sqlite3.connect(db_path, check_same_thread=False)
+    self._db.execute("PRAGMA foreign_keys = ON")
+    self.__migrate()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *_args):
+    self.close()
+
+  def close(self):
+    with self._lock:
+      self._db.close()
+
+  def refresh(self, directory: str, files: Iterable[str | os.DirEntry]) -> "IndexedInfohashes":
+    """
+    Brings the index for `directory` in line with `files`, re-hashing only new or changed files
+    and forgetting files that no longer exist. `files` may be consumed lazily, and `os.DirEntry`
+    items have their cached `stat()` results reused.
+
+    Returns:
+      `IndexedInfohashes`: a mapping of infohash to filepath for the directory.
+    """
+    with self._lock:
+      known_files = {
+        row[0]: tuple(row[1:])
+        for row in self._db.execute(
+          "SELECT path, size, mtime_ns, inode FROM torrents WHERE directory = ?",
+          (directory,),
+        )
+      }
+    changed_files = []
+    seen_files = set()
+
+    for file in files:
+      try:
+        if isinstance(file, os.DirEntry):
+          filepath, stat = file.path, file.stat()
+        else:
+          filepath, stat = file, os.stat(file)
+      except OSError:
+        continue
+
+      seen_files.add(filepath)
+      file_key = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+      if known_files.get(filepath) != file_key:
+        changed_files.append((filepath, file_key))
+
+    indexed_files = index_torrent_files([filepath for filepath, _file_key in changed_files], self.workers)
+    removed_files = [filepath for filepath in known_files if filepath not in seen_files]
+
+    with self._lock, self._db:
+      self._db.executemany("DELETE FROM torrents WHERE path = ?", [(filepath,) for filepath in removed_files])
+
+      for (filepath, file_key), (_filepath, *indexed_data) in zip(changed_files, indexed_files):
+        store_torrent(self._db, directory, filepath, file_key, indexed_data)
+
+      new_infohashes = [infohash for _filepath, infohash, *_rest in indexed_files if infohash]
+      # Infohashes can't be taken back out of a Bloom filter, so a removal means starting over
+      bloom_filter = self.__update_bloom_filter(directory, new_infohashes, should_rebuild=bool(removed_files))
+
+    return IndexedInfohashes(self._db, directory, self._lock, bloom_filter, self.__bloom_filter_path(directory))
+
+  def __migrate(self):
+    with self._db:
+      if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        self._db.execute("DROP TABLE IF EXISTS variants")
+        self._db.execute("DROP TABLE IF EXISTS torrents")
+
+    self._db.executescript(SCHEMA)
+    self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+  def __bloom_filter_path(self, directory):
+    return f"{self.db_path}.{sha1(directory.encode()).hexdigest()[:16]}.bloom"
+
+  def __update_bloom_filter(self, directory, new_infohashes, should_rebuild=False):
+    bloom_filter_path = self.__bloom_filter_path(directory)
+    bloom_filter = None if should_rebuild else BloomFilter.load(bloom_filter_path)
+
+    if bloom_filter and bloom_filter.false_positive_rate == self.false_positive_rate:
+      if bloom_filter.count + len(new_infohashes) <= bloom_filter.capacity:
+        for infohash in new_infohashes:
+          bloom_filter.add(infohash)
+
+        if new_infohashes:
+          bloom_filter.save(bloom_filter_path)
+
+        return bloom_filter
+
+    infohashes = [
+      row[0]
+      for row in self._db.execute(
+        "SELECT infohash FROM torrents WHERE directory = ? AND infohash IS NOT NULL", (directory,)
+      )
+    ]
+    capacity = max(len(infohashes) * BLOOM_FILTER_HEADROOM, MIN_BLOOM_FILTER_CAPACITY)
+    bloom_filter = BloomFilter(capacity, self.false_positive_rate)
+
+    for infohash in infohashes:
+      bloom_filter.add(infohash)
+
+    bloom_filter.save(bloom_filter_path)
+    return bloom_filter
+
+
+class IndexedInfohashes(Mapping):
+  """
+  Mapping of infohash to filepath for one directory of an `InfohashIndex`.
+  Lookups are answered by SQLite rather than an in-memory dict and are safe to make from any thread.
+  With a `bloom_filter`, lookups for infohashes it rules out skip the query.
+
+  Torrents saved to the directory while it's in use can be indexed straight away with `add`.
+  """
+
+  def __init__(
+    self,
+    db: sqlite3.Connection,
+    directory: str,
+    lock=None,
+    bloom_filter: BloomFilter | None = None,
+    bloom_filter_path: str | None = None,
+  ):
+    self._db = db
+    self._directory = directory
+    self._lock = lock or threading.Lock()
+    self._bloom_filter = bloom_filter
+    self._bloom_filter_path = bloom_filter_path
+
+  def add(self, filepath: str):
+    """
+    Indexes a torrent that was just saved to the directory, so lookups find it without waiting for the next
+    refresh, and that refresh doesn't have to hash it again.
+    """
+    try:
+      stat = os.stat(filepath)
+    except OSError:
+      return
+
+    indexed_data = index_torrent_file(filepath)
+    infohash = indexed_data[0]
+
+    with self._lock, self._db:
+      store_torrent(self._db, self._directory, filepath, (stat.st_size, stat.st_mtime_ns, stat.st_ino), indexed_data)
+
+      if infohash and self._bloom_filter is not None:
+        self._bloom_filter.add(infohash)
+        if self._bloom_filter_path:
+          self._bloom_filter.save(self._bloom_filter_path)
+
+  def __getitem__(self, infohash):
+    if not self.__might_contain(infohash):
+      raise KeyError(infohash)
+
+    row = self.__fetchone(
+      "SELECT path FROM torrents WHERE directory = ? AND infohash = ? LIMIT 1",
+      (self._directory, infohash),
+    )
+
+    if row is None:
+      raise KeyError(infohash)
+
+    return row[0]
+
+  def __iter__(self):
+    rows = self.__fetchall(
+      "SELECT DISTINCT infohash FROM torrents WHERE directory = ? AND infohash IS NOT NULL",
+      (self._directory,),
+    )
+
+    return (row[0] for row in rows)
+
+  def __len__(self):
+    return self.__fetchone(
+      "SELECT COUNT(DISTINCT infohash) FROM torrents WHERE directory = ?",
+      (self._directory,),
+    )[0]
+
+  def first_match(self, infohashes: list[str]) -> str | None:
+    """
+    Returns the first of `infohashes` that exists in the directory, using a single query.
+    """
+    infohashes = [infohash for infohash in infohashes if self.__might_contain(infohash)]
+    if not infohashes:
+      return None
+
+    placeholders = ", ".join("?" for _ in infohashes)
+    rows = self.__fetchall(
+      f"SELECT infohash FROM torrents WHERE directory = ? AND infohash IN ({placeholders})",
+      (self._directory, *infohashes),
+    )
+    found = {row[0] for row in rows}
+
+    return next((infohash for infohash in infohashes if infohash in found), None)
+
+  def get_entry(self, filepath: str) -> tuple[type[Tracker], dict[bytes, str], bytes] | None:
+    """
+    Returns the origin tracker, reciprocal source variant hashes and own source flag stored for `filepath`.
+    Variants are in the default order they should be looked up. Returns `None` if the file isn't indexed
+    from a known tracker.
+    """
+    row = self.__fetchone(
+      "SELECT tracker, source FROM torrents WHERE directory = ? AND path = ?",
+      (self._directory, filepath),
+    )
+    tracker = get_tracker_by_shortname(row[0]) if row else None
+    if not tracker:
+      return None
+
+    variants = dict(self.__fetchall("SELECT source, infohash FROM variants WHERE path = ?", (filepath,)))
+    sources = tracker.reciprocal_tracker().source_flags_for_creation()
+    if any(source not in variants for source in sources):
+      return None
+
+    return tracker, {source: variants[source] for source in sources}, row[1] or b""
+
+  def __might_contain(self, infohash) -> bool:
+    return self._bloom_filter is None or infohash in self._bloom_filter
+
+  def __fetchone(self, query, params):
+    with self._lock:
+      return self._db.execute(query, params).fetchone()
+
+  def __fetchall(self, query, params):
+    with self._lock:
+      return self._db.execute(query, params).fetchall()
@@ -0,0 +1,153 @@
+import os
+from array import array
+from collections.abc import Iterable, Mapping
+
+DIGEST_SIZE = 20
+# Digests are first sorted into buckets by (at most) their first two bytes
+MAX_BUCKET_BITS = 16
+
+
+class CompactInfohashes(Mapping):
+  """
+  Read-only mapping of infohash to filepath that stores each entry as a raw 20 byte digest in one sorted buffer,
+  with filepaths packed into a separate string table. That's a few dozen bytes per torrent rather than the
+  few hundred a dict of hex strings costs, which adds up for libraries of a million torrents.
+
+  Lookups are a binary search over the digests. Like a dict, later entries win over earlier ones with the same infohash.
+  """
+
+  def __init__(self, entries: Iterable[tuple[str, str]] = ()):
+    digests = bytearray()
+    path_table = bytearray()
+    path_offsets = array("Q", [0])
+
+    # Entries are packed as they arrive, so a lazily produced listing is never held in memory as a whole
+    for infohash, filepath in entries:
+      digests += bytes.fromhex(infohash)
+      path_table += os.fsencode(filepath)
+      path_offsets.append(len(path_table))
+
+    order = self.__sorted_ids(digests)
+    # The sort is stable, so the last of each run of equal digests is the entry that was added last
+    kept_ids = array(
+      "I",
+      (
+        path_id
+        for position, path_id in enumerate(order)
+        if position + 1 == len(order) or not self.__digests_equal(digests, order[position + 1], path_id)
+      ),
+    )
+    kept_digests = bytearray()
+    view = memoryview(digests)
+
+    for path_id in kept_ids:
+      kept_digests += view[path_id * DIGEST_SIZE : (path_id + 1) * DIGEST_SIZE]
+
+    self._digests = bytes(kept_digests)
+    self._path_ids = kept_ids
+    self._path_table = bytes(path_table)
+    self._path_offsets = path_offsets
+
+  def __getitem__(self, infohash):
+    position = self.__position_of(infohash)
+    if position is None:
+      raise KeyError(infohash)
+
+    path_id = self._path_ids[position]
+    return os.fsdecode(self._path_table[self._path_offsets[path_id] : self._path_offsets[path_id + 1]])
+
+  def __contains__(self, infohash):
+    return self.__position_of(infohash) is not None
+
+  def __iter__(self):
+    return (self.__digest_at(self._digests, i).hex().upper() for i in range(len(self)))
+
+  def __len__(self):
+    return len(self._digests) // DIGEST_SIZE
+
+  def first_match(self, infohashes: Iterable[str]) -> str | None:
+    """
+    Returns the first of `infohashes` that exists in the mapping. The candidates are looked up in sorted order,
+    each search starting where the previous one ended, so a batch costs one pass rather than a search per candidate.
+    """
+    candidates = []
+
+    for infohash in infohashes:
+      try:
+        candidates.append((bytes.fromhex(infohash), infohash))
+      except (TypeError, ValueError):
+        continue
+
+    found = set()
+    low = 0
+
+    for digest, infohash in sorted(candidates):
+      low = self.__search(digest, low)
+      if low < len(self) and self.__digest_at(self._digests, low) == digest:
+        found.add(infohash)
+
+    return next((infohash for _digest, infohash in candidates if infohash in found), None)
+
+  def __position_of(self, infohash) -> int | None:
+    try:
+      digest = bytes.fromhex(infohash)
+    except (TypeError, ValueError):
+      return None
+
+    position = self.__search(digest)
+    return position if position < len(self) and self.__digest_at(self._digests, position) == digest else None
+
+  def __search(self, digest: bytes, low: int = 0) -> int:
+    # Where `digest` is or would be inserted, searching from `low` onwards
+    high = len(self)
+    while low < high:
+      middle = (low + high) // 2
+      if self.__digest_at(self._digests, middle) < digest:
+        low = middle + 1
+      else:
+        high = middle
+
+    return low
+
+  @classmethod
+  def __sorted_ids(cls, digests: bytearray) -> array:
+    # A stable counting sort on the start of each digest, then a sort of each (small) bucket by whole digest.
+    # Only one bucket's digests are ever copied out as keys, rather than one key for every entry at once.
+    count = len(digests) // DIGEST_SIZE
+    # About one bucket per entry, up to one per possible two byte prefix
+    shift = MAX_BUCKET_BITS - min(count.bit_length(), MAX_BUCKET_BITS)
+    bucket_count = 1 << (MAX_BUCKET_BITS - shift)
+    bucket_starts = array("I", bytes(4 * (bucket_count + 1)))
+
+    for i in range(count):
+      bucket_starts[(cls.__prefix_of(digests, i) >> shift) + 1] += 1
+    for bucket in range(bucket_count):
+      bucket_starts[bucket + 1] += bucket_starts[bucket]
+
+    order = array("I", bytes(4 * count))
+    next_slots = array("I", bucket_starts)
+
+    for i in range(count):
+      bucket = cls.__prefix_of(digests, i) >> shift
+      order[next_slots[bucket]] = i
+      next_slots[bucket] += 1
+
+    for bucket in range(bucket_count):
+      start, end = bucket_starts[bucket], bucket_starts[bucket + 1]
+      if end - start > 1:
+        order[start:end] = array("I", sorted(order[start:end], key=lambda i: cls.__digest_at(digests, i)))
+
+    return order
+
+  @staticmethod
+  def __prefix_of(digests, i) -> int:
+    return digests[i * DIGEST_SIZE] << 8 | digests[i * DIGEST_SIZE + 1]
+
+  @staticmethod
+  def __digests_equal(digests, i, j) -> bool:
+    view = memoryview(digests)
+    return view[i * DIGEST_SIZE : (i + 1) * DIGEST_SIZE] == view[j * DIGEST_SIZE : (j + 1) * DIGEST_SIZE]
+
+  @staticmethod
+  def __digest_at(digests, i) -> bytes:
+    return bytes(digests[i * DIGEST_SIZE : (i + 1) * DIGEST_SIZE])
@@ -5,7 +5,9 @@ from .errors import TorrentInjectionError
 from .clients.deluge import Deluge
 from .clients.qbittorrent import Qbittorrent
 from .config import Config
-from .parser import calculate_infohash, get_bencoded_data
+from .metrics import HARDLINK_SECONDS
+from .parser import get_infohash_from_file
+from .single_flight import SingleFlight
 
 
 class Injection:
@@ -13,20 +15,32 @@ class Injection:
     self.config = self.__validate_config(config)
     self.linking_directory = config.injection_link_directory
     self.client = self.__determine_torrent_client(config)
+    # The webhook and a scan can finish the same cross-seed at once, and only one of them gets to link its files
+    self._in_flight_injections = SingleFlight()
 
   def setup(self):
     self.client.setup()
     return self
 
   def inject_torrent(self, source_torrent_filepath, new_torrent_filepath, new_tracker):
-    source_torrent_data = get_bencoded_data(source_torrent_filepath)
-    source_torrent_file_or_dir = self.__determine_source_torrent_data_location(source_torrent_data)
+    source_torrent_infohash = get_infohash_from_file(source_torrent_filepath)
+
+    return self._in_flight_injections.do(
+      [(source_torrent_infohash, new_tracker)],
+      self.__inject_torrent,
+      source_torrent_infohash,
+      new_torrent_filepath,
+      new_tracker,
+    )
+
+  def __inject_torrent(self, source_torrent_infohash, new_torrent_filepath, new_tracker):
+    source_torrent_file_or_dir = self.__determine_source_torrent_data_location(source_torrent_infohash)
     output_location = self.__determine_output_location(source_torrent_file_or_dir, new_tracker)
     self.__link_files_to_output_location(source_torrent_file_or_dir, output_location)
     output_parent_directory = os.path.dirname(os.path.normpath(output_location))
 
     return self.client.inject_torrent(
-      calculate_infohash(source_torrent_data),
+      source_torrent_infohash,
       new_torrent_filepath,
       save_path_override=output_parent_directory,
     )
@@ -51,7 +65,7 @@ class Injection:
 
   # If the torrent is a single bare file, this returns the path _to that file_
   # If the torrent is one or many files in a directory, this returns the topmost directory path
-  def __determine_source_torrent_data_location(self, torrent_data):
+  def __determine_source_torrent_data_location(self, infohash):
     # Note on torrent file structures:
     # --------
     # From my testing, all torrents have a `name` stored at `[b"info"][b"name"]`. This appears to always
@@ -71,7 +85,6 @@ class Injection:
     # directory (which in our case is the `name`).
     #
     # See also: https://en.wikipedia.org/wiki/Torrent_file#File_struct
-    infohash = calculate_infohash(torrent_data)
     torrent_info_from_client = self.client.get_torrent_info(infohash)
     proposed_torrent_data_location = torrent_info_from_client["content_path"]
 
@@ -92,9 +105,10 @@ class Injection:
     if os.path.exists(output_location):
       raise TorrentInjectionError(f"Cannot link given torrent since it's already been linked: {output_location}")
 
-    if os.path.isfile(source_torrent_file_or_dir):
-      os.link(source_torrent_file_or_dir, output_location)
-    elif os.path.isdir(source_torrent_file_or_dir):
-      shutil.copytree(source_torrent_file_or_dir, output_location, copy_function=os.link)
+    with HARDLINK_SECONDS.time():
+      if os.path.isfile(source_torrent_file_or_dir):
+        os.link(source_torrent_file_or_dir, output_location)
+      elif os.path.isdir(source_torrent_file_or_dir):
+        shutil.copytree(source_torrent_file_or_dir, output_location, copy_function=os.link)
 
     return output_location
@@ -0,0 +1,81 @@
+import os
+import ctypes
+import struct
+import ctypes.util
+
+# Event masks from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_CLOEXEC = os.O_CLOEXEC
+IN_NONBLOCK = os.O_NONBLOCK
+
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+class Inotify:
+  """
+  Minimal stdlib-only wrapper around Linux's inotify API. The file descriptor is non-blocking,
+  so callers wait for events with `select`/`poll` on `fileno()` and then drain them with `read_events`.
+  """
+
+  def __init__(self):
+    self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    self._fd = self.__check(self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *_args):
+    self.close()
+
+  def fileno(self) -> int:
+    return self._fd
+
+  def close(self):
+    if self._fd is not None:
+      os.close(self._fd)
+      self._fd = None
+
+  def add_watch(self, path: str, mask: int) -> int:
+    """
+    Starts watching `path` for the events in `mask` and returns the watch descriptor that identifies its events.
+    """
+    return self.__check(self._libc.inotify_add_watch(self._fd, os.fsencode(path), ctypes.c_uint32(mask)), path)
+
+  def read_events(self) -> list[tuple[int, int, int, str]]:
+    """
+    Returns the `(watch descriptor, mask, cookie, name)` of every queued event, or an empty list if there are none.
+    """
+    try:
+      data = os.read(self._fd, READ_SIZE)
+    except BlockingIOError:
+      return []
+
+    events = []
+    offset = 0
+
+    while offset < len(data):
+      wd, mask, cookie, name_length = EVENT_HEADER.unpack_from(data, offset)
+      offset += EVENT_HEADER.size
+      name = data[offset : offset + name_length].rstrip(b"\0")
+      offset += name_length
+      events.append((wd, mask, cookie, os.fsdecode(name)))
+
+    return events
+
+  @staticmethod
+  def __check(result: int, path: str | None = None) -> int:
+    if result < 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, os.strerror(errno), path)
+
+    return result
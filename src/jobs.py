@@ -0,0 +1,129 @@
+import uuid
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from time import monotonic
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+
+
+class Job:
+  """
+  A unit of work submitted to a `JobQueue`. Once `status` is `FINISHED`, either `result` holds what the
+  work returned or `error` holds the exception it raised.
+  """
+
+  def __init__(self):
+    self.id = uuid.uuid4().hex
+    self.status = QUEUED
+    self.result = None
+    self.error = None
+    self._finished = threading.Event()
+    self._future = None
+
+  def wait(self, timeout: float | None = None) -> bool:
+    """
+    Blocks until the job has finished or `timeout` seconds have passed. Returns whether the job has finished.
+    """
+    return self._finished.wait(timeout)
+
+  def _cancel(self):
+    self.error = CancelledError("The job was cancelled before it started")
+    self.status = FINISHED
+    self._finished.set()
+
+  def _run(self, fn, args, kwargs):
+    self.status = RUNNING
+
+    try:
+      self.result = fn(*args, **kwargs)
+    except Exception as e:
+      self.error = e
+    finally:
+      self.status = FINISHED
+      self._finished.set()
+
+
+class JobQueue:
+  """
+  Runs submitted work on a pool of `workers` threads and keeps track of it by job id, so callers can
+  hand off slow work straight away and check on it later.
+
+  Finished jobs are remembered until more than `max_finished_jobs` have piled up, at which point the oldest are forgotten.
+  """
+
+  def __init__(self, workers: int = 4, max_finished_jobs: int = 10_000):
+    self.max_finished_jobs = max_finished_jobs
+    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fertilizer-job")
+    self._jobs = OrderedDict()
+    self._lock = threading.Lock()
+
+  def submit(self, fn, *args, **kwargs) -> Job:
+    job = Job()
+
+    with self._lock:
+      self._jobs[job.id] = job
+      self.__forget_finished_jobs()
+
+    job._future = self._executor.submit(job._run, fn, args, kwargs)
+    return job
+
+  def get(self, job_id: str) -> Job | None:
+    with self._lock:
+      return self._jobs.get(job_id)
+
+  @property
+  def pending_count(self) -> int:
+    """
+    The number of jobs that are queued or running.
+    """
+    with self._lock:
+      return sum(job.status != FINISHED for job in self._jobs.values())
+
+  def shutdown(self, wait: bool = True, timeout: float | None = None) -> bool:
+    """
+    Stops accepting jobs. With `wait`, blocks until every job that was already submitted has finished,
+    or for at most `timeout` seconds. Jobs that haven't started by then are cancelled, and finish with a
+    `CancelledError`. Returns whether every job finished.
+    """
+    self._executor.shutdown(wait=False)
+
+    with self._lock:
+      jobs = list(self._jobs.values())
+
+    if wait:
+      deadline = None if timeout is None else monotonic() + timeout
+
+      for job in jobs:
+        if not job.wait(None if deadline is None else max(deadline - monotonic(), 0)):
+          break
+
+    self._executor.shutdown(wait=False, cancel_futures=True)
+
+    for job in jobs:
+      if job._future is not None and job._future.cancelled():
+        job._cancel()
+
+    return all(job.status == FINISHED for job in jobs)
+
+  def __forget_finished_jobs(self):
+    if len(self._jobs) <= self.max_finished_jobs:
+      return
+
+    finished_ids = [job_id for job_id, job in self._jobs.items() if job.status == FINISHED]
+
+    for job_id in finished_ids[: max(len(finished_ids) - self.max_finished_jobs, 0)]:
+      del self._jobs[job_id]
+
+
+def iter_finished_jobs(jobs: Iterable[Job]) -> Iterator[Job]:
+  """
+  Yields `jobs` as they finish, whichever order that happens in.
+  """
+  futures = {job._future: job for job in jobs}
+
+  for future in as_completed(futures):
+    yield futures[future]
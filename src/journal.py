@@ -0,0 +1,130 @@
+import os
+import json
+import tempfile
+from time import time
+
+# Outcomes worth remembering between runs. Errors are deliberately left out so
+# they're retried, since they're usually transient (timeouts, client hiccups).
+RESUMABLE_OUTCOMES = ("generated", "already_exists", "not_found", "skipped")
+# A torrent that wasn't found may be uploaded to the other tracker later, so that outcome expires. Defaults
+# to the response cache's miss TTL, since a rescan sooner than that would only hit the cached miss anyway.
+DEFAULT_NOT_FOUND_TTL = 3 * 86400
+
+
+class ScanJournal:
+  """
+  Append-only record of per-file scan outcomes, stored as JSON lines.
+
+  Entries are keyed by path and modification time so an entry stops applying as soon as
+  the file changes. "not_found" entries also stop applying `not_found_ttl` seconds after they were recorded. Writes are flushed to disk every `checkpoint_interval` entries, which
+  bounds how much work a crashed or killed scan can lose.
+  """
+
+  def __init__(
+    self,
+    journal_path: str,
+    resume: bool = False,
+    checkpoint_interval: int = 50,
+    not_found_ttl: float = DEFAULT_NOT_FOUND_TTL,
+  ):
+    self.journal_path = journal_path
+    self.resume = resume
+    self.checkpoint_interval = checkpoint_interval
+    self.not_found_ttl = not_found_ttl
+    # Loaded either way, so a scan that doesn't resume still keeps the outcomes of files it doesn't rescan
+    self._entries = self.__load()
+    self._pending_writes = 0
+
+    parent_dir = os.path.dirname(journal_path)
+    if parent_dir:
+      os.makedirs(parent_dir, exist_ok=True)
+
+    # Starting from a compacted copy of the surviving entries keeps the journal from growing forever
+    self.__compact()
+    self._file = open(journal_path, "a", encoding="utf-8")
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *_args):
+    self.close()
+
+  def close(self):
+    self.checkpoint()
+    self._file.close()
+
+  def get_outcome(self, filepath: str) -> tuple[str, str] | None:
+    """
+    Returns the recorded `(outcome, message)` for `filepath` if it is still valid, otherwise `None`.
+    Always `None` unless the journal was opened with `resume`.
+    """
+    if not self.resume:
+      return None
+
+    entry = self._entries.get(filepath)
+    if not entry or entry["outcome"] not in RESUMABLE_OUTCOMES:
+      return None
+    # Entries written before outcomes were timestamped count as expired
+    if entry["outcome"] == "not_found" and time() - entry.get("recorded_at", 0) > self.not_found_ttl:
+      return None
+
+    try:
+      if os.stat(filepath).st_mtime_ns != entry["mtime_ns"]:
+        return None
+    except OSError:
+      return None
+
+    return entry["outcome"], entry["message"]
+
+  def record(self, filepath: str, outcome: str, message: str):
+    try:
+      mtime_ns = os.stat(filepath).st_mtime_ns
+    except OSError:
+      return
+
+    entry = {"path": filepath, "mtime_ns": mtime_ns, "outcome": outcome, "message": message, "recorded_at": time()}
+    self._entries[filepath] = entry
+    self._file.write(json.dumps(entry) + "\n")
+    self._pending_writes += 1
+
+    if self._pending_writes >= self.checkpoint_interval:
+      self.checkpoint()
+
+  def checkpoint(self):
+    self._file.flush()
+    os.fsync(self._file.fileno())
+    self._pending_writes = 0
+
+  def __load(self):
+    entries = {}
+
+    try:
+      with open(self.journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+          try:
+            entry = json.loads(line)
+            entries[entry["path"]] = entry
+          except (json.JSONDecodeError, KeyError, TypeError):
+            # A scan that died mid-write can leave a truncated last line behind
+            continue
+    except FileNotFoundError:
+      pass
+
+    return entries
+
+  def __compact(self):
+    # A unique temporary file, so two scans opening the same journal can't write over each other's
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.journal_path) or ".", suffix=".tmp")
+
+    try:
+      with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for entry in self._entries.values():
+          f.write(json.dumps(entry) + "\n")
+
+        f.flush()
+        os.fsync(f.fileno())
+
+      os.replace(temp_path, self.journal_path)
+    except BaseException:
+      os.unlink(temp_path)
+      raise
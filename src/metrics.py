@@ -0,0 +1,144 @@
+import os
+from contextlib import nullcontext
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, disable_created_metrics, write_to_textfile
+
+# Suits everything from a cache hit to a slow tracker request
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_DISABLED_TIMER = nullcontext()
+
+
+class Instrument:
+  """
+  Wraps a `prometheus_client` counter or histogram so it only records anything once metrics are enabled
+  with `set_enabled`. Until then every call returns after a single attribute check.
+  """
+
+  enabled = False
+
+  def __init__(self, metric: Counter | Histogram):
+    self.metric = metric
+
+  def labels(self, *labelvalues):
+    if not Instrument.enabled:
+      return _DISABLED_CHILD
+
+    return self.metric.labels(*labelvalues)
+
+  def inc(self, amount: float = 1):
+    if Instrument.enabled:
+      self.metric.inc(amount)
+
+  def time(self):
+    if not Instrument.enabled:
+      return _DISABLED_TIMER
+
+    return self.metric.time()
+
+
+class _DisabledChild:
+  def inc(self, amount: float = 1):
+    pass
+
+  def observe(self, amount: float):
+    pass
+
+  def time(self):
+    return _DISABLED_TIMER
+
+
+_DISABLED_CHILD = _DisabledChild()
+
+
+def set_enabled(enabled: bool):
+  Instrument.enabled = enabled
+
+
+def write_textfile(path: str, registry: CollectorRegistry | None = None):
+  """
+  Writes the metrics to `path` for node_exporter's textfile collector. The file is replaced atomically,
+  so the collector never reads half of it.
+  """
+  parent_dir = os.path.dirname(path)
+  if parent_dir:
+    os.makedirs(parent_dir, exist_ok=True)
+
+  write_to_textfile(path, registry or REGISTRY)
+
+
+# A `_created` timestamp for every series would double what's exported without telling anyone much
+disable_created_metrics()
+REGISTRY = CollectorRegistry()
+
+API_REQUESTS = Instrument(
+  Counter(
+    "fertilizer_api_requests",
+    "Tracker API requests by outcome (success, rate_limited or error).",
+    ("tracker", "action", "outcome"),
+    registry=REGISTRY,
+  )
+)
+API_REQUEST_SECONDS = Instrument(
+  Histogram(
+    "fertilizer_api_request_duration_seconds",
+    "Time taken by tracker API requests.",
+    ("tracker", "action"),
+    buckets=DEFAULT_BUCKETS,
+    registry=REGISTRY,
+  )
+)
+API_RETRIES = Instrument(
+  Counter(
+    "fertilizer_api_retries",
+    "Tracker API requests that were retried after failing or being rate limited.",
+    ("tracker", "action"),
+    registry=REGISTRY,
+  )
+)
+API_RATE_LIMIT_WAIT_SECONDS = Instrument(
+  Histogram(
+    "fertilizer_api_rate_limit_wait_seconds",
+    "Time spent waiting on the rate limit before each tracker API request.",
+    ("tracker",),
+    buckets=DEFAULT_BUCKETS,
+    registry=REGISTRY,
+  )
+)
+API_CACHE_LOOKUPS = Instrument(
+  Counter(
+    "fertilizer_api_cache_lookups",
+    "Torrent lookups in the response cache by result (hit or miss).",
+    ("tracker", "result"),
+    registry=REGISTRY,
+  )
+)
+SCAN_OUTCOMES = Instrument(
+  Counter(
+    "fertilizer_scan_outcomes",
+    "Scanned torrents by outcome.",
+    ("outcome",),
+    registry=REGISTRY,
+  )
+)
+CLIENT_RPC_SECONDS = Instrument(
+  Histogram(
+    "fertilizer_client_rpc_duration_seconds",
+    "Time taken by torrent client RPC calls.",
+    ("client", "method"),
+    buckets=DEFAULT_BUCKETS,
+    registry=REGISTRY,
+  )
+)
+HARDLINK_SECONDS = Instrument(
+  Histogram(
+    "fertilizer_hardlink_duration_seconds",
+    "Time taken to hardlink a torrent's data for injection.",
+    buckets=DEFAULT_BUCKETS,
+    registry=REGISTRY,
+  )
+)
+# Only read when the metrics are collected, so it costs nothing in between
+WEBHOOK_QUEUE_DEPTH = Gauge(
+  "fertilizer_webhook_queue_depth",
+  "Webhook scan jobs that are queued or running.",
+  registry=REGISTRY,
+)
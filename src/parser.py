@@ -1,11 +1,13 @@
 import os
-import copy
 import bencoder
+import tempfile
 from hashlib import sha1
 
 from .utils import flatten
+from .filesystem import replace_extension
+from .bencode import find_info_span, find_dict_entry_span, splice_dict, LazyBencodeDict
 from .trackers import RedTracker, OpsTracker
-from .errors import TorrentDecodingError
+from .errors import TorrentDecodingError, NonCanonicalBencodeError
 
 
 def is_valid_infohash(infohash: str) -> bool:
@@ -56,6 +58,25 @@ def get_origin_tracker(torrent_data: dict) -> RedTracker | OpsTracker | None:
   return None
 
 
+def get_origin_tracker_for_file(
+  torrent_path: str, torrent_data: LazyBencodeDict | dict
+) -> RedTracker | OpsTracker | None:
+  # The fastresume stuff is to support qBittorrent since it doesn't store
+  # announce URLs in the torrent file IFF we're taking the file from `BT_backup`.
+  #
+  # qbit stores that information in a sidecar file that has the exact same name
+  # as the torrent file but with a `.fastresume` extension instead. It's also stored
+  # in a list of lists called `trackers` in this `.fastresume` file instead of `announce`.
+  #
+  # The sidecar is only read at all if the torrent itself doesn't tell us the tracker.
+  torrent_tracker = get_origin_tracker(torrent_data)
+  if torrent_tracker:
+    return torrent_tracker
+
+  fastresume_data = decode_bencoded_data_lazily(get_raw_data(replace_extension(torrent_path, ".fastresume")))
+  return get_origin_tracker(fastresume_data) if fastresume_data else None
+
+
 def calculate_infohash(torrent_data: dict) -> str:
   try:
     return sha1(bencoder.encode(torrent_data[b"info"])).hexdigest().upper()
@@ -63,23 +84,159 @@ def calculate_infohash(torrent_data: dict) -> str:
     raise TorrentDecodingError("Torrent data does not contain 'info' key")
 
 
-def recalculate_hash_for_new_source(torrent_data: dict, new_source: (bytes | str)) -> str:
-  torrent_data = copy.deepcopy(torrent_data)
-  torrent_data[b"info"][b"source"] = new_source
+def calculate_infohash_from_bytes(raw_torrent: bytes) -> str:
+  """
+  Calculates the infohash of raw .torrent contents by hashing the `info` span in place.
+  Falls back to a full decode and re-encode if the file isn't canonically encoded.
+  """
+  try:
+    start, end = find_info_span(raw_torrent)
+  except (TorrentDecodingError, NonCanonicalBencodeError):
+    return calculate_infohash(__decode_or_raise(raw_torrent))
 
-  return calculate_infohash(torrent_data)
+  return sha1(memoryview(raw_torrent)[start:end]).hexdigest().upper()
 
 
-def get_bencoded_data(filename: str) -> dict:
+def get_infohash_from_file(filename: str) -> str:
+  with open(filename, "rb") as f:
+    return calculate_infohash_from_bytes(f.read())
+
+
+def recalculate_hash_for_new_source(torrent_data: dict, new_source: (bytes | str)) -> str:
+  try:
+    # Only the `info` dict is hashed, so a shallow copy of it is all we need to avoid mutating the original
+    return calculate_infohash({b"info": {**torrent_data[b"info"], b"source": new_source}})
+  except KeyError:
+    raise TorrentDecodingError("Torrent data does not contain 'info' key")
+
+
+def calculate_hashes_for_sources(raw_torrent: bytes, new_sources: list[bytes]) -> dict[bytes, str]:
+  """
+  Calculates the infohash the torrent would have with each of `new_sources`, keyed by source.
+  The new `source` entry is spliced into the raw `info` bytes and the hash of everything before
+  it is shared between variants. Falls back to re-encoding if the file isn't canonically encoded.
+  """
+  try:
+    info_start, info_end = find_info_span(raw_torrent)
+    entry_start, entry_end = find_dict_entry_span(raw_torrent, info_start, b"source")
+  except (TorrentDecodingError, NonCanonicalBencodeError):
+    torrent_data = __decode_or_raise(raw_torrent)
+    return {new_source: recalculate_hash_for_new_source(torrent_data, new_source) for new_source in new_sources}
+
+  raw_view = memoryview(raw_torrent)
+  prefix_hash = sha1(raw_view[info_start:entry_start])
+  prefix_hash.update(bencoder.encode(b"source"))
+  suffix = raw_view[entry_end:info_end]
+  hashes = {}
+
+  for new_source in new_sources:
+    variant_hash = prefix_hash.copy()
+    variant_hash.update(bencoder.encode(new_source))
+    variant_hash.update(suffix)
+    hashes[new_source] = variant_hash.hexdigest().upper()
+
+  return hashes
+
+
+def splice_torrent_entries(raw_torrent: bytes, entries: dict, info_entries: dict) -> list:
+  """
+  Returns `raw_torrent` with `entries` set at the top level and `info_entries` set in the `info` dict,
+  as a list of byte segments for `save_bencoded_segments`. Everything else is referenced straight from
+  `raw_torrent` rather than copied, so even huge `pieces` strings never get re-encoded.
+
+  Raises:
+    `TorrentDecodingError`: if the data is malformed or has no `info` dict.
+    `NonCanonicalBencodeError`: if the file isn't canonically encoded, so splicing could produce a different torrent.
+  """
+  info_start, _info_end = find_info_span(raw_torrent)
+  info_segments = splice_dict(
+    raw_torrent, info_start, {key: [bencoder.encode(value)] for key, value in info_entries.items()}
+  )
+  replacements = {key: [bencoder.encode(value)] for key, value in entries.items()}
+
+  return splice_dict(raw_torrent, 0, {**replacements, b"info": info_segments})
+
+
+def get_raw_data(filename: str) -> bytes | None:
   try:
     with open(filename, "rb") as f:
-      data = bencoder.decode(f.read())
+      return f.read()
+  except OSError:
+    return None
+
 
-    return data
+def decode_bencoded_data(raw_data: bytes | None) -> dict | None:
+  try:
+    return bencoder.decode(raw_data)
   except Exception:
     return None
 
 
+def decode_bencoded_data_lazily(raw_data: bytes | None) -> LazyBencodeDict | None:
+  """
+  Decodes the top level of `raw_data` into a `LazyBencodeDict`. Nested values are only
+  parsed when they're accessed, which makes this much cheaper than a full decode when
+  only a handful of keys (e.g. for tracker detection) are needed.
+  """
+  try:
+    torrent_data = LazyBencodeDict(raw_data)
+  except Exception:
+    return None
+
+  return torrent_data if torrent_data.end == len(raw_data) else None
+
+
+def get_bencoded_data(filename: str) -> dict:
+  return decode_bencoded_data(get_raw_data(filename))
+
+
+def __decode_or_raise(raw_torrent: bytes) -> dict:
+  try:
+    torrent_data = bencoder.decode(raw_torrent)
+  except Exception:
+    raise TorrentDecodingError("Error decoding torrent file")
+
+  if not isinstance(torrent_data, dict):
+    raise TorrentDecodingError("Error decoding torrent file")
+
+  return torrent_data
+
+
+def save_bencoded_segments(filepath: str, segments: list) -> str:
+  """
+  Writes `segments` to `filepath` with vectored writes, via a temporary file that's renamed into place
+  so a crash can never leave a truncated torrent behind.
+  """
+  parent_dir = os.path.dirname(filepath)
+  if parent_dir:
+    os.makedirs(parent_dir, exist_ok=True)
+
+  remaining = [memoryview(segment) for segment in segments if len(segment)]
+  # A unique temporary file, so concurrent saves of the same torrent can't write over each other's
+  fd, temp_path = tempfile.mkstemp(dir=parent_dir or ".", suffix=".tmp")
+  # `mkstemp` only lets the owner read the file, but torrent clients may run as someone else
+  os.fchmod(fd, 0o644)
+
+  try:
+    while remaining:
+      written = os.writev(fd, remaining[: os.sysconf("SC_IOV_MAX")])
+
+      # Short writes can stop partway through a segment, so resume from exactly where they left off
+      while remaining and written >= len(remaining[0]):
+        written -= len(remaining.pop(0))
+      if written:
+        remaining[0] = remaining[0][written:]
+  except BaseException:
+    os.close(fd)
+    os.remove(temp_path)
+    raise
+
+  os.close(fd)
+  os.replace(temp_path, filepath)
+
+  return filepath
+
+
 def save_bencoded_data(filepath: str, torrent_data: dict) -> str:
   parent_dir = os.path.dirname(filepath)
   if parent_dir:
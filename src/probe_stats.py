@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hits (
+  tracker TEXT NOT NULL,
+  origin_source BLOB NOT NULL,
+  source BLOB NOT NULL,
+  count INTEGER NOT NULL,
+  PRIMARY KEY (tracker, origin_source, source)
+);
+"""
+
+
+class SourceFlagStats:
+  """
+  Persistent record of which source flag each successful lookup matched on, used to probe the
+  most likely variant of a torrent first.
+
+  Hits are counted per destination tracker and per source flag of the original torrent, since
+  that flag says the most about how the torrent was uploaded to the other tracker.
+  """
+
+  def __init__(self, db_path: str):
+    parent_dir = os.path.dirname(db_path)
+    if parent_dir:
+      os.makedirs(parent_dir, exist_ok=True)
+
+    self._lock = threading.Lock()
+    self._db = sqlite3.connect(db_path, check_same_thread=False)
+    self._db.executescript(SCHEMA)
+
+  def close(self):
+    with self._lock:
+      self._db.close()
+
+  def order_variants(self, tracker: str, origin_source: bytes, variants: dict[bytes, str]) -> dict[bytes, str]:
+    """
+    Returns `variants` reordered so the source flags that have matched most often come first.
+    Hits for the same origin source flag take priority over hits across the whole tracker, and
+    ties keep their original order.
+    """
+    with self._lock:
+      rows = self._db.execute("SELECT origin_source, source, count FROM hits WHERE tracker = ?", (tracker,)).fetchall()
+
+    origin_hits = {}
+    tracker_hits = {}
+    for row_origin_source, source, count in rows:
+      tracker_hits[source] = tracker_hits.get(source, 0) + count
+      if row_origin_source == origin_source:
+        origin_hits[source] = count
+
+    ordered_sources = sorted(variants, key=lambda source: (-origin_hits.get(source, 0), -tracker_hits.get(source, 0)))
+    return {source: variants[source] for source in ordered_sources}
+
+  def record_hit(self, tracker: str, origin_source: bytes, source: bytes):
+    with self._lock, self._db:
+      self._db.execute(
+        "INSERT INTO hits (tracker, origin_source, source, count) VALUES (?, ?, ?, 1) "
+        "ON CONFLICT (tracker, origin_source, source) DO UPDATE SET count = count + 1",
+        (tracker, origin_source, source),
+      )
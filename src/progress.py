@@ -2,16 +2,21 @@ from time import time
 
 from colorama import Fore
 
+from .metrics import SCAN_OUTCOMES
+
 
 class Status:
-  def __init__(self, name, color, total):
+  def __init__(self, name, color, total, outcome=None):
     self.count = 0
     self.name = name
+    self.outcome = outcome
     self.color = color
     self.total = total
 
-  def increment(self):
+  def increment(self, count_metric: bool = True):
     self.count += 1
+    if count_metric:
+      SCAN_OUTCOMES.labels(self.outcome).inc()
 
   def print(self, message: str, increment_counter: bool = True):
     print(f"{self.color}{message}{Fore.RESET}")
@@ -34,11 +39,11 @@ class Progress:
     self.start_time = time()
 
     self.total = total
-    self.generated = Status("Generated for cross-seeding", Fore.LIGHTGREEN_EX, total)
-    self.already_exists = Status("Already exists", Fore.LIGHTYELLOW_EX, total)
-    self.not_found = Status("Not found", Fore.LIGHTRED_EX, total)
-    self.error = Status("Errors", Fore.RED, total)
-    self.skipped = Status("Skipped", Fore.LIGHTBLACK_EX, total)
+    self.generated = Status("Generated for cross-seeding", Fore.LIGHTGREEN_EX, total, "generated")
+    self.already_exists = Status("Already exists", Fore.LIGHTYELLOW_EX, total, "already_exists")
+    self.not_found = Status("Not found", Fore.LIGHTRED_EX, total, "not_found")
+    self.error = Status("Errors", Fore.RED, total, "error")
+    self.skipped = Status("Skipped", Fore.LIGHTBLACK_EX, total, "skipped")
 
   def report(self) -> str:
     divider = f"\n{'-' * 50}"
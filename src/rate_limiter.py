@@ -0,0 +1,187 @@
+import os
+import mmap
+import fcntl
+import struct
+import threading
+from contextlib import contextmanager
+from time import monotonic
+
+# tokens, updated_at, paused_until
+_SHARED_STATE = struct.Struct("<ddd")
+
+
+class TokenBucket:
+  """
+  Thread-safe token-bucket rate limiter.
+
+  The bucket holds up to `burst` tokens and refills at `rate` tokens per second. Each request
+  takes a token, so at most `burst` requests can go out back-to-back before callers are held to `rate`.
+  A `rate` of `None` (or anything that isn't positive) disables limiting, although the bucket can still be paused.
+  """
+
+  def __init__(self, rate: float | None, burst: int = 1, clock=monotonic):
+    if burst < 1:
+      raise ValueError("Token bucket burst must be at least 1")
+
+    self.rate = rate if rate and rate > 0 else None
+    self.burst = burst
+    self._clock = clock
+    self._tokens = float(burst)
+    self._updated_at = clock()
+    self._paused_until = 0.0
+    self._condition = threading.Condition()
+
+  @classmethod
+  def from_interval(cls, interval: float, burst: int = 1, clock=monotonic) -> "TokenBucket":
+    """
+    Builds a bucket that allows one request every `interval` seconds on average.
+    """
+    return cls(1 / interval if interval and interval > 0 else None, burst, clock)
+
+  def acquire(self, timeout: float | None = None) -> bool:
+    """
+    Takes a token, blocking until one is available or `timeout` seconds have passed.
+
+    Returns:
+      `bool`: whether a token was taken.
+    """
+    deadline = None if timeout is None else self._clock() + timeout
+
+    with self._condition:
+      while True:
+        with self._synchronized_state():
+          if self.__take():
+            break
+
+          wait_time = self.__time_until_available()
+
+        if deadline is not None:
+          remaining = deadline - self._clock()
+          if remaining <= 0:
+            return False
+
+          wait_time = min(wait_time, remaining)
+
+        self._condition.wait(wait_time)
+
+      # Another waiter may be able to go straight away if there were spare tokens
+      self._condition.notify()
+
+    return True
+
+  def try_acquire(self) -> bool:
+    """
+    Takes a token if one is available right now, without blocking.
+    """
+    return self.acquire(timeout=0)
+
+  def time_until_available(self) -> float:
+    """
+    Returns how many seconds until a token is available, or 0 if one is available now.
+    """
+    with self._condition, self._synchronized_state():
+      return self.__time_until_available()
+
+  def pause(self, seconds: float):
+    """
+    Empties the bucket and holds every caller for `seconds`, e.g. when the server asks us to back off.
+    """
+    with self._condition, self._synchronized_state():
+      self.__refill()
+      self._tokens = 0.0
+      self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+  @contextmanager
+  def _synchronized_state(self):
+    # Wraps every read-modify-write of `_tokens`, `_updated_at` and `_paused_until`.
+    # Subclasses can override this to keep the state somewhere shared, e.g. between processes.
+    yield
+
+  def __take(self) -> bool:
+    if self.__time_until_available() > 0:
+      return False
+
+    if self.rate is not None:
+      self._tokens -= 1
+
+    return True
+
+  def __refill(self):
+    now = self._clock()
+    if self.rate is not None:
+      refill_from = max(self._updated_at, self._paused_until)
+      self._tokens = min(self.burst, self._tokens + max(0.0, now - refill_from) * self.rate)
+
+    self._updated_at = now
+
+  def __time_until_available(self) -> float:
+    self.__refill()
+    pause_remaining = max(0.0, self._paused_until - self._updated_at)
+
+    if self.rate is None:
+      return pause_remaining
+
+    # Nothing refills while paused, so the token deficit only starts shrinking once the pause is over
+    return pause_remaining + max(0.0, (1 - self._tokens) / self.rate)
+
+
+class SharedTokenBucket(TokenBucket):
+  """
+  Token bucket whose state lives in a small memory-mapped file, so every fertilizer process on a host
+  that points at the same file draws from one budget (e.g. a long-running server and a scan from cron).
+
+  Each update happens under an exclusive `flock` on the file. Processes only coordinate through the
+  state itself, so any one of them can use the whole budget when the others are idle. The monotonic
+  clock is system-wide on Linux and macOS, which is what lets timestamps be compared between processes.
+  """
+
+  def __init__(self, state_path: str, rate: float | None, burst: int = 1, clock=monotonic):
+    super().__init__(rate, burst, clock)
+
+    parent_dir = os.path.dirname(state_path)
+    if parent_dir:
+      os.makedirs(parent_dir, exist_ok=True)
+
+    self.state_path = state_path
+    self._fd = os.open(state_path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    with self.__file_lock():
+      if os.fstat(self._fd).st_size < _SHARED_STATE.size:
+        os.ftruncate(self._fd, _SHARED_STATE.size)
+        os.pwrite(self._fd, _SHARED_STATE.pack(self._tokens, self._updated_at, self._paused_until), 0)
+
+    self._map = mmap.mmap(self._fd, _SHARED_STATE.size)
+
+  @classmethod
+  def from_interval(cls, state_path: str, interval: float, burst: int = 1, clock=monotonic) -> "SharedTokenBucket":
+    """
+    Builds a shared bucket that allows one request every `interval` seconds on average.
+    """
+    return cls(state_path, 1 / interval if interval and interval > 0 else None, burst, clock)
+
+  def close(self):
+    self._map.close()
+    os.close(self._fd)
+
+  @contextmanager
+  def _synchronized_state(self):
+    with self.__file_lock():
+      self._tokens, self._updated_at, self._paused_until = _SHARED_STATE.unpack(self._map)
+      # A process configured with a smaller burst shouldn't be able to use another's larger one
+      self._tokens = min(self._tokens, self.burst)
+
+      if self._updated_at > self._clock():
+        # The state was written before a reboot reset the clock, so it's meaningless now
+        self._tokens, self._updated_at, self._paused_until = float(self.burst), self._clock(), 0.0
+
+      yield
+
+      self._map[:] = _SHARED_STATE.pack(self._tokens, self._updated_at, self._paused_until)
+
+  @contextmanager
+  def __file_lock(self):
+    fcntl.flock(self._fd, fcntl.LOCK_EX)
+    try:
+      yield
+    finally:
+      fcntl.flock(self._fd, fcntl.LOCK_UN)
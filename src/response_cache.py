@@ -0,0 +1,99 @@
+import os
+import json
+import sqlite3
+import threading
+from time import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+  tracker TEXT NOT NULL,
+  infohash TEXT NOT NULL,
+  response TEXT NOT NULL,
+  is_hit INTEGER NOT NULL,
+  stored_at REAL NOT NULL,
+  last_used REAL NOT NULL,
+  PRIMARY KEY (tracker, infohash)
+);
+CREATE INDEX IF NOT EXISTS responses_by_last_used ON responses (last_used);
+"""
+
+# These are the errors Gazelle returns when a hash simply doesn't exist on the tracker
+MISS_ERRORS = ("bad hash parameter", "bad parameters")
+
+
+class ResponseCache:
+  """
+  Disk-backed cache of `find_torrent` responses shared by every tracker API.
+
+  Hits (torrent found) and misses (torrent not found) expire after separate TTLs, and once
+  the cache holds more than `max_entries` responses the least recently used ones are evicted.
+  Any other response (e.g. an unknown error) is never cached.
+  """
+
+  def __init__(self, db_path: str, hit_ttl: float, miss_ttl: float, max_entries: int = 1_000_000):
+    parent_dir = os.path.dirname(db_path)
+    if parent_dir:
+      os.makedirs(parent_dir, exist_ok=True)
+
+    self.hit_ttl = hit_ttl
+    self.miss_ttl = miss_ttl
+    self.max_entries = max_entries
+    self._lock = threading.Lock()
+    self._db = sqlite3.connect(db_path, check_same_thread=False)
+    self._db.executescript(SCHEMA)
+
+  def close(self):
+    with self._lock:
+      self._db.close()
+
+  def get(self, tracker: str, infohash: str) -> dict | None:
+    now = time()
+
+    with self._lock, self._db:
+      row = self._db.execute(
+        "SELECT response, is_hit, stored_at FROM responses WHERE tracker = ? AND infohash = ?",
+        (tracker, infohash),
+      ).fetchone()
+
+      if row is None:
+        return None
+
+      response, is_hit, stored_at = row
+      if now - stored_at > (self.hit_ttl if is_hit else self.miss_ttl):
+        self._db.execute("DELETE FROM responses WHERE tracker = ? AND infohash = ?", (tracker, infohash))
+        return None
+
+      self._db.execute(
+        "UPDATE responses SET last_used = ? WHERE tracker = ? AND infohash = ?",
+        (now, tracker, infohash),
+      )
+
+    return json.loads(response)
+
+  def put(self, tracker: str, infohash: str, response: dict):
+    is_hit = response.get("status") == "success"
+    if not is_hit and response.get("error") not in MISS_ERRORS:
+      return
+
+    now = time()
+
+    with self._lock, self._db:
+      self._db.execute(
+        "INSERT OR REPLACE INTO responses (tracker, infohash, response, is_hit, stored_at, last_used) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (tracker, infohash, json.dumps(response), int(is_hit), now, now),
+      )
+      self.__evict()
+
+  def purge(self):
+    with self._lock, self._db:
+      self._db.execute("DELETE FROM responses")
+
+  def __evict(self):
+    overflow = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+
+    if overflow > 0:
+      self._db.execute(
+        "DELETE FROM responses WHERE rowid IN (SELECT rowid FROM responses ORDER BY last_used LIMIT ?)",
+        (overflow,),
+      )
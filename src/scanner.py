@@ -1 +1,687 @@
-import os\\nfrom .api import RedAPI, OpsAPI\\\\\nfrom .filesystem import mkdir_p, list_files_of_extension, assert_path_exists\\\\\nfrom .progress import Progress\\\\\nfrom .torrent import generate_new_torrent_from_file\\\\\nfrom .parser import get_bencoded_data, calculate_infohash\\\\\nfrom .errors import (\\\\\n  TorrentDecodingError,\\\\\n  UnknownTrackerError,\\\\\n  TorrentNotFoundError,\\\\\n  TorrentAlreadyExistsError,\\\\\n  TorrentExistsInClientError\\\\\n)\\\nfrom .injection import Injection\\\\n\\\\n\\\\ndef scan_torrent_file(source_torrent_path: str, output_directory: str, red_api: RedAPI, ops_api: OpsAPI, injector: Injection | None) -> str:\\\"\"\"\\\n  Scans a single .torrent file and generates a new one using the tracker API.\\\\\n  Args:\\\\\n    `source_torrent_path` (`str`): The path to the .torrent file.\\\\\n    `output_directory` (`str`): The directory to save the new .torrent files.\\\\\n    `red_api` (`RedAPI`): The pre-configured RED tracker API.\\\\\n    `ops_api` (`OpsAPI`): The pre-configured OPS tracker API.\\\\\n    `injector` (`Injection`): The pre-configured torrent Injection object.\\\\\n  Returns:\\\\\n    str: The path to the new .torrent file.\\\\\n  Raises:\\\\\n    See `generate_new_torrent_from_file`.\\\\
\ No newline at end of file
+import os
+import heapq
+import queue
+import asyncio
+import itertools
+import threading
+from time import monotonic
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterable, Iterator
+
+from .api import AsyncGazelleAPI, RedAPI, OpsAPI
+from .filesystem import (
+  mkdir_p,
+  iter_files_of_extension,
+  assert_path_exists,
+  matches_entry_filters,
+  root_prefix_length_of,
+)
+from .watcher import TorrentDirectoryWatcher
+from .parser import get_raw_data
+from .progress import Progress
+from .torrent import (
+  generate_new_torrent_from_file,
+  generate_new_torrent_from_file_async,
+  get_reciprocal_tracker_for_file,
+)
+from .errors import (
+  CircuitOpenError,
+  TrackerUnavailableError,
+  UnknownTrackerError,
+  TorrentNotFoundError,
+  TorrentAlreadyExistsError,
+  TorrentExistsInClientError,
+)
+from .injection import Injection
+from .index import IndexedInfohashes, InfohashIndex, iter_indexed_torrent_files
+from .infohashes import CompactInfohashes
+from .journal import DEFAULT_NOT_FOUND_TTL, ScanJournal
+from .metrics import API_RETRIES
+from .probe_stats import SourceFlagStats
+from .scheduler import BACKGROUND
+from .trackers import Tracker, RedTracker, OpsTracker
+
+# How often pipeline workers blocked on a queue check whether the scan has stopped
+PIPELINE_POLL_INTERVAL = 0.1
+
+
+def scan_torrent_file(
+  source_torrent_path: str,
+  output_directory: str,
+  red_api: RedAPI,
+  ops_api: OpsAPI,
+  injector: Injection | None,
+  index_path: str | None = None,
+  probe_stats: SourceFlagStats | None = None,
+  index_false_positive_rate: float = 0.01,
+) -> str:
+  """
+  Scans a single .torrent file and generates a new one using the tracker API.
+
+  Args:
+    `source_torrent_path` (`str`): The path to the .torrent file.
+    `output_directory` (`str`): The directory to save the new .torrent files.
+    `red_api` (`RedAPI`): The pre-configured RED tracker API.
+    `ops_api` (`OpsAPI`): The pre-configured OPS tracker API.
+    `injector` (`Injection`): The pre-configured torrent Injection object.
+    `index_path` (`str`, optional): Path of the persistent infohash index. Defaults to no index.
+    `probe_stats` (`SourceFlagStats`, optional): Source flag hit statistics used to order lookups. Defaults to no statistics.
+    `index_false_positive_rate` (`float`, optional): False positive rate of the index's Bloom filters. Defaults to 0.01.
+  Returns:
+    str: The path to the new .torrent file.
+  Raises:
+    See `generate_new_torrent_from_file`.
+  """
+  source_torrent_path = assert_path_exists(source_torrent_path)
+  output_directory = mkdir_p(output_directory)
+
+  # Generated torrents are saved in a subdirectory per tracker
+  output_entries = iter_files_of_extension(output_directory, ".torrent", recursive=True)
+
+  with __open_index(index_path, false_positive_rate=index_false_positive_rate) as index:
+    output_infohashes = __collect_infohashes(index, output_directory, output_entries)
+
+    new_tracker, new_torrent_filepath, _ = generate_new_torrent_from_file(
+      source_torrent_path,
+      output_directory,
+      red_api,
+      ops_api,
+      input_infohashes={},
+      output_infohashes=output_infohashes,
+      probe_stats=probe_stats,
+    )
+
+  if injector:
+    injector.inject_torrent(
+      source_torrent_path,
+      new_torrent_filepath,
+      new_tracker.site_shortname(),
+    )
+
+  return new_torrent_filepath
+
+
+def create_torrent_directory_watcher(
+  input_directory: str,
+  output_directory: str,
+  red_api: RedAPI,
+  ops_api: OpsAPI,
+  injector: Injection | None,
+  index_path: str | None = None,
+  probe_stats: SourceFlagStats | None = None,
+  recursive: bool = False,
+  include: list[str] | None = None,
+  exclude: list[str] | None = None,
+  index_false_positive_rate: float = 0.01,
+) -> TorrentDirectoryWatcher:
+  """
+  Creates a watcher that runs every .torrent file added to or changed in a directory through `scan_torrent_file`
+  as soon as it's fully written. Call `run()` on the result to start watching.
+
+  Args:
+    `input_directory` (`str`): The directory to watch.
+    `recursive`, `include`, `exclude` (optional): Which input files to scan. See `iter_files_of_extension`.
+    See `scan_torrent_file` for the rest.
+  Returns:
+    `TorrentDirectoryWatcher`: The watcher, not yet running.
+  Raises:
+    `FileNotFoundError`: if the input directory does not exist.
+  """
+  input_directory = assert_path_exists(input_directory)
+  output_directory = mkdir_p(output_directory)
+  # Only used for its colored statuses, since a watch has no total
+  p = Progress(0)
+
+  def scan_new_torrent(source_torrent_path):
+    print(os.path.basename(source_torrent_path))
+
+    try:
+      new_torrent_filepath = scan_torrent_file(
+        source_torrent_path,
+        output_directory,
+        red_api,
+        ops_api,
+        injector,
+        index_path,
+        probe_stats,
+        index_false_positive_rate,
+      )
+      outcome, message = "generated", f"Cross-seed saved as '{new_torrent_filepath}'."
+    except Exception as e:
+      outcome, message = __outcome_for_error(e)
+
+    getattr(p, outcome).print(message)
+
+  return TorrentDirectoryWatcher(
+    input_directory, scan_new_torrent, recursive=recursive, include=include, exclude=exclude
+  )
+
+
+def scan_torrent_directory(
+  input_directory: str,
+  output_directory: str,
+  red_api: RedAPI,
+  ops_api: OpsAPI,
+  injector: Injection | None,
+  index_path: str | None = None,
+  index_workers: int = 1,
+  recursive: bool = False,
+  include: list[str] | None = None,
+  exclude: list[str] | None = None,
+  modified_after: float | None = None,
+  journal_path: str | None = None,
+  resume: bool = False,
+  not_found_ttl: float = DEFAULT_NOT_FOUND_TTL,
+  probe_stats: SourceFlagStats | None = None,
+  lookup_workers: int = 1,
+  inject_workers: int = 1,
+  queue_size: int = 256,
+  index_false_positive_rate: float = 0.01,
+) -> str:
+  """
+  Scans a directory for .torrent files and generates new ones using the tracker APIs.
+
+  Files are hashed up front, then each torrent flows through a pipeline of stages connected by bounded queues:
+  reading its origin tracker, looking it up on the reciprocal tracker and injecting the result. Each stage
+  runs on its own workers, so disk reads, API waits and torrent client requests overlap.
+
+  Args:
+    `input_directory` (`str`): The directory containing the .torrent files.
+    `output_directory` (`str`): The directory to save the new .torrent files.
+    `red_api` (`RedAPI`): The pre-configured RED tracker API.
+    `ops_api` (`OpsAPI`): The pre-configured OPS tracker API.
+    `injector` (`Injection`): The pre-configured torrent Injection object.
+    `index_path` (`str`, optional): Path of the persistent infohash index. Defaults to no index.
+    `index_workers` (`int`, optional): Number of processes used to hash the input and output directories. Defaults to 1.
+    `recursive`, `include`, `exclude`, `modified_after` (optional): Which input files to scan. See `iter_files_of_extension`.
+    `journal_path` (`str`, optional): Where to record the outcome of each scanned file. Defaults to no journal.
+    `resume` (`bool`, optional): Skip files whose recorded outcome in the journal is still valid. Defaults to False.
+    `not_found_ttl` (`float`, optional): Seconds after which a recorded "not found" outcome is checked again. Defaults to 3 days.
+    `probe_stats` (`SourceFlagStats`, optional): Source flag hit statistics used to order lookups. Defaults to no statistics.
+    `lookup_workers` (`int`, optional): Number of threads looking up torrents on each tracker. Defaults to 1.
+    `inject_workers` (`int`, optional): Number of threads injecting torrents into the torrent client. Defaults to 1.
+    `queue_size` (`int`, optional): How many torrents may wait between two stages before the earlier one pauses. Defaults to 256.
+    `index_false_positive_rate` (`float`, optional): False positive rate of the index's Bloom filters. Defaults to 0.01.
+  Returns:
+    str: A report of the scan.
+  Raises:
+    `FileNotFoundError`: if the input directory does not exist.
+  """
+
+  input_directory = assert_path_exists(input_directory)
+  output_directory = mkdir_p(output_directory)
+  walk_options = {"recursive": recursive, "include": include, "exclude": exclude, "modified_after": modified_after}
+
+  with __open_directory_scan(
+    input_directory,
+    output_directory,
+    index_path,
+    index_workers,
+    index_false_positive_rate,
+    walk_options,
+    journal_path,
+    resume,
+    not_found_ttl,
+  ) as (input_torrents, input_infohashes, output_infohashes, p, journal):
+
+    def find_torrent(source_torrent_path, source_torrent_raw):
+      return generate_new_torrent_from_file(
+        source_torrent_path,
+        output_directory,
+        red_api,
+        ops_api,
+        input_infohashes,
+        output_infohashes,
+        probe_stats,
+        should_retry=False,
+        # Directory scans are bulk work, so they yield to webhook requests sharing the same API
+        priority=BACKGROUND,
+        source_torrent_raw=source_torrent_raw,
+      )
+
+    def finish_torrent(source_torrent_path, new_torrent):
+      new_tracker, new_torrent_filepath, was_previously_generated = new_torrent
+
+      if injector:
+        injector.inject_torrent(source_torrent_path, new_torrent_filepath, new_tracker.site_shortname())
+
+      return __outcome_for_new_torrent(new_tracker, new_torrent_filepath, was_previously_generated, injector)
+
+    scan_results = __run_scan_pipeline(
+      input_torrents,
+      input_infohashes,
+      find_torrent,
+      finish_torrent,
+      max_attempts=max(red_api.max_retries, ops_api.max_retries),
+      # Torrents are looked up on the reciprocal tracker, whose API makes the requests
+      api_names={RedTracker: red_api.sitename, OpsTracker: ops_api.sitename},
+      lookup_workers=lookup_workers,
+      inject_workers=inject_workers,
+      queue_size=queue_size,
+    )
+
+    for i, (source_torrent_path, outcome, message) in enumerate(scan_results, p.total - len(input_torrents) + 1):
+      __report_outcome(i, source_torrent_path, outcome, message, p, journal)
+
+  return p.report()
+
+
+async def scan_torrent_directory_async(
+  input_directory: str,
+  output_directory: str,
+  red_api: AsyncGazelleAPI,
+  ops_api: AsyncGazelleAPI,
+  injector: Injection | None,
+  index_path: str | None = None,
+  index_workers: int = 1,
+  recursive: bool = False,
+  include: list[str] | None = None,
+  exclude: list[str] | None = None,
+  modified_after: float | None = None,
+  journal_path: str | None = None,
+  resume: bool = False,
+  not_found_ttl: float = DEFAULT_NOT_FOUND_TTL,
+  probe_stats: SourceFlagStats | None = None,
+  max_concurrent_scans: int = 256,
+  inject_workers: int = 1,
+  index_false_positive_rate: float = 0.01,
+) -> str:
+  """
+  Same as `scan_torrent_directory`, but drives every lookup from the running event loop with `AsyncGazelleAPI`
+  front-ends rather than from worker threads. Each tracker's requests are still paced by its own rate limiter,
+  and a failed request is retried without holding up any other torrent.
+
+  Args:
+    `red_api` (`AsyncGazelleAPI`): asyncio front-end of the pre-configured RED tracker API.
+    `ops_api` (`AsyncGazelleAPI`): asyncio front-end of the pre-configured OPS tracker API.
+    `max_concurrent_scans` (`int`, optional): How many torrents may be in flight at once. Defaults to 256.
+    `inject_workers` (`int`, optional): Number of threads injecting torrents into the torrent client. Defaults to 1.
+    See `scan_torrent_directory` for the rest.
+  Returns:
+    str: A report of the scan.
+  Raises:
+    `FileNotFoundError`: if the input directory does not exist.
+  """
+
+  input_directory = assert_path_exists(input_directory)
+  output_directory = mkdir_p(output_directory)
+  walk_options = {"recursive": recursive, "include": include, "exclude": exclude, "modified_after": modified_after}
+
+  with __open_directory_scan(
+    input_directory,
+    output_directory,
+    index_path,
+    index_workers,
+    index_false_positive_rate,
+    walk_options,
+    journal_path,
+    resume,
+    not_found_ttl,
+  ) as (input_torrents, input_infohashes, output_infohashes, p, journal):
+    pending_torrents = iter(input_torrents)
+    results = asyncio.Queue()
+    # The torrent client is only reached through blocking calls, which run on a few threads of their own
+    injection_slots = asyncio.Semaphore(inject_workers)
+
+    async def scan_torrent(source_torrent_path):
+      new_tracker, new_torrent_filepath, was_previously_generated = await generate_new_torrent_from_file_async(
+        source_torrent_path,
+        output_directory,
+        red_api,
+        ops_api,
+        input_infohashes,
+        output_infohashes,
+        probe_stats,
+        # Directory scans are bulk work, so they yield to webhook requests sharing the same API
+        priority=BACKGROUND,
+      )
+
+      if injector:
+        async with injection_slots:
+          await asyncio.to_thread(
+            injector.inject_torrent, source_torrent_path, new_torrent_filepath, new_tracker.site_shortname()
+          )
+
+      return __outcome_for_new_torrent(new_tracker, new_torrent_filepath, was_previously_generated, injector)
+
+    async def worker():
+      # Workers take turns pulling from the same listing, so at most `max_concurrent_scans` torrents are in flight
+      for source_torrent_path in pending_torrents:
+        try:
+          outcome, message = await scan_torrent(source_torrent_path)
+        except Exception as e:
+          outcome, message = __outcome_for_error(e)
+
+        results.put_nowait((source_torrent_path, outcome, message))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(max_concurrent_scans, len(input_torrents)))]
+
+    try:
+      for i in range(p.total - len(input_torrents) + 1, p.total + 1):
+        __report_outcome(i, *(await results.get()), p, journal)
+    finally:
+      for task in workers:
+        task.cancel()
+
+      await asyncio.gather(*workers, return_exceptions=True)
+
+  return p.report()
+
+
+def __run_scan_pipeline(
+  input_torrents: list[str],
+  input_infohashes: dict,
+  find_torrent: Callable[[str, bytes | None], tuple],
+  finish_torrent: Callable[[str, tuple], tuple[str, str]],
+  max_attempts: int = 1,
+  api_names: dict[type[Tracker], str] = {},
+  lookup_workers: int = 1,
+  inject_workers: int = 1,
+  queue_size: int = 256,
+) -> Iterator[tuple[str, str, str]]:
+  # Runs each torrent through three stages, connected by queues that hold at most `queue_size` torrents
+  # so a fast stage waits for a slow one rather than piling up work in memory:
+  #
+  # 1. Routing: a single thread reads each source torrent to find its reciprocal tracker. The bytes it read
+  #    travel with the torrent, so `find_torrent` doesn't have to read the file again.
+  # 2. Lookup: `lookup_workers` threads per destination tracker call `find_torrent`. RED and OPS have
+  #    independent rate limits, so a slow lookup on one tracker never leaves the other's request budget idle.
+  #    Torrents that can't be routed get a queue of their own, where they fail without making any requests.
+  # 3. Finishing: `inject_workers` threads call `finish_torrent` with what the lookup found, e.g. to inject it.
+  #
+  # `find_torrent` may raise `TrackerUnavailableError`, in which case the torrent is set aside and retried
+  # once the error says it's worth trying again, up to `max_attempts` times. Those retries are counted in the
+  # API metrics under the tracker's name in `api_names`. Any other exception is classified into an outcome.
+  # Yields `(path, outcome, message)` in the order the scans finish.
+  stop_event = threading.Event()
+  lookup_queues = {tracker: queue.Queue(queue_size) for tracker in (RedTracker, OpsTracker, None)}
+  finish_queue = queue.Queue(queue_size)
+  results = queue.SimpleQueue()
+
+  def route():
+    for source_torrent_path in input_torrents:
+      try:
+        # Read once here and handed on to the lookup, unless the index already knows the torrent's hashes
+        source_torrent_raw = (
+          None if isinstance(input_infohashes, IndexedInfohashes) else get_raw_data(source_torrent_path)
+        )
+        new_tracker = get_reciprocal_tracker_for_file(source_torrent_path, input_infohashes, source_torrent_raw)
+      except Exception as e:
+        results.put((source_torrent_path, *__outcome_for_error(e)))
+        continue
+
+      if not __put_in_stage_queue(lookup_queues[new_tracker], (source_torrent_path, source_torrent_raw), stop_event):
+        return
+
+  def look_up(tracker, lookup_queue):
+    # Failed lookups wait here, ordered by when they're due, while the rest of the queue carries on
+    delayed_torrents = []
+    sequence = itertools.count()
+
+    def look_up_torrent(source_torrent_path, source_torrent_raw, attempt):
+      try:
+        new_torrent = find_torrent(source_torrent_path, source_torrent_raw)
+      except TrackerUnavailableError as e:
+        # An open circuit means no request was made, so it doesn't use up an attempt
+        next_attempt = attempt if isinstance(e, CircuitOpenError) else attempt + 1
+
+        if next_attempt > max_attempts:
+          results.put((source_torrent_path, "error", str(e)))
+        else:
+          if next_attempt > attempt:
+            API_RETRIES.labels(api_names.get(tracker, ""), "torrent").inc()
+
+          due_at = monotonic() + e.retry_after
+          heapq.heappush(
+            delayed_torrents, (due_at, next(sequence), source_torrent_path, source_torrent_raw, next_attempt)
+          )
+
+        return
+      except Exception as e:
+        results.put((source_torrent_path, *__outcome_for_error(e)))
+        return
+
+      __put_in_stage_queue(finish_queue, (source_torrent_path, new_torrent), stop_event)
+
+    while not stop_event.is_set():
+      if delayed_torrents and delayed_torrents[0][0] <= monotonic():
+        _due_at, _sequence, source_torrent_path, source_torrent_raw, attempt = heapq.heappop(delayed_torrents)
+      else:
+        timeout = delayed_torrents[0][0] - monotonic() if delayed_torrents else None
+
+        try:
+          routed_torrent = __get_from_stage_queue(lookup_queue, stop_event, timeout)
+        except queue.Empty:
+          continue
+
+        if routed_torrent is None:
+          continue
+
+        (source_torrent_path, source_torrent_raw), attempt = routed_torrent, 1
+
+      try:
+        look_up_torrent(source_torrent_path, source_torrent_raw, attempt)
+      except Exception as e:
+        # Anything unexpected still needs a result, or the scan would wait for this torrent forever
+        results.put((source_torrent_path, *__outcome_for_error(e)))
+
+  def finish():
+    while not stop_event.is_set():
+      try:
+        finished_lookup = __get_from_stage_queue(finish_queue, stop_event)
+      except queue.Empty:
+        continue
+
+      if finished_lookup is None:
+        continue
+
+      source_torrent_path, new_torrent = finished_lookup
+
+      try:
+        results.put((source_torrent_path, *finish_torrent(source_torrent_path, new_torrent)))
+      except Exception as e:
+        results.put((source_torrent_path, *__outcome_for_error(e)))
+
+  with ThreadPoolExecutor(max_workers=1 + len(lookup_queues) * lookup_workers + inject_workers) as executor:
+    try:
+      workers = [executor.submit(route)]
+
+      for tracker, lookup_queue in lookup_queues.items():
+        for _ in range(lookup_workers):
+          workers.append(executor.submit(look_up, tracker, lookup_queue))
+
+      for _ in range(inject_workers):
+        workers.append(executor.submit(finish))
+
+      # Every torrent ends up with exactly one result, which is how we know the pipeline is done
+      for _ in range(len(input_torrents)):
+        yield __get_scan_result(results, workers)
+    finally:
+      # Also lets the workers wind down after their current torrent if the scan is interrupted
+      stop_event.set()
+      __wake_stage_workers(finish_queue, inject_workers)
+      for lookup_queue in lookup_queues.values():
+        __wake_stage_workers(lookup_queue, lookup_workers)
+
+
+def __get_scan_result(results: queue.SimpleQueue, workers: list[Future]) -> tuple[str, str, str]:
+  # A worker that died would never deliver the results it owes, so rather than waiting forever its error is raised
+  while True:
+    try:
+      return results.get(timeout=PIPELINE_POLL_INTERVAL)
+    except queue.Empty:
+      pass
+
+    for worker in workers:
+      if worker.done() and worker.exception():
+        raise worker.exception()
+
+
+def __wake_stage_workers(stage_queue: queue.Queue, worker_count: int):
+  # Workers waiting on an empty queue would otherwise only notice the pipeline stopped on their next poll
+  for _ in range(worker_count):
+    try:
+      stage_queue.put_nowait(None)
+    except queue.Full:
+      return
+
+
+def __put_in_stage_queue(stage_queue: queue.Queue, item, stop_event: threading.Event) -> bool:
+  # Waits for room in the queue, giving up if the pipeline stops first. Returns whether the item was queued.
+  while not stop_event.is_set():
+    try:
+      stage_queue.put(item, timeout=PIPELINE_POLL_INTERVAL)
+      return True
+    except queue.Full:
+      continue
+
+  return False
+
+
+def __get_from_stage_queue(stage_queue: queue.Queue, stop_event: threading.Event, timeout: float | None = None):
+  # Waits up to `timeout` for an item, raising `queue.Empty` if none arrives or the pipeline stops first
+  deadline = None if timeout is None else monotonic() + timeout
+
+  while not stop_event.is_set():
+    remaining = PIPELINE_POLL_INTERVAL if deadline is None else min(PIPELINE_POLL_INTERVAL, deadline - monotonic())
+    if remaining <= 0:
+      break
+
+    try:
+      return stage_queue.get(timeout=remaining)
+    except queue.Empty:
+      continue
+
+  raise queue.Empty
+
+
+def __outcome_for_new_torrent(new_tracker, new_torrent_filepath, was_previously_generated, injector) -> tuple[str, str]:
+  if was_previously_generated:
+    if injector:
+      return "already_exists", "Torrent was previously generated but was injected into your torrent client."
+    else:
+      return "already_exists", "Torrent was previously generated."
+  else:
+    return (
+      "generated",
+      f"Found with source '{new_tracker.site_shortname()}' and generated as '{new_torrent_filepath}'.",
+    )
+
+
+def __outcome_for_error(e: Exception) -> tuple[str, str]:
+  if isinstance(e, UnknownTrackerError):
+    return "skipped", str(e)
+  if isinstance(e, (TorrentAlreadyExistsError, TorrentExistsInClientError)):
+    return "already_exists", str(e)
+  if isinstance(e, TorrentNotFoundError):
+    return "not_found", str(e)
+
+  # Covers `TorrentDecodingError` along with anything unexpected
+  return "error", str(e)
+
+
+@contextmanager
+def __open_directory_scan(
+  input_directory,
+  output_directory,
+  index_path,
+  index_workers,
+  index_false_positive_rate,
+  walk_options,
+  journal_path,
+  resume,
+  not_found_ttl,
+):
+  # Lists and indexes both directories, then yields everything a scan loop needs:
+  # `(input_torrents, input_infohashes, output_infohashes, progress, journal)`.
+  # `input_torrents` excludes torrents whose outcome was restored from the journal.
+  #
+  # Every input torrent is indexed, and only `include`, `exclude` and `modified_after` choose which ones are
+  # scanned. Otherwise a scan of recent torrents wouldn't notice they duplicate an older one.
+  input_entries = iter_files_of_extension(input_directory, ".torrent", recursive=walk_options["recursive"])
+  # Generated torrents are saved in a subdirectory per tracker
+  output_entries = iter_files_of_extension(output_directory, ".torrent", recursive=True)
+  input_filters = {key: value for key, value in walk_options.items() if key != "recursive"}
+  root_prefix_length = root_prefix_length_of(input_directory)
+  input_torrents = []
+
+  def is_selected(entry):
+    return matches_entry_filters(entry, root_prefix_length, **input_filters)
+
+  with __open_index(index_path, index_workers, index_false_positive_rate) as index:
+    # The input listing is streamed straight into the index while we record the paths to scan.
+    # Scanning itself has to wait for the whole listing since any input may collide with any other.
+    input_infohashes = __collect_infohashes(
+      index, input_directory, __record_paths(input_entries, input_torrents, is_selected), index_workers
+    )
+    output_infohashes = __collect_infohashes(index, output_directory, output_entries, index_workers)
+
+    p = Progress(len(input_torrents))
+
+    with __open_journal(journal_path, resume, not_found_ttl) as journal:
+      input_torrents = __restore_journaled_outcomes(input_torrents, journal, p)
+
+      yield input_torrents, input_infohashes, output_infohashes, p, journal
+
+
+def __report_outcome(i, source_torrent_path, outcome, message, p, journal):
+  basename = os.path.basename(source_torrent_path)
+  print(f"({i}/{p.total}) {basename}")
+  getattr(p, outcome).print(message)
+
+  if journal:
+    journal.record(source_torrent_path, outcome, message)
+
+
+def __open_journal(journal_path: str | None, resume: bool, not_found_ttl: float):
+  return ScanJournal(journal_path, resume=resume, not_found_ttl=not_found_ttl) if journal_path else nullcontext()
+
+
+def __restore_journaled_outcomes(input_torrents: list[str], journal: ScanJournal | None, p: Progress) -> list[str]:
+  if not journal:
+    return input_torrents
+
+  remaining_torrents = []
+
+  for source_torrent_path in input_torrents:
+    journaled_outcome = journal.get_outcome(source_torrent_path)
+
+    if journaled_outcome:
+      # Counted in the report, but not in the metrics, since no scan happened
+      getattr(p, journaled_outcome[0]).increment(count_metric=False)
+    else:
+      remaining_torrents.append(source_torrent_path)
+
+  if len(remaining_torrents) < len(input_torrents):
+    print(f"Skipping {len(input_torrents) - len(remaining_torrents)} torrents already recorded in the scan journal")
+
+  return remaining_torrents
+
+
+def __open_index(index_path: str | None, workers: int = 1, false_positive_rate: float = 0.01):
+  return InfohashIndex(index_path, workers, false_positive_rate) if index_path else nullcontext()
+
+
+def __collect_infohashes(index: InfohashIndex | None, directory: str, entries: Iterable, workers: int = 1):
+  if index:
+    return index.refresh(directory, entries)
+
+  return __collect_infohashes_from_files([entry.path for entry in entries], workers)
+
+
+def __record_paths(
+  entries: Iterable[os.DirEntry], paths: list[str], is_selected: Callable[[os.DirEntry], bool]
+) -> Iterator[os.DirEntry]:
+  for entry in entries:
+    if is_selected(entry):
+      paths.append(entry.path)
+    yield entry
+
+
+def __collect_infohashes_from_files(files: list[str], workers: int = 1) -> CompactInfohashes:
+  return CompactInfohashes(
+    (infohash, filepath)
+    for filepath, infohash, _tracker, _variants, _source in iter_indexed_torrent_files(files, workers)
+    if infohash
+  )
@@ -0,0 +1,78 @@
+import itertools
+import threading
+from time import monotonic
+
+from .rate_limiter import TokenBucket
+
+# Lower values go first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class PriorityScheduler:
+  """
+  Hands out a rate limiter's tokens by priority, so interactive requests (like webhooks) jump ahead
+  of queued background work (like directory sweeps) sharing the same API.
+
+  Within a priority, requests are served in arrival order. To keep background work from starving under
+  a steady stream of interactive requests, anything that has waited `max_wait` seconds is promoted to
+  `INTERACTIVE`.
+  """
+
+  def __init__(self, rate_limiter: TokenBucket, max_wait: float = 30, clock=monotonic):
+    self.rate_limiter = rate_limiter
+    self.max_wait = max_wait
+    self._clock = clock
+    self._waiters = []
+    self._sequence = itertools.count()
+    self._condition = threading.Condition()
+
+  def acquire(self, priority: int = INTERACTIVE):
+    """
+    Blocks until it's this request's turn and a token is available, then takes the token.
+    """
+    waiter = (priority, self._clock(), next(self._sequence))
+
+    with self._condition:
+      self._waiters.append(waiter)
+
+      try:
+        while True:
+          if self.__next_waiter() is not waiter:
+            self._condition.wait()
+            continue
+
+          if self.rate_limiter.try_acquire():
+            return
+
+          self._condition.wait(self.rate_limiter.time_until_available())
+
+          # Time has passed, so a longer-waiting request may have been promoted ahead of this one
+          if self.__next_waiter() is not waiter:
+            self._condition.notify_all()
+      finally:
+        self._waiters.remove(waiter)
+        self._condition.notify_all()
+
+  def try_acquire(self, priority: int = INTERACTIVE) -> bool:
+    """
+    Takes a token without blocking, unless a queued request with a higher priority is waiting for it.
+    """
+    with self._condition:
+      if any(self.__effective_priority(waiter) < priority for waiter in self._waiters):
+        return False
+
+      return self.rate_limiter.try_acquire()
+
+  def time_until_available(self) -> float:
+    return self.rate_limiter.time_until_available()
+
+  def __next_waiter(self):
+    return min(self._waiters, key=lambda waiter: (self.__effective_priority(waiter), waiter[2]))
+
+  def __effective_priority(self, waiter) -> int:
+    priority, enqueued_at, _sequence = waiter
+    if self._clock() - enqueued_at >= self.max_wait:
+      return INTERACTIVE
+
+    return priority
@@ -0,0 +1,68 @@
+import threading
+from collections.abc import Callable, Hashable, Iterable
+
+
+class SingleFlight:
+  """
+  Collapses concurrent calls for the same work into one. A call made while another call sharing any of
+  its keys is in flight doesn't run, but waits for that call and gets its result (or its exception).
+
+  Only calls that overlap in time are collapsed; nothing is cached once a call returns.
+
+  A waiting call can pass `rerun_if`, a predicate on the exception of the call it waited on. When it
+  returns True, the waiting call runs `fn` itself instead of raising.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._flights = {}
+
+  def do(self, keys: Iterable[Hashable], fn, *args, rerun_if: Callable[[BaseException], bool] | None = None, **kwargs):
+    keys = list(keys)
+
+    while True:
+      with self._lock:
+        flight = next((self._flights[key] for key in keys if key in self._flights), None)
+        is_leader = flight is None
+
+        if is_leader:
+          flight = _Flight()
+          for key in keys:
+            self._flights[key] = flight
+
+      if is_leader:
+        break
+
+      try:
+        return flight.wait()
+      except BaseException as e:
+        if rerun_if is None or not rerun_if(e):
+          raise
+
+    try:
+      flight.result = fn(*args, **kwargs)
+      return flight.result
+    except BaseException as e:
+      flight.error = e
+      raise
+    finally:
+      with self._lock:
+        for key in keys:
+          if self._flights.get(key) is flight:
+            del self._flights[key]
+
+      flight.finished.set()
+
+
+class _Flight:
+  def __init__(self):
+    self.result = None
+    self.error = None
+    self.finished = threading.Event()
+
+  def wait(self):
+    self.finished.wait()
+    if self.error is not None:
+      raise self.error
+
+    return self.result
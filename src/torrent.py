@@ -1,18 +1,41 @@
 import os
-import copy
 from html import unescape
-
-from .api import RedAPI, OpsAPI
-from .trackers import RedTracker, OpsTracker
-from .errors import TorrentDecodingError, UnknownTrackerError, TorrentNotFoundError, TorrentAlreadyExistsError
-from .filesystem import replace_extension
+from typing import Iterable
+
+from .api import AsyncGazelleAPI, RedAPI, OpsAPI
+from .index import IndexedInfohashes
+from .infohashes import CompactInfohashes
+from .probe_stats import SourceFlagStats
+from .scheduler import INTERACTIVE
+from .single_flight import SingleFlight
+from .trackers import Tracker, RedTracker, OpsTracker
+from .errors import (
+  TorrentDecodingError,
+  UnknownTrackerError,
+  TorrentNotFoundError,
+  TorrentAlreadyExistsError,
+  NonCanonicalBencodeError,
+  TrackerUnavailableError,
+)
 from .parser import (
-  get_bencoded_data,
-  get_origin_tracker,
-  recalculate_hash_for_new_source,
+  get_raw_data,
+  get_source,
+  decode_bencoded_data,
+  decode_bencoded_data_lazily,
+  get_origin_tracker_for_file,
+  calculate_hashes_for_sources,
   save_bencoded_data,
+  save_bencoded_segments,
+  splice_torrent_entries,
 )
 
+# Keyed by the candidate hashes on the reciprocal tracker, which are the same for every caller asking about a torrent
+_in_flight_lookups = SingleFlight()
+
+# The API calls the shared lookup steps ask their caller to make
+FIND_TORRENT = "find_torrent"
+ANNOUNCE_URL = "announce_url"
+
 
 def generate_new_torrent_from_file(
   source_torrent_path: str,
@@ -21,6 +44,10 @@ def generate_new_torrent_from_file(
   ops_api: OpsAPI,
   input_infohashes: dict = {},
   output_infohashes: dict = {},
+  probe_stats: SourceFlagStats | None = None,
+  should_retry: bool = True,
+  priority: int = INTERACTIVE,
+  source_torrent_raw: bytes | None = None,
 ) -> tuple[OpsTracker | RedTracker, str]:
   """
   Generates a new torrent file for the reciprocal tracker of the original torrent file if it exists on the reciprocal tracker.
@@ -31,7 +58,12 @@ def generate_new_torrent_from_file(
     `red_api` (`RedApi`): The pre-configured API object for RED.
     `ops_api` (`OpsApi`): The pre-configured API object for OPS.
     `input_infohashes` (`dict`, optional): A dictionary of infohashes and their filenames from the input directory for caching purposes. Defaults to an empty dictionary.
+      May also be an `IndexedInfohashes`, in which case the source torrent's stored tracker and hashes are reused.
     `output_infohashes` (`dict`, optional): A dictionary of infohashes and their filenames from the output directory for caching purposes. Defaults to an empty dictionary.
+    `probe_stats` (`SourceFlagStats`, optional): Hit statistics used to look up the most likely source flag first, and updated with the result. Defaults to the fixed source flag order.
+    `should_retry` (`bool`, optional): Whether failed API requests are retried in place. If not, `TrackerUnavailableError` is raised instead. Defaults to True.
+    `priority` (`int`, optional): The scheduling priority of the API requests, e.g. `scheduler.BACKGROUND` for bulk scans. Defaults to `scheduler.INTERACTIVE`.
+    `source_torrent_raw` (`bytes`, optional): The original torrent file's contents, if they've already been read. Defaults to reading the file.
   Returns:
     A tuple containing the new tracker class (`RedTracker` or `OpsTracker`), the path to the new torrent file, and a boolean
     representing whether the torrent already existed (False: created just now, True: torrent file already existed).
@@ -40,31 +72,146 @@ def generate_new_torrent_from_file(
     `UnknownTrackerError`: if the original torrent file is not from OPS or RED.
     `TorrentNotFoundError`: if the original torrent file could not be found on the reciprocal tracker.
     `TorrentAlreadyExistsError`: if the new torrent file already exists in the input or output directory.
+    `TrackerUnavailableError`: if `should_retry` is unset and the reciprocal tracker couldn't be reached.
     `Exception`: if an unknown error occurs.
   """
 
-  source_torrent_data, source_tracker = __get_bencoded_data_and_tracker(source_torrent_path)
-  new_torrent_data = copy.deepcopy(source_torrent_data)
-  new_tracker = source_tracker.reciprocal_tracker()
+  new_tracker, all_possible_hashes, source_torrent_raw, existing_filepath, origin_source = __prepare_new_torrent(
+    source_torrent_path, input_infohashes, output_infohashes, probe_stats, source_torrent_raw
+  )
+  if existing_filepath:
+    return (new_tracker, existing_filepath, True)
+
+  # A webhook racing a directory scan (or a repeated webhook) for the same torrent shares one lookup.
+  # Scans don't retry, so a caller that does makes the lookup itself if the one it joined gave up.
+  return _in_flight_lookups.do(
+    all_possible_hashes.values(),
+    __look_up_and_save_new_torrent,
+    source_torrent_path,
+    source_torrent_raw,
+    output_directory,
+    new_tracker,
+    all_possible_hashes,
+    origin_source,
+    output_infohashes,
+    red_api,
+    ops_api,
+    probe_stats,
+    should_retry,
+    priority,
+    rerun_if=lambda e: should_retry and isinstance(e, TrackerUnavailableError),
+  )
+
+
+async def generate_new_torrent_from_file_async(
+  source_torrent_path: str,
+  output_directory: str,
+  red_api: AsyncGazelleAPI,
+  ops_api: AsyncGazelleAPI,
+  input_infohashes: dict = {},
+  output_infohashes: dict = {},
+  probe_stats: SourceFlagStats | None = None,
+  priority: int = INTERACTIVE,
+  source_torrent_raw: bytes | None = None,
+) -> tuple[OpsTracker | RedTracker, str]:
+  """
+  Same as `generate_new_torrent_from_file`, but makes its API requests with `AsyncGazelleAPI` front-ends.
+  Failed requests are retried without blocking the event loop.
+  """
+  new_tracker, all_possible_hashes, source_torrent_raw, existing_filepath, origin_source = __prepare_new_torrent(
+    source_torrent_path, input_infohashes, output_infohashes, probe_stats, source_torrent_raw
+  )
+  if existing_filepath:
+    return (new_tracker, existing_filepath, True)
+
+  new_tracker_api = __get_reciprocal_tracker_api(new_tracker, red_api, ops_api)
+  steps = __look_up_and_save_steps(
+    source_torrent_path,
+    source_torrent_raw,
+    output_directory,
+    new_tracker,
+    new_tracker_api.site_url,
+    all_possible_hashes,
+    origin_source,
+    output_infohashes,
+    probe_stats,
+  )
+  result = None
+
+  try:
+    while True:
+      call, *call_args = steps.send(result)
+
+      if call == FIND_TORRENT:
+        result = await new_tracker_api.find_torrent(*call_args, priority=priority)
+      else:
+        result = await new_tracker_api.announce_url()
+  except StopIteration as e:
+    return e.value
+
+
+def __look_up_and_save_new_torrent(
+  source_torrent_path,
+  source_torrent_raw,
+  output_directory,
+  new_tracker,
+  all_possible_hashes,
+  origin_source,
+  output_infohashes,
+  red_api,
+  ops_api,
+  probe_stats,
+  should_retry,
+  priority,
+):
   new_tracker_api = __get_reciprocal_tracker_api(new_tracker, red_api, ops_api)
+  steps = __look_up_and_save_steps(
+    source_torrent_path,
+    source_torrent_raw,
+    output_directory,
+    new_tracker,
+    new_tracker_api.site_url,
+    all_possible_hashes,
+    origin_source,
+    output_infohashes,
+    probe_stats,
+  )
+  result = None
+
+  try:
+    while True:
+      call, *call_args = steps.send(result)
+
+      if call == FIND_TORRENT:
+        result = new_tracker_api.find_torrent(*call_args, should_retry=should_retry, priority=priority)
+      else:
+        result = new_tracker_api.announce_url
+  except StopIteration as e:
+    return e.value
+
+
+def __look_up_and_save_steps(
+  source_torrent_path,
+  source_torrent_raw,
+  output_directory,
+  new_tracker,
+  site_url,
+  all_possible_hashes,
+  origin_source,
+  output_infohashes,
+  probe_stats,
+):
+  # Shared by the blocking and asyncio lookups. Yields the API calls it needs, `(FIND_TORRENT, hash)` and
+  # `(ANNOUNCE_URL,)`, which the caller makes and sends back the result of.
   stored_api_response = None
 
-  all_possible_hashes = __calculate_all_possible_hashes(source_torrent_data, new_tracker.source_flags_for_creation())
-  found_input_hash = __check_matching_hashes(all_possible_hashes, input_infohashes)
-  found_output_hash = __check_matching_hashes(all_possible_hashes, output_infohashes)
-
-  if found_input_hash:
-    raise TorrentAlreadyExistsError(
-      f"Torrent already exists in input directory at {input_infohashes[found_input_hash]}"
-    )
-  if found_output_hash:
-    return (new_tracker, output_infohashes[found_output_hash], True)
-
-  for new_source in new_tracker.source_flags_for_creation():
-    new_hash = recalculate_hash_for_new_source(source_torrent_data, new_source)
-    stored_api_response = new_tracker_api.find_torrent(new_hash)
+  for new_source, new_hash in all_possible_hashes.items():
+    stored_api_response = yield FIND_TORRENT, new_hash
 
     if stored_api_response["status"] == "success":
+      if probe_stats:
+        probe_stats.record_hit(new_tracker.site_shortname(), origin_source, new_source)
+
       new_torrent_filepath = __generate_torrent_output_filepath(
         stored_api_response,
         new_tracker,
@@ -76,26 +223,104 @@ def generate_new_torrent_from_file(
         return (new_tracker, new_torrent_filepath, True)
 
       if new_torrent_filepath:
-        torrent_id = __get_torrent_id(stored_api_response)
-
-        new_torrent_data[b"info"][b"source"] = new_source  # This is already bytes rather than str
-        new_torrent_data[b"announce"] = new_tracker_api.announce_url.encode()
-        new_torrent_data[b"comment"] = __generate_torrent_url(new_tracker_api.site_url, torrent_id).encode()
-        save_bencoded_data(new_torrent_filepath, new_torrent_data)
+        announce_url = yield (ANNOUNCE_URL,)
+        __save_new_torrent(
+          source_torrent_path,
+          source_torrent_raw,
+          new_torrent_filepath,
+          new_source,
+          announce_url,
+          __generate_torrent_url(site_url, __get_torrent_id(stored_api_response)),
+        )
+        # Indexed straight away, so later lookups find it and the next refresh doesn't have to hash it again
+        if isinstance(output_infohashes, IndexedInfohashes):
+          output_infohashes.add(new_torrent_filepath)
 
         return (new_tracker, new_torrent_filepath, False)
 
-  if stored_api_response["error"] in ("bad hash parameter", "bad parameters"):
+  __raise_for_failed_lookup(stored_api_response, new_tracker)
+
+
+def get_reciprocal_tracker_for_file(
+  source_torrent_path: str, input_infohashes: dict = {}, source_torrent_raw: bytes | None = None
+) -> type[Tracker] | None:
+  """
+  Returns the tracker a new torrent would be generated for, without making any API requests.
+  Returns `None` if the torrent can't be decoded or isn't from OPS or RED. `source_torrent_raw` saves reading
+  the file again if its contents are already at hand.
+  """
+  indexed_entry = __get_indexed_entry(source_torrent_path, input_infohashes)
+  if indexed_entry:
+    return indexed_entry[0].reciprocal_tracker()
+
+  try:
+    _source_torrent_raw, source_tracker, _source = __read_source_torrent(source_torrent_path, source_torrent_raw)
+  except (TorrentDecodingError, UnknownTrackerError):
+    return None
+
+  return source_tracker.reciprocal_tracker()
+
+
+def __prepare_new_torrent(source_torrent_path, input_infohashes, output_infohashes, probe_stats, source_torrent_raw):
+  # Everything that happens before the API lookup. Returns the new tracker, the hashes to look up in order
+  # (keyed by source flag), the raw source torrent if it was read, the path of an already generated torrent
+  # and the source torrent's own source flag.
+  indexed_entry = __get_indexed_entry(source_torrent_path, input_infohashes)
+
+  if indexed_entry:
+    source_tracker, all_possible_hashes, origin_source = indexed_entry
+  else:
+    source_torrent_raw, source_tracker, origin_source = __read_source_torrent(source_torrent_path, source_torrent_raw)
+    all_possible_hashes = calculate_hashes_for_sources(
+      source_torrent_raw, source_tracker.reciprocal_tracker().source_flags_for_creation()
+    )
+
+  new_tracker = source_tracker.reciprocal_tracker()
+  if probe_stats:
+    all_possible_hashes = probe_stats.order_variants(new_tracker.site_shortname(), origin_source, all_possible_hashes)
+
+  found_input_hash = __check_matching_hashes(all_possible_hashes.values(), input_infohashes)
+  found_output_hash = __check_matching_hashes(all_possible_hashes.values(), output_infohashes)
+
+  if found_input_hash:
+    raise TorrentAlreadyExistsError(
+      f"Torrent already exists in input directory at {input_infohashes[found_input_hash]}"
+    )
+  if found_output_hash:
+    return new_tracker, all_possible_hashes, source_torrent_raw, output_infohashes[found_output_hash], origin_source
+
+  return new_tracker, all_possible_hashes, source_torrent_raw, None, origin_source
+
+
+def __save_new_torrent(
+  source_torrent_path, source_torrent_raw, new_torrent_filepath, new_source, announce_url, comment
+):
+  source_torrent_raw = source_torrent_raw or get_raw_data(source_torrent_path)
+  entries = {b"announce": announce_url.encode(), b"comment": comment.encode()}
+  info_entries = {b"source": new_source}  # This is already bytes rather than str
+
+  try:
+    segments = splice_torrent_entries(source_torrent_raw, entries, info_entries)
+    save_bencoded_segments(new_torrent_filepath, segments)
+  except (TorrentDecodingError, NonCanonicalBencodeError):
+    # Splicing is only safe for canonically encoded files, so anything else is decoded and re-encoded
+    new_torrent_data = decode_bencoded_data(source_torrent_raw)
+    new_torrent_data.update(entries)
+    new_torrent_data[b"info"].update(info_entries)
+    save_bencoded_data(new_torrent_filepath, new_torrent_data)
+
+
+def __raise_for_failed_lookup(api_response, new_tracker):
+  if api_response["error"] in ("bad hash parameter", "bad parameters"):
     raise TorrentNotFoundError(f"Torrent could not be found on {new_tracker.site_shortname()}")
 
   raise Exception(f"An unknown error occurred in the API response from {new_tracker.site_shortname()}")
 
 
-def __calculate_all_possible_hashes(source_torrent_data: dict, sources: list[str]) -> list[str]:
-  return [recalculate_hash_for_new_source(source_torrent_data, source) for source in sources]
-
+def __check_matching_hashes(all_possible_hashes: Iterable[str], infohashes: dict) -> str:
+  if isinstance(infohashes, (IndexedInfohashes, CompactInfohashes)):
+    return infohashes.first_match(all_possible_hashes)
 
-def __check_matching_hashes(all_possible_hashes: list[str], infohashes: dict) -> str:
   for hash in all_possible_hashes:
     if hash in infohashes:
       return hash
@@ -127,28 +352,27 @@ def __generate_torrent_url(site_url: str, torrent_id: str) -> str:
   return f"{site_url}/torrents.php?torrentid={torrent_id}"
 
 
-def __get_bencoded_data_and_tracker(torrent_path):
-  # The fastresume stuff is to support qBittorrent since it doesn't store
-  # announce URLs in the torrent file IFF we're taking the file from `BT_backup`.
-  #
-  # qbit stores that information in a sidecar file that has the exact same name
-  # as the torrent file but with a `.fastresume` extension instead. It's also stored
-  # in a list of lists called `trackers` in this `.fastresume` file instead of `announce`.
-  fastresume_path = replace_extension(torrent_path, ".fastresume")
-  source_torrent_data = get_bencoded_data(torrent_path)
-  fastresume_data = get_bencoded_data(fastresume_path)
+def __get_indexed_entry(torrent_path, input_infohashes):
+  if isinstance(input_infohashes, IndexedInfohashes):
+    return input_infohashes.get_entry(torrent_path)
+
+  return None
+
+
+def __read_source_torrent(torrent_path, source_torrent_raw=None):
+  # Only decoded lazily since we just need a few keys to identify the tracker
+  source_torrent_raw = source_torrent_raw or get_raw_data(torrent_path)
+  source_torrent_data = decode_bencoded_data_lazily(source_torrent_raw)
 
   if not source_torrent_data or not source_torrent_data.get(b"info"):
     raise TorrentDecodingError("Error decoding torrent file")
 
-  torrent_tracker = get_origin_tracker(source_torrent_data)
-  fastresume_tracker = get_origin_tracker(fastresume_data) if fastresume_data else None
-  source_tracker = torrent_tracker or fastresume_tracker
+  source_tracker = get_origin_tracker_for_file(torrent_path, source_torrent_data)
 
   if not source_tracker:
     raise UnknownTrackerError("Torrent not from OPS or RED based on source or announce URL")
 
-  return source_torrent_data, source_tracker
+  return source_torrent_raw, source_tracker, get_source(source_torrent_data) or b""
 
 
 def __get_reciprocal_tracker_api(new_tracker, red_api, ops_api):
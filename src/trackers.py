@@ -62,3 +62,7 @@ class RedTracker(Tracker):
   @staticmethod
   def reciprocal_tracker():
     return OpsTracker
+
+
+def get_tracker_by_shortname(shortname: str | None) -> type[Tracker] | None:
+  return {tracker.site_shortname(): tracker for tracker in (RedTracker, OpsTracker)}.get(shortname)
@@ -0,0 +1,195 @@
+import os
+import select
+from time import monotonic
+from typing import Callable
+
+from .filesystem import iter_files_of_extension, matches_path_filters, replace_extension
+from .inotify import (
+  Inotify,
+  IN_CLOSE_WRITE,
+  IN_CREATE,
+  IN_DELETE_SELF,
+  IN_IGNORED,
+  IN_ISDIR,
+  IN_MODIFY,
+  IN_MOVED_TO,
+  IN_ONLYDIR,
+  IN_Q_OVERFLOW,
+)
+
+WATCH_MASK = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR
+SIDECAR_EXTENSION = ".fastresume"
+
+
+class TorrentDirectoryWatcher:
+  """
+  Watches a directory with inotify and hands each new or changed .torrent file to `on_torrent`.
+
+  Files are only handed off once they've gone `settle_time` seconds without being written to, so partially
+  written files are never read. In directories with `.fastresume` files (like qBittorrent's `BT_backup`),
+  a torrent also waits for its own `.fastresume` sidecar, for up to `sidecar_timeout` seconds.
+
+  The watcher sleeps in `poll` until there's an event or a pending torrent is due, so it uses no CPU while idle.
+  """
+
+  def __init__(
+    self,
+    input_directory: str,
+    on_torrent: Callable[[str], None],
+    recursive: bool = False,
+    include: list[str] | None = None,
+    exclude: list[str] | None = None,
+    settle_time: float = 1,
+    sidecar_timeout: float = 30,
+  ):
+    self.input_directory = input_directory
+    self.on_torrent = on_torrent
+    self.recursive = recursive
+    self.include = include
+    self.exclude = exclude
+    self.settle_time = settle_time
+    self.sidecar_timeout = sidecar_timeout
+    # Path of each torrent waiting to settle, mapped to when it was first and last written to
+    self._pending_torrents = {}
+    self._handled_files = {}
+    self._watched_directories = {}
+    self._sidecar_directories = set()
+    self._wake_read_fd, self._wake_write_fd = os.pipe()
+
+  def run(self):
+    """
+    Watches until `stop` is called. Torrents that already exist when watching starts are left alone unless they change.
+    """
+    with Inotify() as inotify:
+      self.__watch_directory(inotify, self.input_directory)
+
+      for entry in iter_files_of_extension(self.input_directory, recursive=self.recursive):
+        self._handled_files[entry.path] = self.__file_key(entry.path)
+
+      poller = select.poll()
+      poller.register(inotify.fileno(), select.POLLIN)
+      poller.register(self._wake_read_fd, select.POLLIN)
+
+      try:
+        while True:
+          timeout = self.__time_until_next_torrent()
+          ready_fds = [fd for fd, _event in poller.poll(None if timeout is None else timeout * 1000)]
+
+          if self._wake_read_fd in ready_fds:
+            return
+
+          for wd, mask, _cookie, name in inotify.read_events():
+            self.__handle_event(inotify, wd, mask, name)
+
+          for torrent_path in self.__pop_settled_torrents():
+            self.on_torrent(torrent_path)
+      finally:
+        os.close(self._wake_read_fd)
+        os.close(self._wake_write_fd)
+
+  def stop(self):
+    """
+    Makes `run` return once it's done with the current torrent. Safe to call from any thread.
+    """
+    os.write(self._wake_write_fd, b"\0")
+
+  def __watch_directory(self, inotify, directory):
+    try:
+      self._watched_directories[inotify.add_watch(directory, WATCH_MASK)] = directory
+    except OSError:
+      # It was removed before we got to it
+      return
+
+    with os.scandir(directory) as entries:
+      for entry in entries:
+        if entry.name.endswith(SIDECAR_EXTENSION):
+          self._sidecar_directories.add(directory)
+        elif self.recursive and entry.is_dir(follow_symlinks=False):
+          self.__watch_directory(inotify, entry.path)
+
+  def __handle_event(self, inotify, wd, mask, name):
+    if mask & IN_Q_OVERFLOW:
+      # Some events were dropped, so fall back to comparing every file with what we've seen
+      for entry in iter_files_of_extension(self.input_directory, recursive=self.recursive):
+        self.__queue_torrent(entry.path)
+      return
+
+    directory = self._watched_directories.get(wd)
+    if directory is None:
+      return
+    if mask & (IN_IGNORED | IN_DELETE_SELF):
+      self._watched_directories.pop(wd, None)
+      return
+
+    path = os.path.join(directory, name)
+
+    if mask & IN_ISDIR:
+      if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+        # Files can land in a new directory before its watch exists, so it's scanned as well
+        self.__watch_directory(inotify, path)
+        for entry in iter_files_of_extension(path, recursive=True):
+          self.__queue_torrent(entry.path)
+    elif name.endswith(SIDECAR_EXTENSION):
+      self._sidecar_directories.add(directory)
+    elif name.endswith(".torrent"):
+      self.__queue_torrent(path)
+
+  def __queue_torrent(self, path):
+    relative_path = os.path.relpath(path, self.input_directory)
+    if not matches_path_filters(relative_path, self.include, self.exclude):
+      return
+
+    now = monotonic()
+    first_event_at, _last_event_at = self._pending_torrents.get(path, (now, now))
+    self._pending_torrents[path] = (first_event_at, now)
+
+  def __pop_settled_torrents(self) -> list[str]:
+    now = monotonic()
+    settled_torrents = []
+
+    for path, (first_event_at, last_event_at) in list(self._pending_torrents.items()):
+      if now - last_event_at < self.settle_time:
+        continue
+      if self.__is_waiting_for_sidecar(path) and now - first_event_at < self.sidecar_timeout:
+        continue
+
+      del self._pending_torrents[path]
+      file_key = self.__file_key(path)
+
+      # Skips files that were deleted since, or that were only touched without changing
+      if file_key and self._handled_files.get(path) != file_key:
+        self._handled_files[path] = file_key
+        settled_torrents.append(path)
+
+    return settled_torrents
+
+  def __time_until_next_torrent(self) -> float | None:
+    if not self._pending_torrents:
+      return None
+
+    now = monotonic()
+    due_times = []
+
+    for path, (first_event_at, last_event_at) in self._pending_torrents.items():
+      due_at = last_event_at + self.settle_time
+      if self.__is_waiting_for_sidecar(path):
+        # The sidecar showing up is an event of its own, so only the timeout needs a wakeup
+        due_at = max(due_at, first_event_at + self.sidecar_timeout)
+
+      due_times.append(due_at)
+
+    return max(min(due_times) - now, 0)
+
+  def __is_waiting_for_sidecar(self, path) -> bool:
+    return os.path.dirname(path) in self._sidecar_directories and not os.path.exists(
+      replace_extension(path, SIDECAR_EXTENSION)
+    )
+
+  @staticmethod
+  def __file_key(path):
+    try:
+      stat = os.stat(path)
+    except OSError:
+      return None
+
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
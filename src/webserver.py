@@ -1,12 +1,21 @@
 import os
+import json
 import logging
-from flask import Flask, request
+from time import monotonic
+from flask import Flask, Response, request
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
+from src.http_server import WSGIServer
+from src.jobs import JobQueue, iter_finished_jobs
+from src.metrics import REGISTRY, WEBHOOK_QUEUE_DEPTH, set_enabled
 from src.parser import is_valid_infohash
 from src.scanner import scan_torrent_file
+from src.single_flight import SingleFlight
 from src.errors import TorrentAlreadyExistsError, TorrentNotFoundError
 
 app = Flask(__name__)
+# Input torrents are named after their infohash, so repeated webhooks for one torrent share a single scan
+in_flight_scans = SingleFlight()
 
 
 @app.before_request
@@ -16,12 +25,22 @@ def log_request_info():
 
 @app.after_request
 def log_response_info(response):
-  app.logger.info(f"Responding: {response.get_data()}")
+  # Reading a streamed body here would buffer the whole stream before anything is sent,
+  # and logging every metrics scrape in full would drown out everything else
+  if response.is_streamed or request.path == "/metrics":
+    app.logger.info(f"Responding with a {response.mimetype} stream")
+  else:
+    app.logger.info(f"Responding: {response.get_data()}")
+
   return response
 
 
 @app.route("/api/webhook", methods=["POST"])
 def webhook():
+  """
+  Queues a scan of the input torrent with the given infohash and responds with `202` and the job's id straight away.
+  With a `wait` query parameter, waits up to that many seconds for the scan to finish and responds with its result.
+  """
   config = app.config
   request_form = request.form.to_dict()
   infohash = request_form.get("infohash")
@@ -35,6 +54,79 @@ def webhook():
   if not os.path.exists(filepath):
     return http_error(f"No torrent found at {filepath}", 404)
 
+  wait_time = parse_wait_time(request.args.get("wait"))
+  if wait_time is False:
+    return http_error("Invalid 'wait' parameter", 400)
+
+  job = config["job_queue"].submit(scan_webhook_torrent, filepath)
+  return job_response(job, wait_time)
+
+
+@app.route("/api/webhook/batch", methods=["POST"])
+def webhook_batch():
+  """
+  Scans the input torrents for a JSON array of infohashes, streaming back one NDJSON line per unique
+  infohash as each scan finishes. Lines carry the same `status`, `message` and `code` the webhook would.
+  """
+  config = app.config
+  infohashes = request.get_json(silent=True)
+
+  if not isinstance(infohashes, list):
+    return http_error("Request body must be a JSON array of infohashes", 400)
+
+  # Infohashes are case-insensitive, so duplicates are found that way while keeping the first spelling of each
+  unique_infohashes = {}
+  for infohash in infohashes:
+    unique_infohashes.setdefault(str(infohash).lower(), infohash)
+
+  immediate_results = []
+  jobs = {}
+
+  for infohash in unique_infohashes.values():
+    # NOTE: always ensure safety checks are done before this filepath is ever used
+    filepath = f"{config['input_dir']}/{infohash}.torrent"
+
+    if not is_valid_infohash(infohash):
+      immediate_results.append((infohash, http_error("Invalid infohash", 400)))
+    elif not os.path.exists(filepath):
+      immediate_results.append((infohash, http_error(f"No torrent found at {filepath}", 404)))
+    else:
+      jobs[config["job_queue"].submit(scan_webhook_torrent, filepath)] = infohash
+
+  def stream_results():
+    for infohash, result in immediate_results:
+      yield ndjson_line(infohash, result)
+
+    for job in iter_finished_jobs(jobs):
+      yield ndjson_line(jobs[job], job_response(job))
+
+  return Response(stream_results(), mimetype="application/x-ndjson")
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+  """
+  Responds with the result of a finished webhook job, or `202` while it's still queued or running.
+  Accepts the same `wait` query parameter as the webhook.
+  """
+  job = app.config["job_queue"].get(job_id)
+  if job is None:
+    return http_error("Job not found", 404)
+
+  wait_time = parse_wait_time(request.args.get("wait"))
+  if wait_time is False:
+    return http_error("Invalid 'wait' parameter", 400)
+
+  return job_response(job, wait_time)
+
+
+def scan_webhook_torrent(filepath):
+  return in_flight_scans.do([filepath], scan_webhook_torrent_once, filepath)
+
+
+def scan_webhook_torrent_once(filepath):
+  config = app.config
+
   try:
     new_filepath = scan_torrent_file(
       filepath,
@@ -42,6 +134,9 @@ def webhook():
       config["red_api"],
       config["ops_api"],
       config["injector"],
+      index_path=config.get("index_path"),
+      probe_stats=config.get("probe_stats"),
+      index_false_positive_rate=config.get("index_false_positive_rate", 0.01),
     )
 
     return http_success(new_filepath, 201)
@@ -53,6 +148,40 @@ def webhook():
     return http_error(str(e), 500)
 
 
+def job_response(job, wait_time=None):
+  if job.wait(wait_time or 0):
+    return job.result if job.error is None else http_error(str(job.error), 500)
+
+  body = {"status": job.status, "message": f"Job {job.status}", "job_id": job.id}
+  return body, 202, {"Location": f"/api/jobs/{job.id}"}
+
+
+def ndjson_line(infohash, response):
+  body, code = response[:2]
+  return json.dumps({"infohash": infohash, "code": code, **body}) + "\n"
+
+
+def parse_wait_time(value):
+  # Returns the number of seconds to wait, `None` for no waiting, or `False` if the value is invalid
+  if value is None:
+    return None
+
+  try:
+    wait_time = float(value)
+  except ValueError:
+    return False
+
+  return wait_time if 0 <= wait_time < float("inf") else False
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+  """
+  Serves the metrics in the Prometheus text format.
+  """
+  return Response(generate_latest(REGISTRY), content_type=CONTENT_TYPE_LATEST)
+
+
 @app.errorhandler(404)
 def page_not_found(_e):
   return http_error("Not found", 404)
@@ -66,8 +195,24 @@ def http_error(message, code):
   return {"status": "error", "message": message}, code
 
 
-def run_webserver(input_dir, output_dir, red_api, ops_api, injector, host="0.0.0.0", port=9713):
+def run_webserver(
+  input_dir,
+  output_dir,
+  red_api,
+  ops_api,
+  injector,
+  host="0.0.0.0",
+  port=9713,
+  index_path=None,
+  probe_stats=None,
+  webhook_workers=4,
+  threads=8,
+  keep_alive_timeout=5,
+  drain_timeout=30,
+  index_false_positive_rate=0.01,
+):
   app.logger.setLevel(logging.INFO)
+  set_enabled(True)
   app.config.update(
     {
       "input_dir": input_dir,
@@ -75,7 +220,21 @@ def run_webserver(input_dir, output_dir, red_api, ops_api, injector, host="0.0.0
       "red_api": red_api,
       "ops_api": ops_api,
       "injector": injector,
+      "index_path": index_path,
+      "probe_stats": probe_stats,
+      "index_false_positive_rate": index_false_positive_rate,
+      "job_queue": JobQueue(webhook_workers),
     }
   )
 
-  app.run(debug=False, host=host, port=port)
+  WEBHOOK_QUEUE_DEPTH.set_function(lambda: app.config["job_queue"].pending_count)
+  server = WSGIServer(host, int(port), app, threads, keep_alive_timeout, drain_timeout)
+  app.logger.info(f"Listening on {host}:{port} with {threads} threads")
+
+  try:
+    server.serve_until_signalled()
+  finally:
+    # Scans that were already accepted get whatever is left of the drain timeout to finish.
+    # Those that haven't started by then are cancelled.
+    deadline = server.drain_deadline or monotonic() + drain_timeout
+    app.config["job_queue"].shutdown(timeout=max(deadline - monotonic(), 0))
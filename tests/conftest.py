@@ -18,14 +18,14 @@ def mock_config():
 @pytest.fixture
 def red_api():
   instance = RedAPI("redsecret", delay_in_seconds=0)
-  instance._max_retries = 1
+  instance.max_retries = 1
   return instance
 
 
 @pytest.fixture
 def ops_api():
   instance = OpsAPI("opssecret", delay_in_seconds=0)
-  instance._max_retries = 1
+  instance.max_retries = 1
   return instance
 
 
@@ -1,26 +1,34 @@
+import time
+import httpx
 import pytest
+import asyncio
+import threading
+import requests
 import requests_mock
 
 from .helpers import SetupTeardown
 
-from src.errors import AuthenticationError
+from src.errors import AuthenticationError, CircuitOpenError, TrackerUnavailableError
+from src.circuit_breaker import CircuitBreaker
 from src.api import GazelleAPI
+from src.response_cache import ResponseCache
 
 
 class MockApi(GazelleAPI):
-  def __init__(self, api_key, delay_in_seconds=2):
+  def __init__(self, api_key, delay_in_seconds=2, response_cache=None):
     super().__init__(
       site_url="https://foo.bar",
       tracker_url="https://baz.qux",
       auth_header={"Authorization": f"token {api_key}"},
       rate_limit=delay_in_seconds,
+      response_cache=response_cache,
     )
 
 
 @pytest.fixture
 def mock_api_instance():
   instance = MockApi("supersecret")
-  instance._max_retries = 1
+  instance.max_retries = 1
   return instance
 
 
@@ -66,6 +74,118 @@ class TestGazelleGetFindTorrent(SetupTeardown):
       assert response["info"] == "success"
 
 
+class TestGazelleRetries(SetupTeardown):
+  @pytest.fixture
+  def retrying_api_instance(self):
+    instance = MockApi("supersecret", delay_in_seconds=0)
+    instance.max_retries = 3
+    instance._retry_wait_time = lambda _x: 0
+    return instance
+
+  def test_retries_failed_requests_in_place(self, retrying_api_instance):
+    with requests_mock.Mocker() as m:
+      m.get(
+        "https://foo.bar/ajax.php?hash=321cba&action=torrent",
+        [{"exc": requests.exceptions.ConnectTimeout}, {"json": {"status": "success"}}],
+      )
+
+      assert retrying_api_instance.find_torrent("321cba") == {"status": "success"}
+      assert m.call_count == 2
+
+  def test_raises_instead_of_retrying_if_asked(self, retrying_api_instance):
+    retrying_api_instance._retry_wait_time = lambda _x: 7
+
+    with pytest.raises(TrackerUnavailableError) as excinfo:
+      with requests_mock.Mocker() as m:
+        m.get("https://foo.bar/ajax.php?hash=321cba&action=torrent", exc=requests.exceptions.ConnectTimeout)
+        retrying_api_instance.find_torrent("321cba", should_retry=False)
+
+    assert m.call_count == 1
+    assert str(excinfo.value) == "Request timed out on MockApi"
+    assert excinfo.value.retry_after == 7
+
+  def test_refuses_requests_while_the_circuit_is_open(self, retrying_api_instance):
+    retrying_api_instance._circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+    with requests_mock.Mocker() as m:
+      m.get("https://foo.bar/ajax.php?hash=321cba&action=torrent", exc=requests.exceptions.ConnectTimeout)
+
+      for _ in range(2):
+        with pytest.raises(TrackerUnavailableError):
+          retrying_api_instance.find_torrent("321cba", should_retry=False)
+
+      with pytest.raises(CircuitOpenError) as excinfo:
+        retrying_api_instance.find_torrent("321cba", should_retry=False)
+
+      assert m.call_count == 2
+      assert 0 < excinfo.value.retry_after <= 60
+
+  def test_pauses_the_rate_limiter_when_rate_limited(self, retrying_api_instance):
+    with requests_mock.Mocker() as m:
+      m.get(
+        "https://foo.bar/ajax.php?hash=321cba&action=torrent",
+        [{"status_code": 429, "headers": {"Retry-After": "0.1"}}, {"json": {"status": "success"}}],
+      )
+
+      start = time.monotonic()
+      response = retrying_api_instance.find_torrent("321cba")
+
+      assert response == {"status": "success"}
+      assert time.monotonic() - start >= 0.1
+      assert retrying_api_instance._circuit_breaker.consecutive_failures == 0
+
+  def test_understands_retry_after_dates(self, retrying_api_instance):
+    with requests_mock.Mocker() as m:
+      m.get(
+        "https://foo.bar/ajax.php?hash=321cba&action=torrent",
+        [{"status_code": 429, "headers": {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}}, {"json": {}}],
+      )
+
+      retrying_api_instance.find_torrent("321cba")
+
+      assert retrying_api_instance._rate_limiter.time_until_available() == 0
+
+
+class TestGazelleFindTorrentWithCache(SetupTeardown):
+  @pytest.fixture
+  def cached_api_instance(self):
+    cache = ResponseCache("/tmp/output/api_cache.db", hit_ttl=100, miss_ttl=100)
+    instance = MockApi("supersecret", delay_in_seconds=0, response_cache=cache)
+    instance.max_retries = 1
+    yield instance
+    cache.close()
+
+  def test_serves_repeated_lookups_from_cache(self, cached_api_instance):
+    with requests_mock.Mocker() as m:
+      m.get("https://foo.bar/ajax.php?hash=321cba&action=torrent", json={"status": "success", "info": "yes"})
+
+      first_response = cached_api_instance.find_torrent("321cba")
+      second_response = cached_api_instance.find_torrent("321cba")
+
+      assert first_response == second_response == {"status": "success", "info": "yes"}
+      assert m.call_count == 1
+
+  def test_caches_known_misses(self, cached_api_instance):
+    with requests_mock.Mocker() as m:
+      m.get(
+        "https://foo.bar/ajax.php?hash=321cba&action=torrent", json={"status": "failure", "error": "bad parameters"}
+      )
+
+      cached_api_instance.find_torrent("321cba")
+      cached_api_instance.find_torrent("321cba")
+
+      assert m.call_count == 1
+
+  def test_does_not_cache_unknown_errors(self, cached_api_instance):
+    with requests_mock.Mocker() as m:
+      m.get("https://foo.bar/ajax.php?hash=321cba&action=torrent", json={"status": "failure", "error": "oops"})
+
+      cached_api_instance.find_torrent("321cba")
+      cached_api_instance.find_torrent("321cba")
+
+      assert m.call_count == 2
+
+
 class TestGazelleAnnounceUrl(SetupTeardown):
   def test_returns_announce_url_if_set(self, mock_api_instance):
     instance = mock_api_instance
@@ -89,3 +209,176 @@ class TestGazelleAnnounceUrl(SetupTeardown):
 
       assert response == "https://baz.qux/mypasskey/announce"
       assert instance._announce_url == response
+
+  def test_fetches_announce_url_once_for_concurrent_callers(self, mock_api_instance):
+    def slow_account_info(_request, _context):
+      time.sleep(0.1)
+      return {"status": "success", "response": {"passkey": "mypasskey"}}
+
+    with requests_mock.Mocker() as m:
+      m.get("https://foo.bar/ajax.php?action=index", json=slow_account_info)
+      responses = []
+      threads = [threading.Thread(target=lambda: responses.append(mock_api_instance.announce_url)) for _ in range(4)]
+
+      for thread in threads:
+        thread.start()
+      for thread in threads:
+        thread.join(5)
+
+      assert responses == ["https://baz.qux/mypasskey/announce"] * 4
+      assert m.call_count == 1
+
+
+class TestGazelleSessions(SetupTeardown):
+  def test_uses_one_session_per_thread(self, mock_api_instance):
+    sessions = []
+    thread = threading.Thread(target=lambda: sessions.append(mock_api_instance._session))
+    thread.start()
+    thread.join(5)
+
+    assert mock_api_instance._session is mock_api_instance._session
+    assert sessions[0] is not mock_api_instance._session
+    assert sessions[0].headers["Authorization"] == "token supersecret"
+
+
+def make_transport(*responses, requests=None):
+  responses = list(responses)
+
+  def handler(request):
+    if requests is not None:
+      requests.append(request)
+
+    response = responses.pop(0) if len(responses) > 1 else responses[0]
+    if isinstance(response, Exception):
+      raise response
+    return response
+
+  return httpx.MockTransport(handler)
+
+
+def run_async(api, transport, method, *args, **kwargs):
+  async def run():
+    async with api.asynchronous(transport=transport) as async_api:
+      return await getattr(async_api, method)(*args, **kwargs)
+
+  return asyncio.run(run())
+
+
+class TestAsyncGazelleAPI(SetupTeardown):
+  @pytest.fixture
+  def retrying_api_instance(self):
+    instance = MockApi("supersecret", delay_in_seconds=0)
+    instance.max_retries = 3
+    instance._retry_wait_time = lambda _x: 0
+    return instance
+
+  def test_finds_torrents(self, mock_api_instance):
+    requests = []
+    transport = make_transport(httpx.Response(200, json={"status": "success"}), requests=requests)
+
+    response = run_async(mock_api_instance, transport, "find_torrent", "321cba")
+
+    assert response == {"status": "success"}
+    assert requests[0].url == "https://foo.bar/ajax.php?hash=321cba&action=torrent"
+    assert requests[0].headers["Authorization"] == "token supersecret"
+
+  def test_raises_authentication_error_if_unsuccessful(self, mock_api_instance):
+    transport = make_transport(httpx.Response(200, json={"status": "failure", "error": "you didn't do it!"}))
+
+    with pytest.raises(AuthenticationError) as excinfo:
+      run_async(mock_api_instance, transport, "get_account_info")
+
+    assert str(excinfo.value) == "you didn't do it!"
+
+  def test_shares_the_announce_url_with_the_sync_api(self, mock_api_instance):
+    transport = make_transport(httpx.Response(200, json={"status": "success", "response": {"passkey": "mypasskey"}}))
+
+    assert run_async(mock_api_instance, transport, "announce_url") == "https://baz.qux/mypasskey/announce"
+    assert mock_api_instance.announce_url == "https://baz.qux/mypasskey/announce"
+
+  def test_retries_failed_requests(self, retrying_api_instance):
+    requests = []
+    transport = make_transport(
+      httpx.ConnectTimeout("timed out"), httpx.Response(200, json={"status": "success"}), requests=requests
+    )
+
+    assert run_async(retrying_api_instance, transport, "find_torrent", "321cba") == {"status": "success"}
+    assert len(requests) == 2
+
+  def test_raises_instead_of_retrying_if_asked(self, retrying_api_instance):
+    retrying_api_instance._retry_wait_time = lambda _x: 7
+    transport = make_transport(httpx.ConnectTimeout("timed out"))
+
+    with pytest.raises(TrackerUnavailableError) as excinfo:
+      run_async(retrying_api_instance, transport, "find_torrent", "321cba", should_retry=False)
+
+    assert str(excinfo.value) == "Request timed out on MockApi"
+    assert excinfo.value.retry_after == 7
+
+  def test_shares_the_circuit_breaker_with_the_sync_api(self, retrying_api_instance):
+    retrying_api_instance._circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+
+    with requests_mock.Mocker() as m:
+      m.get("https://foo.bar/ajax.php?hash=321cba&action=torrent", exc=requests.exceptions.ConnectTimeout)
+
+      for _ in range(2):
+        with pytest.raises(TrackerUnavailableError):
+          retrying_api_instance.find_torrent("321cba", should_retry=False)
+
+    requests_made = []
+    transport = make_transport(httpx.Response(200, json={}), requests=requests_made)
+
+    with pytest.raises(CircuitOpenError):
+      run_async(retrying_api_instance, transport, "find_torrent", "321cba", should_retry=False)
+
+    assert requests_made == []
+
+  def test_shares_the_response_cache_with_the_sync_api(self):
+    cache = ResponseCache("/tmp/output/api_cache.db", hit_ttl=100, miss_ttl=100)
+    instance = MockApi("supersecret", delay_in_seconds=0, response_cache=cache)
+
+    with requests_mock.Mocker() as m:
+      m.get("https://foo.bar/ajax.php?hash=321cba&action=torrent", json={"status": "success", "info": "yes"})
+      instance.find_torrent("321cba")
+
+    requests_made = []
+    transport = make_transport(httpx.Response(200, json={}), requests=requests_made)
+
+    assert run_async(instance, transport, "find_torrent", "321cba") == {"status": "success", "info": "yes"}
+    assert requests_made == []
+    cache.close()
+
+  def test_waits_for_the_rate_limit_without_blocking_the_event_loop(self):
+    instance = MockApi("supersecret", delay_in_seconds=0.2)
+    transport = make_transport(httpx.Response(200, json={"status": "success"}))
+    ticks = []
+
+    async def tick():
+      for _ in range(3):
+        ticks.append(time.monotonic())
+        await asyncio.sleep(0.02)
+
+    async def find_torrent(async_api):
+      response = await async_api.find_torrent("def")
+      return response, time.monotonic()
+
+    async def run():
+      async with instance.asynchronous(transport=transport) as async_api:
+        await async_api.find_torrent("abc")
+        return await asyncio.gather(find_torrent(async_api), tick())
+
+    (response, found_at), _ = asyncio.run(run())
+
+    assert response == {"status": "success"}
+    assert ticks[0] < found_at
+
+  def test_pauses_the_shared_rate_limiter_when_rate_limited(self, retrying_api_instance):
+    transport = make_transport(
+      httpx.Response(429, headers={"Retry-After": "0.1"}), httpx.Response(200, json={"status": "success"})
+    )
+
+    start = time.monotonic()
+    response = run_async(retrying_api_instance, transport, "find_torrent", "321cba")
+
+    assert response == {"status": "success"}
+    assert time.monotonic() - start >= 0.1
@@ -1,4 +1,5 @@
 import pytest
+from datetime import datetime
 
 from .helpers import SetupTeardown
 
@@ -51,6 +52,28 @@ class TestArgs(SetupTeardown):
     print(captured.err)
     assert "--server requires --input-directory" in captured.err
 
+  def test_watch_requires_input_directory(self, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+      parse_args(["--watch", "-o", "foo", "-f", "bar"])
+
+    captured = capsys.readouterr()
+
+    assert excinfo.value.code == 2
+    assert "--watch requires --input-directory" in captured.err
+
+  def test_watch_cannot_be_combined_with_server(self, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+      parse_args(["--watch", "-s", "-o", "foo", "-i", "bar"])
+
+    captured = capsys.readouterr()
+
+    assert excinfo.value.code == 2
+    assert "--watch can't be combined with --server" in captured.err
+
+  def test_parses_watch(self):
+    assert parse_args(["-w", "-i", "foo", "-o", "bar"]).watch is True
+    assert parse_args(["-i", "foo", "-o", "bar"]).watch is False
+
   def test_requires_output_directory(self, capsys):
     with pytest.raises(SystemExit) as excinfo:
       parse_args(["-i", "foo"])
@@ -64,3 +87,55 @@ class TestArgs(SetupTeardown):
     args = parse_args(["-i", "foo", "-o", "bar", "-c", "baz.json"])
 
     assert args.config_file == "baz.json"
+
+  def test_defaults_directory_walk_options(self):
+    args = parse_args(["-i", "foo", "-o", "bar"])
+
+    assert args.recursive is False
+    assert args.include is None
+    assert args.exclude is None
+    assert args.modified_after is None
+
+  def test_sets_directory_walk_options(self):
+    args = parse_args(
+      ["-i", "foo", "-o", "bar", "-r", "--include", "*.torrent", "--exclude", "a/*", "--exclude", "b/*"]
+      + ["--modified-after", "2024-01-31"]
+    )
+
+    assert args.recursive is True
+    assert args.include == ["*.torrent"]
+    assert args.exclude == ["a/*", "b/*"]
+    assert args.modified_after == datetime(2024, 1, 31).timestamp()
+
+  def test_rejects_invalid_modified_after_date(self, capsys):
+    with pytest.raises(SystemExit):
+      parse_args(["-i", "foo", "-o", "bar", "--modified-after", "yesterday"])
+
+    assert "invalid date: 'yesterday'" in capsys.readouterr().err
+
+  def test_sets_resume(self):
+    assert parse_args(["-i", "foo", "-o", "bar"]).resume is False
+    assert parse_args(["-i", "foo", "-o", "bar", "--resume"]).resume is True
+    assert parse_args(["-i", "foo", "-o", "bar", "--incremental"]).resume is True
+
+  def test_sets_asyncio(self):
+    assert parse_args(["-i", "foo", "-o", "bar"]).asyncio is False
+    assert parse_args(["-i", "foo", "-o", "bar", "--asyncio"]).asyncio is True
+
+  def test_asyncio_only_applies_to_directory_scans(self, capsys):
+    with pytest.raises(SystemExit) as excinfo:
+      parse_args(["-i", "foo", "-o", "bar", "--asyncio", "--server"])
+
+    captured = capsys.readouterr()
+
+    assert excinfo.value.code == 2
+    assert "--asyncio only applies to one-off --input-directory scans" in captured.err
+
+  def test_sets_cache_flags(self):
+    args = parse_args(["-i", "foo", "-o", "bar"])
+    assert args.no_cache is False
+    assert args.purge_cache is False
+
+    args = parse_args(["-i", "foo", "-o", "bar", "--no-cache", "--purge-cache"])
+    assert args.no_cache is True
+    assert args.purge_cache is True
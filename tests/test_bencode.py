@@ -0,0 +1,185 @@
+import pytest
+
+from .helpers import get_torrent_path, SetupTeardown
+
+from src.errors import TorrentDecodingError, NonCanonicalBencodeError
+from src.bencode import (
+  string_span,
+  skip_value,
+  iter_dict_items,
+  find_info_span,
+  find_dict_entry_span,
+  splice_dict,
+  decode_value,
+  LazyBencodeDict,
+)
+
+
+class TestStringSpan(SetupTeardown):
+  def test_returns_offsets_of_string_contents(self):
+    assert string_span(b"3:foo", 0) == (2, 5)
+
+  def test_raises_if_string_runs_past_end(self):
+    with pytest.raises(TorrentDecodingError):
+      string_span(b"10:foo", 0)
+
+  def test_raises_on_leading_zero_when_strict(self):
+    with pytest.raises(NonCanonicalBencodeError):
+      string_span(b"03:foo", 0)
+
+  def test_allows_leading_zero_when_not_strict(self):
+    assert string_span(b"03:foo", 0, strict=False) == (3, 6)
+
+
+class TestSkipValue(SetupTeardown):
+  def test_skips_each_type(self):
+    assert skip_value(b"i42e", 0) == 4
+    assert skip_value(b"3:foo", 0) == 5
+    assert skip_value(b"li1e3:fooe", 0) == 10
+    assert skip_value(b"d3:fooi1ee", 0) == 10
+    assert skip_value(b"de", 0) == 2
+
+  def test_raises_on_non_canonical_integers_when_strict(self):
+    for data in (b"i-0e", b"i01e"):
+      with pytest.raises(NonCanonicalBencodeError):
+        skip_value(data, 0)
+
+      assert skip_value(data, 0, strict=False) == len(data)
+
+  def test_raises_on_malformed_data(self):
+    for data in (b"i1", b"ixe", b"l", b"d3:foo", b""):
+      with pytest.raises(TorrentDecodingError):
+        skip_value(data, 0)
+
+
+class TestIterDictItems(SetupTeardown):
+  def test_yields_keys_and_value_offsets(self):
+    data = b"d3:bar4:spam3:fooi42ee"
+
+    assert list(iter_dict_items(data, 0)) == [(b"bar", 6, 12), (b"foo", 17, 21)]
+
+  def test_raises_on_unsorted_keys_when_strict(self):
+    with pytest.raises(NonCanonicalBencodeError):
+      list(iter_dict_items(b"d3:fooi1e3:bari2ee", 0))
+
+
+class TestFindInfoSpan(SetupTeardown):
+  def test_returns_span_of_info_dict(self):
+    data = b"d8:announce3:foo4:infod6:source3:REDee"
+    start, end = find_info_span(data)
+
+    assert data[start:end] == b"d6:source3:REDe"
+
+  def test_works_on_real_torrents(self):
+    with open(get_torrent_path("red_source"), "rb") as f:
+      data = f.read()
+
+    start, end = find_info_span(data)
+
+    assert data[start : start + 1] == b"d"
+    assert data[end - 1 : end] == b"e"
+
+  def test_raises_if_info_is_missing(self):
+    with pytest.raises(TorrentDecodingError) as excinfo:
+      find_info_span(b"d8:announce3:fooe")
+
+    assert "Torrent data does not contain 'info' key" in str(excinfo.value)
+
+  def test_raises_on_trailing_data(self):
+    with pytest.raises(TorrentDecodingError):
+      find_info_span(b"d4:infodeexyz")
+
+  def test_raises_if_info_is_not_canonical(self):
+    with pytest.raises(NonCanonicalBencodeError):
+      find_info_span(b"d4:infod6:sourcei01eee")
+
+  def test_tolerates_non_canonical_values_outside_info(self):
+    data = b"d8:announcei01e4:infod6:source3:REDee"
+    start, end = find_info_span(data)
+
+    assert data[start:end] == b"d6:source3:REDe"
+
+
+class TestFindDictEntrySpan(SetupTeardown):
+  def test_returns_span_of_existing_entry(self):
+    data = b"d4:name3:foo6:source3:RED3:zzzi1ee"
+    start, end = find_dict_entry_span(data, 0, b"source")
+
+    assert data[start:end] == b"6:source3:RED"
+
+  def test_returns_insertion_point_if_absent(self):
+    data = b"d4:name3:foo3:zzzi1ee"
+    start, end = find_dict_entry_span(data, 0, b"source")
+
+    assert start == end
+    assert data[start:] == b"3:zzzi1ee"
+
+  def test_returns_insertion_point_at_end_of_dict(self):
+    data = b"d4:name3:fooe"
+    start, end = find_dict_entry_span(data, 0, b"source")
+
+    assert (start, end) == (12, 12)
+
+
+class TestSpliceDict(SetupTeardown):
+  def test_replaces_existing_entries(self):
+    data = b"d4:name3:foo6:source3:RED3:zzzi1ee"
+
+    assert b"".join(splice_dict(data, 0, {b"source": [b"3:OPS"]})) == b"d4:name3:foo6:source3:OPS3:zzzi1ee"
+
+  def test_inserts_missing_entries_in_sorted_order(self):
+    data = b"d4:name3:foo3:zzzi1ee"
+    result = splice_dict(data, 0, {b"aaa": [b"i0e"], b"source": [b"3:OPS"], b"zzzz": [b"0:"]})
+
+    assert b"".join(result) == b"d3:aaai0e4:name3:foo6:source3:OPS3:zzzi1e4:zzzz0:e"
+
+  def test_splices_into_empty_dict(self):
+    assert b"".join(splice_dict(b"de", 0, {b"source": [b"3:OPS"]})) == b"d6:source3:OPSe"
+
+  def test_references_untouched_entries_without_copying(self):
+    data = b"d4:name3:foo6:source3:RED3:zzzi1ee"
+    result = splice_dict(data, 0, {b"source": [b"3:OPS"]})
+
+    assert all(segment.obj is data for segment in result if isinstance(segment, memoryview))
+
+  def test_raises_on_non_canonical_data(self):
+    with pytest.raises(NonCanonicalBencodeError):
+      splice_dict(b"d6:source03:REDe", 0, {b"source": [b"3:OPS"]})
+
+
+class TestDecodeValue(SetupTeardown):
+  def test_decodes_scalars_and_lists(self):
+    assert decode_value(b"i-42e", 0) == -42
+    assert decode_value(b"3:foo", 0) == b"foo"
+    assert decode_value(b"li1el3:fooee", 0) == [1, [b"foo"]]
+
+  def test_returns_lazy_dicts(self):
+    result = decode_value(b"d3:fooi1ee", 0)
+
+    assert isinstance(result, LazyBencodeDict)
+    assert result == {b"foo": 1}
+
+
+class TestLazyBencodeDict(SetupTeardown):
+  def test_behaves_like_a_mapping(self):
+    data = LazyBencodeDict(b"d8:announce3:foo4:infod6:source3:REDee")
+
+    assert data[b"announce"] == b"foo"
+    assert data[b"info"][b"source"] == b"RED"
+    assert data.get(b"missing") is None
+    assert list(data) == [b"announce", b"info"]
+    assert len(data) == 2
+
+  def test_only_decodes_accessed_values(self):
+    data = LazyBencodeDict(b"d8:announce3:foo6:piecesi1ee")
+    data[b"announce"]
+
+    assert list(data._values) == [b"announce"]
+
+  def test_records_end_offset(self):
+    assert LazyBencodeDict(b"d3:fooi1eetrailing").end == 10
+    assert LazyBencodeDict(b"de").end == 2
+
+  def test_raises_on_malformed_data(self):
+    with pytest.raises(TorrentDecodingError):
+      LazyBencodeDict(b"d3:foo")
@@ -0,0 +1,84 @@
+import os
+import threading
+
+from .helpers import SetupTeardown
+
+from src.bloom_filter import BloomFilter
+
+BLOOM_FILTER_PATH = "/tmp/output/test.bloom"
+
+
+def random_infohashes(count):
+  return [os.urandom(20).hex().upper() for _ in range(count)]
+
+
+class TestBloomFilter(SetupTeardown):
+  def test_contains_every_added_infohash(self):
+    bloom_filter = BloomFilter(1000)
+    infohashes = random_infohashes(1000)
+
+    for infohash in infohashes:
+      bloom_filter.add(infohash)
+
+    assert all(infohash in bloom_filter for infohash in infohashes)
+    assert bloom_filter.count == 1000
+
+  def test_stays_near_the_false_positive_rate_at_capacity(self):
+    bloom_filter = BloomFilter(2000, false_positive_rate=0.01)
+    for infohash in random_infohashes(2000):
+      bloom_filter.add(infohash)
+
+    false_positives = sum(infohash in bloom_filter for infohash in random_infohashes(10000))
+
+    assert false_positives < 200
+
+  def test_rejects_invalid_infohashes(self):
+    bloom_filter = BloomFilter(10)
+
+    assert "not a hash" not in bloom_filter
+    assert None not in bloom_filter
+
+  def test_round_trips_through_a_file(self):
+    bloom_filter = BloomFilter(100, false_positive_rate=0.001)
+    infohashes = random_infohashes(50)
+    for infohash in infohashes:
+      bloom_filter.add(infohash)
+
+    bloom_filter.save(BLOOM_FILTER_PATH)
+    loaded = BloomFilter.load(BLOOM_FILTER_PATH)
+
+    assert all(infohash in loaded for infohash in infohashes)
+    assert (loaded.capacity, loaded.count, loaded.false_positive_rate) == (100, 50, 0.001)
+    assert os.listdir(os.path.dirname(BLOOM_FILTER_PATH)) == ["test.bloom"]
+
+  def test_concurrent_saves_leave_a_complete_file(self):
+    bloom_filters = [BloomFilter(1000) for _ in range(8)]
+    for bloom_filter in bloom_filters:
+      bloom_filter.add(random_infohashes(1)[0])
+
+    threads = [threading.Thread(target=bloom_filter.save, args=(BLOOM_FILTER_PATH,)) for bloom_filter in bloom_filters]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    loaded = BloomFilter.load(BLOOM_FILTER_PATH)
+
+    assert loaded is not None and loaded.count == 1
+    assert os.listdir(os.path.dirname(BLOOM_FILTER_PATH)) == ["test.bloom"]
+
+  def test_load_returns_none_for_missing_or_corrupt_files(self):
+    assert BloomFilter.load("/tmp/output/missing.bloom") is None
+
+    with open(BLOOM_FILTER_PATH, "wb") as f:
+      f.write(b"FBLM")
+
+    assert BloomFilter.load(BLOOM_FILTER_PATH) is None
+
+  def test_load_returns_none_for_truncated_bits(self):
+    BloomFilter(100).save(BLOOM_FILTER_PATH)
+
+    with open(BLOOM_FILTER_PATH, "r+b") as f:
+      f.truncate(os.path.getsize(BLOOM_FILTER_PATH) - 1)
+
+    assert BloomFilter.load(BLOOM_FILTER_PATH) is None
@@ -0,0 +1,74 @@
+from .helpers import SetupTeardown
+
+from src.circuit_breaker import CircuitBreaker, HALF_OPEN_POLL_INTERVAL
+
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+class TestCircuitBreaker(SetupTeardown):
+  def test_allows_requests_while_closed(self):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=FakeClock())
+    breaker.record_failure()
+
+    assert breaker.before_request() == 0
+    assert breaker.state == CircuitBreaker.CLOSED
+
+  def test_opens_after_consecutive_failures(self):
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    clock.now = 4
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.before_request() == 6
+
+  def test_successes_reset_the_failure_count(self):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.consecutive_failures == 1
+
+  def test_half_opens_for_a_single_trial_request(self):
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 10
+    assert breaker.before_request() == 0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.before_request() == HALF_OPEN_POLL_INTERVAL
+
+  def test_closes_if_the_trial_succeeds(self):
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    breaker.before_request()
+
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_request() == 0
+
+  def test_reopens_if_the_trial_fails(self):
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=clock)
+    for _ in range(3):
+      breaker.record_failure()
+    clock.now = 10
+    breaker.before_request()
+
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.before_request() == 10
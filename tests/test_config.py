@@ -41,3 +41,23 @@ class TestConfig(SetupTeardown):
     assert config.server_port == "9713"
 
     os.remove("/tmp/empty.json")
+
+  def test_defaults_index_workers_to_cpu_count(self):
+    with open("/tmp/empty.json", "w") as f:
+      f.write("{}")
+
+    config = Config().load("/tmp/empty.json")
+
+    assert config.index_workers == (os.cpu_count() or 1)
+    assert config.index_path is None
+    assert config.api_rate_limit_burst == 1
+    assert config.lookup_workers == 1
+    assert config.inject_workers == 1
+    assert config.scan_queue_size == 256
+    assert config.index_false_positive_rate == 0.01
+    assert config.webhook_workers == 4
+    assert config.server_threads == 8
+    assert config.server_keep_alive_timeout == 5
+    assert config.server_drain_timeout == 30
+
+    os.remove("/tmp/empty.json")
@@ -3,7 +3,14 @@ import pytest
 
 from .helpers import SetupTeardown
 
-from src.filesystem import sane_join, mkdir_p, assert_path_exists, list_files_of_extension, replace_extension
+from src.filesystem import (
+  sane_join,
+  mkdir_p,
+  assert_path_exists,
+  list_files_of_extension,
+  iter_files_of_extension,
+  replace_extension,
+)
 
 
 class TestSaneJoin(SetupTeardown):
@@ -76,6 +83,40 @@ class TestListFilesOfExtension(SetupTeardown):
     assert len(files) == 0
 
 
+class TestIterFilesOfExtension(SetupTeardown):
+  def setup_method(self):
+    super().setup_method()
+
+    for path in ("/tmp/input/a.torrent", "/tmp/input/b.txt", "/tmp/input/BT_backup/c.torrent"):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+      open(path, "w").close()
+
+  def test_yields_dir_entries(self):
+    entries = list(iter_files_of_extension("/tmp/input"))
+
+    assert all(isinstance(entry, os.DirEntry) for entry in entries)
+    assert [entry.path for entry in entries] == ["/tmp/input/a.torrent"]
+
+  def test_recurses_into_subdirectories(self):
+    paths = sorted(entry.path for entry in iter_files_of_extension("/tmp/input", recursive=True))
+
+    assert paths == ["/tmp/input/BT_backup/c.torrent", "/tmp/input/a.torrent"]
+
+  def test_filters_with_include_and_exclude_globs(self):
+    included = [entry.path for entry in iter_files_of_extension("/tmp/input", recursive=True, include=["BT_backup/*"])]
+    excluded = [entry.path for entry in iter_files_of_extension("/tmp/input", recursive=True, exclude=["BT_backup/*"])]
+
+    assert included == ["/tmp/input/BT_backup/c.torrent"]
+    assert excluded == ["/tmp/input/a.torrent"]
+
+  def test_skips_files_modified_before_cutoff(self):
+    os.utime("/tmp/input/a.torrent", (1000, 1000))
+
+    paths = [entry.path for entry in iter_files_of_extension("/tmp/input", recursive=True, modified_after=2000)]
+
+    assert paths == ["/tmp/input/BT_backup/c.torrent"]
+
+
 class TestReplaceExtension(SetupTeardown):
   def test_replaces_extension(self):
     filepath = "tests/support/files/test.torrent"
@@ -0,0 +1,153 @@
+import os
+import signal
+import socket
+import threading
+import http.client
+from time import monotonic
+
+from .helpers import SetupTeardown
+
+from src.http_server import WSGIServer
+
+
+def make_app(release=None, started=None):
+  def app(environ, start_response):
+    if started is not None:
+      started.set()
+    if release is not None:
+      release.wait(5)
+
+    body = environ["PATH_INFO"].encode()
+    start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", str(len(body)))])
+    return [body]
+
+  return app
+
+
+def start_server(app, **kwargs):
+  server = WSGIServer("127.0.0.1", 0, app, **kwargs)
+  results = []
+  thread = threading.Thread(target=lambda: results.append(server.serve_forever()))
+  thread.start()
+  return server, thread, results
+
+
+def stop_server(server, thread, results) -> bool:
+  server.shutdown()
+  thread.join(10)
+  return results[0]
+
+
+def get(server, path, connection=None):
+  # One-off requests ask for the connection to be closed, so it isn't left open for the server to drain
+  headers = {} if connection else {"Connection": "close"}
+  connection = connection or http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+  connection.request("GET", path, headers=headers)
+  response = connection.getresponse()
+  return response, response.read().decode()
+
+
+class TestWSGIServer(SetupTeardown):
+  def test_handles_requests(self):
+    server, thread, results = start_server(make_app(), threads=2)
+    response, body = get(server, "/foo")
+
+    assert response.status == 200
+    assert body == "/foo"
+    assert stop_server(server, thread, results)
+
+  def test_keeps_connections_alive_between_requests(self):
+    server, thread, results = start_server(make_app(), threads=2)
+    connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+
+    _response, first_body = get(server, "/first", connection)
+    local_port = connection.sock.getsockname()[1]
+    _response, second_body = get(server, "/second", connection)
+
+    assert (first_body, second_body) == ("/first", "/second")
+    assert connection.sock.getsockname()[1] == local_port
+
+    connection.close()
+    stop_server(server, thread, results)
+
+  def test_idle_connections_dont_hold_up_other_requests(self):
+    server, thread, results = start_server(make_app(), threads=1)
+    idle_connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+    get(server, "/first", idle_connection)
+
+    response, body = get(server, "/second")
+
+    assert response.status == 200
+    assert body == "/second"
+
+    idle_connection.close()
+    stop_server(server, thread, results)
+
+  def test_closes_its_listening_socket_once_stopped(self):
+    server, thread, results = start_server(make_app(), threads=2)
+    port = server.port
+
+    assert stop_server(server, thread, results)
+    assert not thread.is_alive()
+
+    try:
+      socket.create_connection(("127.0.0.1", port), timeout=1).close()
+      refused = False
+    except ConnectionRefusedError:
+      refused = True
+
+    assert refused
+
+  def test_stops_when_signalled(self):
+    server = WSGIServer("127.0.0.1", 0, make_app(), threads=2)
+    previous_handler = signal.getsignal(signal.SIGTERM)
+    threading.Timer(0.1, os.kill, (os.getpid(), signal.SIGTERM)).start()
+
+    assert server.serve_until_signalled()
+    assert signal.getsignal(signal.SIGTERM) is previous_handler
+
+  def test_drains_requests_in_progress(self):
+    release = threading.Event()
+    started = threading.Event()
+    server, thread, results = start_server(make_app(release, started), threads=2, drain_timeout=5)
+    responses = []
+    client = threading.Thread(target=lambda: responses.append(get(server, "/slow")))
+    client.start()
+    started.wait(5)
+
+    threading.Timer(0.1, release.set).start()
+
+    assert stop_server(server, thread, results)
+    client.join(5)
+    assert responses[0][0].status == 200
+    assert responses[0][1] == "/slow"
+
+  def test_gives_up_draining_after_the_timeout(self):
+    release = threading.Event()
+    started = threading.Event()
+    server, thread, results = start_server(make_app(release, started), threads=1, drain_timeout=0.1)
+
+    def get_stuck():
+      try:
+        get(server, "/stuck")
+      except (ConnectionError, http.client.HTTPException):
+        pass
+
+    client = threading.Thread(target=get_stuck)
+    client.start()
+    started.wait(5)
+
+    assert not stop_server(server, thread, results)
+
+    release.set()
+    client.join(5)
+
+  def test_records_when_draining_has_to_be_done_by(self):
+    server, thread, results = start_server(make_app(), threads=2, drain_timeout=5)
+
+    assert server.drain_deadline is None
+
+    stopped_at = monotonic()
+    stop_server(server, thread, results)
+
+    assert stopped_at < server.drain_deadline <= monotonic() + 5
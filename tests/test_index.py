@@ -0,0 +1,235 @@
+import os
+import glob
+import shutil
+import pytest
+
+from .helpers import SetupTeardown, get_torrent_path, copy_and_mkdir
+
+from src.trackers import RedTracker
+from src.parser import get_infohash_from_file
+from src.bloom_filter import BloomFilter
+from src.index import (
+  SCHEMA_VERSION,
+  InfohashIndex,
+  index_torrent_file,
+  index_torrent_files,
+  iter_indexed_torrent_files,
+)
+
+INDEX_PATH = "/tmp/index/index.db"
+
+
+@pytest.fixture
+def index():
+  shutil.rmtree(os.path.dirname(INDEX_PATH), ignore_errors=True)
+
+  with InfohashIndex(INDEX_PATH) as instance:
+    yield instance
+
+  shutil.rmtree(os.path.dirname(INDEX_PATH), ignore_errors=True)
+
+
+class TestIndexTorrentFile(SetupTeardown):
+  def test_returns_infohash_tracker_variants_and_source(self):
+    infohash, tracker, variants, source = index_torrent_file(get_torrent_path("red_source"))
+
+    assert infohash == get_infohash_from_file(get_torrent_path("red_source"))
+    assert tracker == "RED"
+    assert list(variants) == [b"OPS", b"APL", b""]
+    assert variants[b"OPS"] == "2AEE440CDC7429B3E4A7E4D20E3839DBB48D72C2"
+    assert source == b"RED"
+
+  def test_returns_no_variants_for_unknown_trackers(self):
+    infohash, tracker, variants, source = index_torrent_file(get_torrent_path("no_source"))
+
+    assert infohash is not None
+    assert tracker is None
+    assert variants == {}
+    assert source is None
+
+  def test_returns_no_infohash_for_undecodable_files(self):
+    assert index_torrent_file(get_torrent_path("broken")) == (None, None, {}, None)
+    assert index_torrent_file("/tmp/input/missing.torrent") == (None, None, {}, None)
+
+
+class TestInfohashIndexRefresh(SetupTeardown):
+  def test_maps_infohashes_to_filepaths(self, index):
+    filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    infohash = get_infohash_from_file(filepath)
+
+    infohashes = index.refresh("/tmp/input", [filepath])
+
+    assert infohashes[infohash] == filepath
+    assert infohash in infohashes
+    assert list(infohashes) == [infohash]
+    assert len(infohashes) == 1
+
+  def test_persists_between_instances(self, index):
+    filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    index.refresh("/tmp/input", [filepath])
+
+    with InfohashIndex(INDEX_PATH) as other_index:
+      infohashes = other_index.refresh("/tmp/input", [filepath])
+
+      assert infohashes[get_infohash_from_file(filepath)] == filepath
+
+  def test_only_rehashes_changed_files(self, index, monkeypatch):
+    filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    index.refresh("/tmp/input", [filepath])
+    calls = []
+    monkeypatch.setattr("src.index.index_torrent_file", lambda path: calls.append(path) or (None, None, {}, None))
+
+    index.refresh("/tmp/input", [filepath])
+    assert calls == []
+
+    copy_and_mkdir(get_torrent_path("ops_source"), filepath)
+    os.utime(filepath, ns=(0, 0))
+    index.refresh("/tmp/input", [filepath])
+    assert calls == [filepath]
+
+  def test_forgets_removed_files(self, index):
+    filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    index.refresh("/tmp/input", [filepath])
+    os.remove(filepath)
+
+    infohashes = index.refresh("/tmp/input", [])
+
+    assert len(infohashes) == 0
+
+  def test_keeps_directories_separate(self, index):
+    input_path = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    output_path = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
+
+    input_infohashes = index.refresh("/tmp/input", [input_path])
+    output_infohashes = index.refresh("/tmp/output", [output_path])
+
+    assert list(input_infohashes.values()) == [input_path]
+    assert list(output_infohashes.values()) == [output_path]
+
+  def test_saves_a_bloom_filter_next_to_the_index(self, index):
+    filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    index.refresh("/tmp/input", [filepath])
+
+    bloom_filter_paths = glob.glob(f"{INDEX_PATH}.*.bloom")
+    assert len(bloom_filter_paths) == 1
+
+    bloom_filter = BloomFilter.load(bloom_filter_paths[0])
+    assert get_infohash_from_file(filepath) in bloom_filter
+    assert bloom_filter.count == 1
+
+  def test_adds_new_files_to_the_saved_bloom_filter(self, index):
+    red_path = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    ops_path = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+    index.refresh("/tmp/input", [red_path])
+
+    with InfohashIndex(INDEX_PATH) as other_index:
+      infohashes = other_index.refresh("/tmp/input", [red_path, ops_path])
+
+      assert infohashes[get_infohash_from_file(ops_path)] == ops_path
+
+    bloom_filter = BloomFilter.load(glob.glob(f"{INDEX_PATH}.*.bloom")[0])
+    assert bloom_filter.count == 2
+    assert get_infohash_from_file(ops_path) in bloom_filter
+
+  def test_rebuilds_the_bloom_filter_when_files_are_removed(self, index):
+    red_path = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    ops_path = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+    index.refresh("/tmp/input", [red_path, ops_path])
+
+    index.refresh("/tmp/input", [red_path])
+
+    bloom_filter = BloomFilter.load(glob.glob(f"{INDEX_PATH}.*.bloom")[0])
+    assert bloom_filter.count == 1
+    assert get_infohash_from_file(ops_path) not in bloom_filter
+
+
+class TestIndexedInfohashes(SetupTeardown):
+  def test_first_match_returns_first_existing_hash(self, index):
+    filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+    infohash = get_infohash_from_file(filepath)
+    infohashes = index.refresh("/tmp/input", [filepath])
+
+    assert infohashes.first_match(["0" * 40, infohash]) == infohash
+    assert infohashes.first_match(["0" * 40]) is None
+
+  def test_skips_queries_for_infohashes_ruled_out_by_the_bloom_filter(self, index):
+    filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+    infohashes = index.refresh("/tmp/input", [filepath])
+    infohashes._db = None
+
+    assert infohashes.first_match(["0" * 40]) is None
+    assert "0" * 40 not in infohashes
+
+  def test_get_entry_returns_tracker_ordered_variants_and_source(self, index):
+    filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    infohashes = index.refresh("/tmp/input", [filepath])
+
+    tracker, variants, source = infohashes.get_entry(filepath)
+
+    assert tracker == RedTracker
+    assert variants == index_torrent_file(filepath)[2]
+    assert list(variants) == [b"OPS", b"APL", b""]
+    assert source == b"RED"
+
+  def test_get_entry_returns_none_for_unknown_files(self, index):
+    filepath = copy_and_mkdir(get_torrent_path("no_source"), "/tmp/input/no_source.torrent")
+    infohashes = index.refresh("/tmp/input", [filepath])
+
+    assert infohashes.get_entry(filepath) is None
+    assert infohashes.get_entry("/tmp/input/missing.torrent") is None
+
+  def test_add_indexes_new_files_straight_away(self, index, monkeypatch):
+    red_path = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/output/red_source.torrent")
+    infohashes = index.refresh("/tmp/output", [red_path])
+    ops_path = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
+    ops_infohash = get_infohash_from_file(ops_path)
+
+    infohashes.add(ops_path)
+
+    assert infohashes[ops_infohash] == ops_path
+    assert infohashes.first_match([ops_infohash]) == ops_infohash
+    assert ops_infohash in BloomFilter.load(glob.glob(f"{INDEX_PATH}.*.bloom")[0])
+
+    calls = []
+    monkeypatch.setattr("src.index.index_torrent_file", lambda path: calls.append(path) or (None, None, {}, None))
+    index.refresh("/tmp/output", [red_path, ops_path])
+    assert calls == []
+
+  def test_rebuilds_indexes_from_older_schema_versions(self, index):
+    filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    index.refresh("/tmp/input", [filepath])
+    index._db.execute("PRAGMA user_version = 1")
+    index._db.commit()
+
+    with InfohashIndex(INDEX_PATH) as other_index:
+      assert len(other_index.refresh("/tmp/input", [])) == 0
+      assert other_index._db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+
+
+class TestIndexTorrentFiles(SetupTeardown):
+  def test_returns_compact_tuples_in_order(self):
+    filepaths = [get_torrent_path(name) for name in ("red_source", "broken", "no_source")]
+
+    result = index_torrent_files(filepaths)
+
+    assert [entry[0] for entry in result] == filepaths
+    assert result[0] == (filepaths[0], *index_torrent_file(filepaths[0]))
+    assert result[1] == (filepaths[1], None, None, {}, None)
+
+  def test_parallel_results_match_serial_results(self):
+    filepaths = [get_torrent_path(name) for name in ("red_source", "ops_source", "broken", "no_source", "qbit_ops")] * 3
+
+    assert index_torrent_files(filepaths, workers=2, chunk_size=2) == index_torrent_files(filepaths)
+
+  def test_yields_each_chunk_as_soon_as_it_is_indexed(self, monkeypatch):
+    filepaths = [get_torrent_path(name) for name in ("red_source", "ops_source", "broken", "no_source")]
+    indexed_chunks = []
+    monkeypatch.setattr(
+      "src.index.index_torrent_batch", lambda chunk: indexed_chunks.append(chunk) or [(path,) for path in chunk]
+    )
+
+    entries = iter_indexed_torrent_files(filepaths, chunk_size=2)
+
+    assert next(entries) == (filepaths[0],)
+    assert indexed_chunks == [filepaths[:2]]
+    assert list(entries) == [(path,) for path in filepaths[1:]]
@@ -0,0 +1,74 @@
+import os
+import random
+
+from .helpers import SetupTeardown
+
+from src.infohashes import CompactInfohashes
+
+RED_HASH = "AA" * 20
+OPS_HASH = "0F" * 20
+OTHER_HASH = "FF" * 20
+
+
+class TestCompactInfohashes(SetupTeardown):
+  def test_maps_infohashes_to_filepaths(self):
+    infohashes = CompactInfohashes([(RED_HASH, "/tmp/red.torrent"), (OPS_HASH, "/tmp/ops.torrent")])
+
+    assert infohashes[RED_HASH] == "/tmp/red.torrent"
+    assert infohashes[OPS_HASH] == "/tmp/ops.torrent"
+    assert OTHER_HASH not in infohashes
+    assert len(infohashes) == 2
+
+  def test_iterates_in_sorted_order(self):
+    infohashes = CompactInfohashes([(OTHER_HASH, "/tmp/c"), (RED_HASH, "/tmp/b"), (OPS_HASH, "/tmp/a")])
+
+    assert list(infohashes) == [OPS_HASH, RED_HASH, OTHER_HASH]
+
+  def test_keeps_the_last_filepath_for_duplicate_infohashes(self):
+    infohashes = CompactInfohashes([(RED_HASH, "/tmp/first"), (OPS_HASH, "/tmp/ops"), (RED_HASH, "/tmp/last")])
+
+    assert dict(infohashes) == {OPS_HASH: "/tmp/ops", RED_HASH: "/tmp/last"}
+
+  def test_handles_non_utf8_filepaths(self):
+    filepath = "/tmp/caf\udce9.torrent"
+    infohashes = CompactInfohashes([(RED_HASH, filepath)])
+
+    assert infohashes[RED_HASH] == filepath
+
+  def test_treats_invalid_infohashes_as_missing(self):
+    infohashes = CompactInfohashes([(RED_HASH, "/tmp/red.torrent")])
+
+    assert "not a hash" not in infohashes
+    assert None not in infohashes
+    assert infohashes.get("AA") is None
+
+  def test_is_empty_without_entries(self):
+    infohashes = CompactInfohashes()
+
+    assert len(infohashes) == 0
+    assert RED_HASH not in infohashes
+
+  def test_returns_first_matching_infohash(self):
+    infohashes = CompactInfohashes([(RED_HASH, "/tmp/red.torrent"), (OPS_HASH, "/tmp/ops.torrent")])
+
+    assert infohashes.first_match([OTHER_HASH, OPS_HASH, RED_HASH]) == OPS_HASH
+    assert infohashes.first_match([OTHER_HASH]) is None
+
+  def test_skips_invalid_infohashes_when_matching(self):
+    infohashes = CompactInfohashes([(RED_HASH, "/tmp/red.torrent"), (OPS_HASH, "/tmp/ops.torrent")])
+
+    assert infohashes.first_match(["not a hash", None, RED_HASH, OPS_HASH]) == RED_HASH
+
+  def test_matches_many_entries_like_a_dict(self):
+    entries = [(os.urandom(20).hex().upper(), f"/tmp/{i}.torrent") for i in range(5000)]
+    # Some infohashes share their first bytes, and some appear more than once
+    entries += [("AAAA" + os.urandom(18).hex().upper(), f"/tmp/aaaa{i}.torrent") for i in range(50)]
+    entries += [(infohash, f"/tmp/duplicate{i}.torrent") for i, (infohash, _filepath) in enumerate(entries[:100])]
+    random.shuffle(entries)
+    expected = dict(entries)
+
+    infohashes = CompactInfohashes(iter(entries))
+
+    assert list(infohashes) == sorted(expected)
+    assert dict(infohashes) == expected
+    assert infohashes.first_match([OTHER_HASH, entries[-1][0], entries[0][0]]) == entries[-1][0]
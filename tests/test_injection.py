@@ -1,5 +1,7 @@
 import os
+import time
 import pytest
+import threading
 
 from unittest.mock import MagicMock
 
@@ -153,3 +155,29 @@ class TestInjectTorrent(SetupTeardown):
       injector.inject_torrent(source_torrent_filepath, new_torrent_filepath, "OPS")
 
     assert str(excinfo.value) == f"Cannot link given torrent since it's already been linked: {parent_dir}"
+
+  def test_concurrent_injections_of_the_same_torrent_share_one_injection(self, injector):
+    source_torrent_filepath = copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    new_torrent_filepath = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
+    copy_and_mkdir(get_support_file_path("foo.txt"), "/tmp/input/Big Buck Bunny/foo.txt")
+    injector.client.get_torrent_info.return_value = {"content_path": "/tmp/input/Big Buck Bunny"}
+    release = threading.Event()
+    injector.client.inject_torrent.side_effect = lambda *_args, **_kwargs: release.wait(5) and "abc123"
+    results = []
+
+    threads = [
+      threading.Thread(
+        target=lambda: results.append(injector.inject_torrent(source_torrent_filepath, new_torrent_filepath, "OPS"))
+      )
+      for _ in range(2)
+    ]
+    for thread in threads:
+      thread.start()
+
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+      thread.join(5)
+
+    assert results == ["abc123", "abc123"]
+    assert injector.client.inject_torrent.call_count == 1
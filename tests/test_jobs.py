@@ -0,0 +1,117 @@
+import threading
+from concurrent.futures import CancelledError
+
+from .helpers import SetupTeardown
+
+from src.jobs import FINISHED, QUEUED, RUNNING, JobQueue, iter_finished_jobs
+
+
+class TestJobQueue(SetupTeardown):
+  def test_runs_jobs_and_keeps_their_results(self):
+    job_queue = JobQueue(workers=1)
+    job = job_queue.submit(lambda x, y=0: x + y, 1, y=2)
+
+    assert job.wait(5)
+    assert job.status == FINISHED
+    assert job.result == 3
+    assert job.error is None
+    assert job_queue.get(job.id) is job
+
+    job_queue.shutdown()
+
+  def test_keeps_errors_of_failed_jobs(self):
+    job_queue = JobQueue(workers=1)
+    error = ValueError("boom")
+
+    def fail():
+      raise error
+
+    job = job_queue.submit(fail)
+
+    assert job.wait(5)
+    assert job.error is error
+    assert job.result is None
+
+    job_queue.shutdown()
+
+  def test_tracks_pending_jobs(self):
+    job_queue = JobQueue(workers=1)
+    release = threading.Event()
+    running_job = job_queue.submit(release.wait, 5)
+    queued_job = job_queue.submit(lambda: None)
+
+    assert job_queue.pending_count == 2
+    assert queued_job.status == QUEUED
+    assert not running_job.wait(0.05)
+    assert running_job.status == RUNNING
+
+    release.set()
+    queued_job.wait(5)
+
+    assert job_queue.pending_count == 0
+    job_queue.shutdown()
+
+  def test_returns_none_for_unknown_jobs(self):
+    job_queue = JobQueue(workers=1)
+
+    assert job_queue.get("does-not-exist") is None
+
+    job_queue.shutdown()
+
+  def test_forgets_oldest_finished_jobs(self):
+    job_queue = JobQueue(workers=1, max_finished_jobs=2)
+    jobs = []
+
+    for i in range(4):
+      jobs.append(job_queue.submit(lambda i=i: i))
+      jobs[-1].wait(5)
+
+    job_queue.submit(lambda: None).wait(5)
+
+    assert job_queue.get(jobs[0].id) is None
+    assert job_queue.get(jobs[1].id) is None
+    assert job_queue.get(jobs[3].id) is jobs[3]
+    job_queue.shutdown()
+
+  def test_waits_for_submitted_jobs_when_shutting_down(self):
+    job_queue = JobQueue(workers=1)
+    release = threading.Event()
+    running_job = job_queue.submit(release.wait, 5)
+    queued_job = job_queue.submit(lambda: "done")
+    threading.Timer(0.05, release.set).start()
+
+    assert job_queue.shutdown()
+    assert running_job.status == queued_job.status == FINISHED
+    assert queued_job.result == "done"
+
+  def test_cancels_jobs_that_havent_started_by_the_timeout(self):
+    job_queue = JobQueue(workers=1)
+    release = threading.Event()
+    running_job = job_queue.submit(release.wait, 5)
+    queued_job = job_queue.submit(lambda: "done")
+
+    assert not job_queue.shutdown(timeout=0.05)
+    assert running_job.status == RUNNING
+    assert queued_job.status == FINISHED
+    assert isinstance(queued_job.error, CancelledError)
+    assert queued_job.wait(0)
+
+    release.set()
+    assert running_job.wait(5)
+    assert queued_job.result is None
+
+
+class TestIterFinishedJobs(SetupTeardown):
+  def test_yields_jobs_in_the_order_they_finish(self):
+    job_queue = JobQueue(workers=2)
+    release_slow_job = threading.Event()
+    slow_job = job_queue.submit(release_slow_job.wait, 5)
+    fast_job = job_queue.submit(lambda: None)
+    finished_jobs = iter_finished_jobs([slow_job, fast_job])
+
+    assert next(finished_jobs) is fast_job
+    release_slow_job.set()
+    assert next(finished_jobs) is slow_job
+    assert list(finished_jobs) == []
+
+    job_queue.shutdown()
@@ -0,0 +1,139 @@
+import os
+import json
+import pytest
+import threading
+
+from .helpers import SetupTeardown, get_torrent_path, copy_and_mkdir
+
+from src.journal import ScanJournal
+
+JOURNAL_PATH = "/tmp/output/.fertilizer/journal.jsonl"
+
+
+@pytest.fixture
+def torrent_path():
+  return copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+
+class TestScanJournal(SetupTeardown):
+  def test_returns_recorded_outcomes_when_resuming(self, torrent_path):
+    with ScanJournal(JOURNAL_PATH) as journal:
+      journal.record(torrent_path, "not_found", "Torrent could not be found on OPS")
+
+    with ScanJournal(JOURNAL_PATH, resume=True) as journal:
+      assert journal.get_outcome(torrent_path) == ("not_found", "Torrent could not be found on OPS")
+
+  def test_expires_not_found_outcomes(self, torrent_path):
+    with ScanJournal(JOURNAL_PATH) as journal:
+      journal.record(torrent_path, "not_found", "Torrent could not be found on OPS")
+
+    with ScanJournal(JOURNAL_PATH, resume=True, not_found_ttl=0) as journal:
+      assert journal.get_outcome(torrent_path) is None
+
+  def test_treats_untimestamped_not_found_outcomes_as_expired(self, torrent_path):
+    os.makedirs(os.path.dirname(JOURNAL_PATH), exist_ok=True)
+    entry = {"path": torrent_path, "mtime_ns": os.stat(torrent_path).st_mtime_ns, "outcome": "not_found", "message": ""}
+
+    with open(JOURNAL_PATH, "w") as f:
+      f.write(json.dumps(entry) + "\n")
+
+    with ScanJournal(JOURNAL_PATH, resume=True) as journal:
+      assert journal.get_outcome(torrent_path) is None
+
+  def test_keeps_other_outcomes_regardless_of_age(self, torrent_path):
+    with ScanJournal(JOURNAL_PATH) as journal:
+      journal.record(torrent_path, "generated", "Generated")
+
+    with ScanJournal(JOURNAL_PATH, resume=True, not_found_ttl=0) as journal:
+      assert journal.get_outcome(torrent_path) == ("generated", "Generated")
+
+  def test_ignores_recorded_outcomes_when_not_resuming(self, torrent_path):
+    with ScanJournal(JOURNAL_PATH) as journal:
+      journal.record(torrent_path, "generated", "Generated")
+
+    with ScanJournal(JOURNAL_PATH) as journal:
+      assert journal.get_outcome(torrent_path) is None
+
+  def test_keeps_recorded_outcomes_when_not_resuming(self, torrent_path):
+    other_torrent_path = copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+
+    with ScanJournal(JOURNAL_PATH) as journal:
+      journal.record(torrent_path, "generated", "Generated")
+      journal.record(other_torrent_path, "skipped", "Skipped")
+
+    with ScanJournal(JOURNAL_PATH) as journal:
+      journal.record(torrent_path, "already_exists", "Already exists")
+
+    with ScanJournal(JOURNAL_PATH, resume=True) as journal:
+      assert journal.get_outcome(torrent_path) == ("already_exists", "Already exists")
+      assert journal.get_outcome(other_torrent_path) == ("skipped", "Skipped")
+
+  def test_ignores_outcomes_for_modified_files(self, torrent_path):
+    with ScanJournal(JOURNAL_PATH) as journal:
+      journal.record(torrent_path, "generated", "Generated")
+
+    os.utime(torrent_path, ns=(0, 0))
+
+    with ScanJournal(JOURNAL_PATH, resume=True) as journal:
+      assert journal.get_outcome(torrent_path) is None
+
+  def test_does_not_resume_errors(self, torrent_path):
+    with ScanJournal(JOURNAL_PATH) as journal:
+      journal.record(torrent_path, "error", "Request timed out")
+
+    with ScanJournal(JOURNAL_PATH, resume=True) as journal:
+      assert journal.get_outcome(torrent_path) is None
+
+  def test_keeps_latest_outcome_per_file(self, torrent_path):
+    with ScanJournal(JOURNAL_PATH) as journal:
+      journal.record(torrent_path, "error", "Request timed out")
+      journal.record(torrent_path, "generated", "Generated")
+
+    with ScanJournal(JOURNAL_PATH, resume=True) as journal:
+      assert journal.get_outcome(torrent_path) == ("generated", "Generated")
+
+    with open(JOURNAL_PATH) as f:
+      assert len(f.readlines()) == 1
+
+  def test_tolerates_truncated_lines(self, torrent_path):
+    with ScanJournal(JOURNAL_PATH) as journal:
+      journal.record(torrent_path, "generated", "Generated")
+
+    with open(JOURNAL_PATH, "a") as f:
+      f.write('{"path": "/tmp/input/oth')
+
+    with ScanJournal(JOURNAL_PATH, resume=True) as journal:
+      assert journal.get_outcome(torrent_path) == ("generated", "Generated")
+
+  def test_checkpoints_periodically(self, torrent_path):
+    journal = ScanJournal(JOURNAL_PATH, checkpoint_interval=1)
+    journal.record(torrent_path, "generated", "Generated")
+
+    with open(JOURNAL_PATH) as f:
+      assert len(f.readlines()) == 1
+
+    journal.close()
+
+  def test_journals_opened_at_once_dont_collide(self, torrent_path):
+    with ScanJournal(JOURNAL_PATH) as journal:
+      journal.record(torrent_path, "generated", "Generated")
+
+    start = threading.Barrier(8)
+    errors = []
+
+    def open_journal():
+      start.wait(5)
+      try:
+        for _ in range(20):
+          ScanJournal(JOURNAL_PATH, resume=True).close()
+      except OSError as e:
+        errors.append(e)
+
+    threads = [threading.Thread(target=open_journal) for _ in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join(5)
+
+    assert errors == []
+    assert os.listdir(os.path.dirname(JOURNAL_PATH)) == ["journal.jsonl"]
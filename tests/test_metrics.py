@@ -0,0 +1,67 @@
+import os
+import pytest
+
+from prometheus_client import CollectorRegistry, Counter, Histogram
+
+from .helpers import SetupTeardown
+
+from src.metrics import Instrument, set_enabled, write_textfile
+
+
+@pytest.fixture
+def registry():
+  set_enabled(True)
+  yield CollectorRegistry()
+  set_enabled(False)
+
+
+class TestInstrument(SetupTeardown):
+  def test_counts_per_label_values(self, registry):
+    counter = Instrument(Counter("requests", "Requests.", ("tracker",), registry=registry))
+    counter.labels("RED").inc()
+    counter.labels("RED").inc(2)
+    counter.labels("OPS").inc()
+
+    assert registry.get_sample_value("requests_total", {"tracker": "RED"}) == 3
+    assert registry.get_sample_value("requests_total", {"tracker": "OPS"}) == 1
+
+  def test_records_nothing_while_disabled(self, registry):
+    counter = Instrument(Counter("requests", "Requests.", ("tracker",), registry=registry))
+    set_enabled(False)
+    counter.labels("RED").inc()
+
+    assert registry.get_sample_value("requests_total", {"tracker": "RED"}) is None
+
+  def test_times_blocks(self, registry):
+    histogram = Instrument(Histogram("duration_seconds", "Durations.", ("action",), registry=registry))
+
+    with histogram.labels("torrent").time():
+      pass
+    with histogram.labels("torrent").time():
+      pass
+
+    assert registry.get_sample_value("duration_seconds_count", {"action": "torrent"}) == 2
+
+  def test_times_nothing_while_disabled(self, registry):
+    histogram = Instrument(Histogram("duration_seconds", "Durations.", registry=registry))
+    set_enabled(False)
+
+    with histogram.time():
+      pass
+
+    assert registry.get_sample_value("duration_seconds_count") == 0
+
+
+class TestWriteTextfile(SetupTeardown):
+  def test_writes_the_metrics(self, registry):
+    counter = Instrument(Counter("requests", "Requests.", registry=registry))
+    counter.inc()
+
+    write_textfile("/tmp/metrics/fertilizer.prom", registry)
+
+    with open("/tmp/metrics/fertilizer.prom") as f:
+      assert "requests_total 1.0\n" in f.read()
+    assert os.listdir("/tmp/metrics") == ["fertilizer.prom"]
+
+    os.remove("/tmp/metrics/fertilizer.prom")
+    os.rmdir("/tmp/metrics")
@@ -1,9 +1,12 @@
 import os
+import stat
 import pytest
+import threading
+import bencoder
 
 from .helpers import get_torrent_path, SetupTeardown
 
-from src.errors import TorrentDecodingError
+from src.errors import TorrentDecodingError, NonCanonicalBencodeError
 from src.trackers import RedTracker, OpsTracker
 from src.parser import (
   is_valid_infohash,
@@ -14,7 +17,13 @@ from src.parser import (
   get_origin_tracker,
   recalculate_hash_for_new_source,
   save_bencoded_data,
+  save_bencoded_segments,
+  splice_torrent_entries,
   calculate_infohash,
+  calculate_infohash_from_bytes,
+  get_infohash_from_file,
+  calculate_hashes_for_sources,
+  decode_bencoded_data_lazily,
 )
 
 
@@ -101,6 +110,42 @@ class TestCalculateInfohash(SetupTeardown):
     assert "Torrent data does not contain 'info' key" in str(excinfo.value)
 
 
+class TestCalculateInfohashFromBytes(SetupTeardown):
+  def test_returns_infohash(self):
+    result = calculate_infohash_from_bytes(b"d4:infod6:source3:REDee")
+
+    assert result == "FD2F1D966DF7E2E35B0CF56BC8510C6BB4D44467"
+
+  def test_matches_decoded_infohash_for_real_torrents(self):
+    for name in ("red_source", "ops_source", "qbit_ops", "broken_name"):
+      with open(get_torrent_path(name), "rb") as f:
+        raw = f.read()
+
+      assert calculate_infohash_from_bytes(raw) == calculate_infohash(get_bencoded_data(get_torrent_path(name)))
+
+  def test_falls_back_to_re_encoding_for_non_canonical_data(self):
+    result = calculate_infohash_from_bytes(b"d4:infod6:source03:REDee")
+
+    assert result == "FD2F1D966DF7E2E35B0CF56BC8510C6BB4D44467"
+
+  def test_raises_if_no_info_key(self):
+    with pytest.raises(TorrentDecodingError) as excinfo:
+      calculate_infohash_from_bytes(b"d8:announce3:fooe")
+
+    assert "Torrent data does not contain 'info' key" in str(excinfo.value)
+
+  def test_raises_if_data_cannot_be_decoded(self):
+    with pytest.raises(TorrentDecodingError) as excinfo:
+      calculate_infohash_from_bytes(b"dead")
+
+    assert "Error decoding torrent file" in str(excinfo.value)
+
+
+class TestGetInfohashFromFile(SetupTeardown):
+  def test_returns_infohash(self):
+    assert get_infohash_from_file(get_torrent_path("red_source")) == "F15A59B9620FBF4CB06407C10399607367D9204D"
+
+
 class TestRecalculateHashForNewSource(SetupTeardown):
   def test_replaces_source_and_returns_hash(self):
     torrent_data = {b"info": {b"source": b"RED"}}
@@ -119,6 +164,70 @@ class TestRecalculateHashForNewSource(SetupTeardown):
     assert torrent_data == {b"info": {b"source": b"RED"}}
 
 
+class TestCalculateHashesForSources(SetupTeardown):
+  def test_returns_hash_for_each_source(self):
+    result = calculate_hashes_for_sources(b"d4:infod6:source3:REDee", [b"RED", b"OPS"])
+
+    assert result == {
+      b"RED": "FD2F1D966DF7E2E35B0CF56BC8510C6BB4D44467",
+      b"OPS": "4F36F59992B6F7CB6EB6C2DEE06DD66AC81A981B",
+    }
+
+  def test_matches_recalculated_hashes_for_real_torrents(self):
+    sources = [b"OPS", b"APL", b"RED", b""]
+
+    for name in ("red_source", "ops_source", "no_source", "qbit_ops"):
+      torrent_path = get_torrent_path(name)
+      torrent_data = get_bencoded_data(torrent_path)
+
+      with open(torrent_path, "rb") as f:
+        result = calculate_hashes_for_sources(f.read(), sources)
+
+      assert result == {source: recalculate_hash_for_new_source(torrent_data, source) for source in sources}
+
+  def test_inserts_source_if_absent(self):
+    raw = b"d4:infod4:name3:foo7:privatei1eee"
+    torrent_data = {b"info": {b"name": b"foo", b"private": 1}}
+
+    result = calculate_hashes_for_sources(raw, [b"OPS"])
+
+    assert result == {b"OPS": recalculate_hash_for_new_source(torrent_data, b"OPS")}
+
+  def test_falls_back_for_non_canonical_data(self):
+    result = calculate_hashes_for_sources(b"d4:infod6:source03:REDee", [b"OPS"])
+
+    assert result == {b"OPS": "4F36F59992B6F7CB6EB6C2DEE06DD66AC81A981B"}
+
+  def test_raises_if_no_info_key(self):
+    with pytest.raises(TorrentDecodingError):
+      calculate_hashes_for_sources(b"d8:announce3:fooe", [b"OPS"])
+
+
+class TestSpliceTorrentEntries(SetupTeardown):
+  def test_matches_re_encoding_for_real_torrents(self):
+    entries = {b"announce": b"https://example.com/announce", b"comment": b"https://example.com/torrents.php"}
+    info_entries = {b"source": b"OPS"}
+
+    for name in ("red_source", "ops_source", "no_source", "qbit_ops"):
+      torrent_path = get_torrent_path(name)
+      torrent_data = get_bencoded_data(torrent_path)
+      torrent_data.update(entries)
+      torrent_data[b"info"].update(info_entries)
+
+      with open(torrent_path, "rb") as f:
+        result = splice_torrent_entries(f.read(), entries, info_entries)
+
+      assert b"".join(result) == bencoder.encode(torrent_data)
+
+  def test_raises_for_non_canonical_data(self):
+    with pytest.raises(NonCanonicalBencodeError):
+      splice_torrent_entries(b"d4:infod6:source03:REDee", {}, {b"source": b"OPS"})
+
+  def test_raises_if_no_info_key(self):
+    with pytest.raises(TorrentDecodingError):
+      splice_torrent_entries(b"d8:announce3:fooe", {}, {b"source": b"OPS"})
+
+
 class TestGetTorrentData(SetupTeardown):
   def test_returns_torrent_data(self):
     result = get_bencoded_data(get_torrent_path("no_source"))
@@ -132,6 +241,23 @@ class TestGetTorrentData(SetupTeardown):
     assert result is None
 
 
+class TestDecodeBencodedDataLazily(SetupTeardown):
+  def test_returns_data_matching_full_decode(self):
+    with open(get_torrent_path("red_source"), "rb") as f:
+      result = decode_bencoded_data_lazily(f.read())
+
+    full_data = get_bencoded_data(get_torrent_path("red_source"))
+
+    assert result[b"announce"] == full_data[b"announce"]
+    assert get_source(result) == get_source(full_data)
+    assert get_origin_tracker(result) == RedTracker
+
+  def test_returns_none_on_error(self):
+    assert decode_bencoded_data_lazily(None) is None
+    assert decode_bencoded_data_lazily(b"dead") is None
+    assert decode_bencoded_data_lazily(b"d3:fooi1eetrailing") is None
+
+
 class TestSaveTorrentData(SetupTeardown):
   def test_saves_torrent_data(self):
     torrent_data = {b"info": {b"source": b"RED"}}
@@ -165,3 +291,55 @@ class TestSaveTorrentData(SetupTeardown):
     assert os.path.exists("/tmp/output/foo")
 
     os.remove(filename)
+
+
+class TestSaveBencodedSegments(SetupTeardown):
+  def test_saves_segments(self):
+    data = b"d4:infod6:source3:REDee"
+    filename = "/tmp/output/test_save_bencoded_segments.torrent"
+
+    result = save_bencoded_segments(filename, [b"d4:info", memoryview(data)[7:-1], b"", b"e"])
+
+    with open(filename, "rb") as f:
+      assert f.read() == data
+    assert result == filename
+
+  def test_replaces_existing_file_without_leaving_temp_file(self):
+    filename = "/tmp/output/foo/test_save_bencoded_segments.torrent"
+    save_bencoded_segments(filename, [b"old data"])
+
+    save_bencoded_segments(filename, [b"new", b" data"])
+
+    with open(filename, "rb") as f:
+      assert f.read() == b"new data"
+    assert os.listdir("/tmp/output/foo") == ["test_save_bencoded_segments.torrent"]
+
+  def test_concurrent_saves_of_the_same_file_dont_collide(self):
+    filename = "/tmp/output/test_save_bencoded_segments.torrent"
+    start = threading.Barrier(8)
+    errors = []
+
+    def save(i):
+      start.wait(5)
+      try:
+        for _ in range(20):
+          save_bencoded_segments(filename, [b"data ", str(i).encode()])
+      except OSError as e:
+        errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join(5)
+
+    assert errors == []
+    with open(filename, "rb") as f:
+      assert f.read() in {f"data {i}".encode() for i in range(8)}
+    assert os.listdir("/tmp/output") == ["test_save_bencoded_segments.torrent"]
+
+  def test_saves_files_readable_by_others(self):
+    filename = "/tmp/output/test_save_bencoded_segments.torrent"
+    save_bencoded_segments(filename, [b"data"])
+
+    assert stat.S_IMODE(os.stat(filename).st_mode) & 0o044 == 0o044
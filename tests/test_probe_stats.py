@@ -0,0 +1,54 @@
+import pytest
+
+from .helpers import SetupTeardown
+
+from src.probe_stats import SourceFlagStats
+
+STATS_PATH = "/tmp/output/.fertilizer/probe_stats.db"
+VARIANTS = {b"OPS": "a", b"APL": "b", b"": "c"}
+
+
+@pytest.fixture
+def probe_stats():
+  instance = SourceFlagStats(STATS_PATH)
+  yield instance
+  instance.close()
+
+
+class TestSourceFlagStats(SetupTeardown):
+  def test_keeps_the_default_order_without_hits(self, probe_stats):
+    assert list(probe_stats.order_variants("OPS", b"RED", VARIANTS)) == [b"OPS", b"APL", b""]
+
+  def test_orders_by_hits_for_the_origin_source(self, probe_stats):
+    probe_stats.record_hit("OPS", b"RED", b"")
+    probe_stats.record_hit("OPS", b"RED", b"")
+    probe_stats.record_hit("OPS", b"RED", b"APL")
+
+    ordered_variants = probe_stats.order_variants("OPS", b"RED", VARIANTS)
+
+    assert list(ordered_variants) == [b"", b"APL", b"OPS"]
+    assert ordered_variants == VARIANTS
+
+  def test_prefers_origin_source_hits_over_tracker_wide_hits(self, probe_stats):
+    probe_stats.record_hit("OPS", b"PTH", b"")
+    probe_stats.record_hit("OPS", b"PTH", b"")
+    probe_stats.record_hit("OPS", b"RED", b"APL")
+
+    assert list(probe_stats.order_variants("OPS", b"RED", VARIANTS)) == [b"APL", b"", b"OPS"]
+
+  def test_falls_back_to_tracker_wide_hits(self, probe_stats):
+    probe_stats.record_hit("OPS", b"PTH", b"")
+
+    assert list(probe_stats.order_variants("OPS", b"RED", VARIANTS)) == [b"", b"OPS", b"APL"]
+
+  def test_keeps_trackers_separate(self, probe_stats):
+    probe_stats.record_hit("RED", b"OPS", b"")
+
+    assert list(probe_stats.order_variants("OPS", b"OPS", VARIANTS)) == [b"OPS", b"APL", b""]
+
+  def test_persists_between_instances(self, probe_stats):
+    probe_stats.record_hit("OPS", b"RED", b"")
+
+    other_stats = SourceFlagStats(STATS_PATH)
+    assert list(other_stats.order_variants("OPS", b"RED", VARIANTS)) == [b"", b"OPS", b"APL"]
+    other_stats.close()
@@ -0,0 +1,188 @@
+import os
+import threading
+import multiprocessing
+import pytest
+
+from time import monotonic
+
+from .helpers import SetupTeardown
+
+from src.rate_limiter import TokenBucket, SharedTokenBucket
+
+SHARED_STATE_PATH = "/tmp/output/ratelimit/ops.ratelimit"
+
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+class TestTokenBucket(SetupTeardown):
+  def test_allows_a_burst_then_limits(self):
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=3, clock=clock)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+  def test_refills_at_rate(self):
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=1, clock=clock)
+    bucket.try_acquire()
+
+    clock.now = 0.25
+    assert bucket.try_acquire() is False
+    assert bucket.time_until_available() == pytest.approx(0.25)
+
+    clock.now = 0.5
+    assert bucket.try_acquire() is True
+
+  def test_does_not_refill_past_burst(self):
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=2, clock=clock)
+
+    clock.now = 100
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+
+  def test_builds_from_interval(self):
+    bucket = TokenBucket.from_interval(2)
+
+    assert bucket.rate == 0.5
+    assert bucket.burst == 1
+
+  def test_does_not_limit_without_rate(self):
+    bucket = TokenBucket.from_interval(0)
+
+    assert all(bucket.try_acquire() for _ in range(100))
+    assert bucket.time_until_available() == 0
+
+  def test_pauses_for_the_requested_time(self):
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=3, clock=clock)
+    bucket.pause(5)
+
+    clock.now = 4
+    assert bucket.try_acquire() is False
+    assert bucket.time_until_available() == pytest.approx(2)
+
+    clock.now = 6
+    assert bucket.try_acquire() is True
+    assert bucket.try_acquire() is False
+
+  def test_pauses_even_without_rate(self):
+    clock = FakeClock()
+    bucket = TokenBucket(rate=None, clock=clock)
+    bucket.pause(5)
+
+    assert bucket.try_acquire() is False
+
+    clock.now = 5
+    assert bucket.try_acquire() is True
+
+  def test_rejects_burst_below_one(self):
+    with pytest.raises(ValueError):
+      TokenBucket(rate=1, burst=0)
+
+  def test_acquire_times_out(self):
+    bucket = TokenBucket(rate=0.01, burst=1)
+    bucket.acquire()
+
+    assert bucket.acquire(timeout=0.01) is False
+
+  def test_waits_for_tokens_across_threads(self):
+    bucket = TokenBucket(rate=50, burst=2)
+    acquired_at = []
+    lock = threading.Lock()
+
+    def worker():
+      bucket.acquire()
+      with lock:
+        acquired_at.append(monotonic())
+
+    start = monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    # Two tokens are available up front and the remaining four take 20ms each
+    assert len(acquired_at) == 6
+    assert max(acquired_at) - start >= 0.075
+
+
+def take_shared_tokens(count):
+  bucket = SharedTokenBucket(SHARED_STATE_PATH, rate=20, burst=1)
+  for _ in range(count):
+    bucket.acquire()
+  bucket.close()
+
+
+class TestSharedTokenBucket(SetupTeardown):
+  def test_shares_tokens_between_instances(self):
+    clock = FakeClock()
+    first_bucket = SharedTokenBucket(SHARED_STATE_PATH, rate=1, burst=2, clock=clock)
+    second_bucket = SharedTokenBucket(SHARED_STATE_PATH, rate=1, burst=2, clock=clock)
+
+    assert first_bucket.try_acquire() is True
+    assert second_bucket.try_acquire() is True
+    assert first_bucket.try_acquire() is False
+    assert second_bucket.time_until_available() == pytest.approx(1)
+
+    clock.now = 1
+    assert second_bucket.try_acquire() is True
+    assert first_bucket.try_acquire() is False
+
+    first_bucket.close()
+    second_bucket.close()
+
+  def test_shares_pauses_between_instances(self):
+    clock = FakeClock()
+    first_bucket = SharedTokenBucket(SHARED_STATE_PATH, rate=None, clock=clock)
+    second_bucket = SharedTokenBucket(SHARED_STATE_PATH, rate=None, clock=clock)
+
+    first_bucket.pause(5)
+
+    assert second_bucket.try_acquire() is False
+    assert second_bucket.time_until_available() == pytest.approx(5)
+
+    first_bucket.close()
+    second_bucket.close()
+
+  def test_keeps_existing_state_when_opened(self):
+    clock = FakeClock()
+    first_bucket = SharedTokenBucket(SHARED_STATE_PATH, rate=1, burst=1, clock=clock)
+    first_bucket.try_acquire()
+    first_bucket.close()
+
+    second_bucket = SharedTokenBucket(SHARED_STATE_PATH, rate=1, burst=1, clock=clock)
+    assert second_bucket.try_acquire() is False
+    second_bucket.close()
+
+  def test_resets_state_written_before_a_clock_reset(self):
+    clock = FakeClock()
+    clock.now = 1000
+    first_bucket = SharedTokenBucket(SHARED_STATE_PATH, rate=1, burst=1, clock=clock)
+    first_bucket.try_acquire()
+    first_bucket.close()
+
+    clock.now = 0
+    second_bucket = SharedTokenBucket(SHARED_STATE_PATH, rate=1, burst=1, clock=clock)
+    assert second_bucket.try_acquire() is True
+    second_bucket.close()
+
+  def test_limits_the_combined_rate_of_several_processes(self):
+    os.makedirs(os.path.dirname(SHARED_STATE_PATH), exist_ok=True)
+    processes = [multiprocessing.Process(target=take_shared_tokens, args=(3,)) for _ in range(2)]
+
+    start = monotonic()
+    for process in processes:
+      process.start()
+    for process in processes:
+      process.join()
+
+    # One token is available up front and the other five take 50ms each
+    assert all(process.exitcode == 0 for process in processes)
+    assert monotonic() - start >= 0.25
@@ -0,0 +1,81 @@
+import os
+import pytest
+
+from unittest.mock import patch
+
+from .helpers import SetupTeardown
+
+from src.response_cache import ResponseCache
+
+CACHE_PATH = "/tmp/output/.fertilizer/api_cache.db"
+HIT = {"status": "success", "response": {"torrent": {"filePath": "foo", "id": 123}}}
+MISS = {"status": "failure", "error": "bad hash parameter"}
+
+
+@pytest.fixture
+def cache():
+  instance = ResponseCache(CACHE_PATH, hit_ttl=100, miss_ttl=10, max_entries=2)
+  yield instance
+  instance.close()
+
+
+class TestResponseCache(SetupTeardown):
+  def test_returns_none_for_unknown_hashes(self, cache):
+    assert cache.get("OPS", "abc") is None
+
+  def test_returns_cached_hits_and_misses(self, cache):
+    cache.put("OPS", "abc", HIT)
+    cache.put("OPS", "def", MISS)
+
+    assert cache.get("OPS", "abc") == HIT
+    assert cache.get("OPS", "def") == MISS
+
+  def test_keys_responses_by_tracker(self, cache):
+    cache.put("OPS", "abc", HIT)
+
+    assert cache.get("RED", "abc") is None
+
+  def test_does_not_cache_unknown_errors(self, cache):
+    cache.put("OPS", "abc", {"status": "failure", "error": "unknown error"})
+
+    assert cache.get("OPS", "abc") is None
+
+  def test_expires_hits_and_misses_separately(self, cache):
+    with patch("src.response_cache.time", return_value=1000):
+      cache.put("OPS", "abc", HIT)
+      cache.put("OPS", "def", MISS)
+
+    with patch("src.response_cache.time", return_value=1050):
+      assert cache.get("OPS", "abc") == HIT
+      assert cache.get("OPS", "def") is None
+
+    with patch("src.response_cache.time", return_value=1150):
+      assert cache.get("OPS", "abc") is None
+
+  def test_evicts_least_recently_used_entries(self, cache):
+    with patch("src.response_cache.time", return_value=1000):
+      cache.put("OPS", "abc", HIT)
+    with patch("src.response_cache.time", return_value=1001):
+      cache.put("OPS", "def", HIT)
+    with patch("src.response_cache.time", return_value=1002):
+      cache.get("OPS", "abc")
+    with patch("src.response_cache.time", return_value=1003):
+      cache.put("OPS", "ghi", HIT)
+
+      assert cache.get("OPS", "abc") == HIT
+      assert cache.get("OPS", "def") is None
+      assert cache.get("OPS", "ghi") == HIT
+
+  def test_persists_between_instances(self, cache):
+    cache.put("OPS", "abc", HIT)
+
+    other_cache = ResponseCache(CACHE_PATH, hit_ttl=100, miss_ttl=10)
+    assert other_cache.get("OPS", "abc") == HIT
+    other_cache.close()
+
+  def test_purges_all_entries(self, cache):
+    cache.put("OPS", "abc", HIT)
+    cache.purge()
+
+    assert cache.get("OPS", "abc") is None
+    assert os.path.exists(CACHE_PATH)
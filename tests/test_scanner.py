@@ -1,7 +1,13 @@
 import os
 import re
+import glob
+import httpx
+import asyncio
 import shutil
+import threading
+import time
 import pytest
+import requests
 import requests_mock
 
 from unittest.mock import MagicMock
@@ -10,7 +16,20 @@ from colorama import Fore
 from .helpers import SetupTeardown, get_torrent_path, copy_and_mkdir
 
 from src.errors import TorrentExistsInClientError, TorrentDecodingError
-from src.scanner import scan_torrent_directory, scan_torrent_file
+from src.bloom_filter import BloomFilter
+from src.metrics import REGISTRY, set_enabled
+from src.parser import get_bencoded_data, get_infohash_from_file, get_raw_data, save_bencoded_data
+from src.scheduler import INTERACTIVE
+from src.scanner import (
+  create_torrent_directory_watcher,
+  scan_torrent_directory,
+  scan_torrent_directory_async,
+  scan_torrent_file,
+)
+
+
+def scan_outcome_count(outcome):
+  return REGISTRY.get_sample_value("fertilizer_scan_outcomes_total", {"outcome": outcome}) or 0
 
 
 class TestScanTorrentFile(SetupTeardown):
@@ -43,6 +62,27 @@ class TestScanTorrentFile(SetupTeardown):
       assert os.path.isfile(filepath)
       assert filepath == "/tmp/output/OPS/foo [OPS].torrent"
 
+  def test_indexes_the_new_torrent_with_the_configured_false_positive_rate(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      filepath = scan_torrent_file(
+        "/tmp/input/red_source.torrent",
+        "/tmp/output",
+        red_api,
+        ops_api,
+        None,
+        "/tmp/output/index.db",
+        index_false_positive_rate=0.001,
+      )
+
+    bloom_filter = BloomFilter.load(glob.glob("/tmp/output/index.db.*.bloom")[0])
+    assert bloom_filter.false_positive_rate == 0.001
+    assert get_infohash_from_file(filepath) in bloom_filter
+
   def test_calls_injector_if_provided(self, red_api, ops_api):
     injector_mock = MagicMock()
     injector_mock.inject_torrent = MagicMock()
@@ -339,3 +379,514 @@ class TestScanTorrentDirectory(SetupTeardown):
       m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
 
       scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+
+  def test_scans_subdirectories_if_recursive(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/BT_backup/red_source.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, recursive=True))
+      captured = capsys.readouterr()
+
+      assert "Analyzed 1 local torrent" in captured.out
+      assert f"{Fore.LIGHTGREEN_EX}Generated for cross-seeding{Fore.RESET}: 1" in captured.out
+
+  def test_only_scans_torrents_modified_after_the_cutoff(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+    os.utime("/tmp/input/ops_source.torrent", (1000, 1000))
+
+    print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, modified_after=2000))
+    captured = capsys.readouterr()
+
+    # The older OPS torrent isn't scanned itself, but the recent RED one is still found to duplicate it
+    assert "Analyzed 1 local torrent" in captured.out
+    assert "Torrent already exists in input directory at /tmp/input/ops_source.torrent" in captured.out
+    assert f"{Fore.LIGHTYELLOW_EX}Already exists{Fore.RESET}: 1" in captured.out
+
+  def test_finds_duplicates_among_excluded_torrents(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+
+    print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, exclude=["ops_*"]))
+    captured = capsys.readouterr()
+
+    assert "Analyzed 1 local torrent" in captured.out
+    assert f"{Fore.LIGHTYELLOW_EX}Already exists{Fore.RESET}: 1" in captured.out
+
+  def test_skips_journaled_torrents_when_resuming(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    journal_path = "/tmp/output/.fertilizer/journal.jsonl"
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_KNOWN_BAD_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, journal_path=journal_path)
+      first_call_count = m.call_count
+      capsys.readouterr()
+
+      print(
+        scan_torrent_directory(
+          "/tmp/input", "/tmp/output", red_api, ops_api, None, journal_path=journal_path, resume=True
+        )
+      )
+      captured = capsys.readouterr()
+
+      assert m.call_count == first_call_count
+      assert "Skipping 1 torrents already recorded in the scan journal" in captured.out
+      assert f"{Fore.LIGHTRED_EX}Not found{Fore.RESET}: 1" in captured.out
+
+  def test_doesnt_count_journaled_outcomes_in_the_metrics(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    journal_path = "/tmp/output/.fertilizer/journal.jsonl"
+    set_enabled(True)
+
+    try:
+      with requests_mock.Mocker() as m:
+        m.get(re.compile("action=torrent"), json=self.TORRENT_KNOWN_BAD_RESPONSE)
+        m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+        scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, journal_path=journal_path)
+        not_found_count = scan_outcome_count("not_found")
+        scan_torrent_directory(
+          "/tmp/input", "/tmp/output", red_api, ops_api, None, journal_path=journal_path, resume=True
+        )
+    finally:
+      set_enabled(False)
+
+    assert not_found_count >= 1
+    assert scan_outcome_count("not_found") == not_found_count
+
+  def test_rescans_journaled_torrents_when_not_resuming(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    journal_path = "/tmp/output/.fertilizer/journal.jsonl"
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_KNOWN_BAD_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, journal_path=journal_path)
+      first_call_count = m.call_count
+      scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, journal_path=journal_path)
+
+      assert m.call_count == 2 * first_call_count
+
+  def test_looks_up_each_tracker_concurrently(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    # The bundled OPS torrents are cross-seeds of the RED one, so one of them gets a different name
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+    ops_torrent_data = get_bencoded_data("/tmp/input/ops_source.torrent")
+    ops_torrent_data[b"info"][b"name"] = b"something else"
+    save_bencoded_data("/tmp/input/ops_source.torrent", ops_torrent_data)
+    lookup_threads = {}
+    # Each lookup only returns once the other tracker's lookup has started too
+    both_looking_up = threading.Barrier(2, timeout=5)
+
+    def blocking_find_torrent(api):
+      def find_torrent(torrent_hash, should_retry=True, priority=INTERACTIVE):
+        lookup_threads.setdefault(api.sitename, set()).add(threading.get_ident())
+        both_looking_up.wait()
+        return self.TORRENT_SUCCESS_RESPONSE
+
+      return find_torrent
+
+    red_api.find_torrent = blocking_find_torrent(red_api)
+    ops_api.find_torrent = blocking_find_torrent(ops_api)
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+      captured = capsys.readouterr()
+
+      assert f"{Fore.LIGHTGREEN_EX}Generated for cross-seeding{Fore.RESET}: 2" in captured.out
+      assert "(1/2)" in captured.out and "(2/2)" in captured.out
+      assert lookup_threads["RED"].isdisjoint(lookup_threads["OPS"])
+      assert not both_looking_up.broken
+
+  def test_retries_failed_lookups_without_holding_up_other_torrents(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+    ops_torrent_data = get_bencoded_data("/tmp/input/ops_source.torrent")
+    ops_torrent_data[b"info"][b"name"] = b"something else"
+    save_bencoded_data("/tmp/input/ops_source.torrent", ops_torrent_data)
+    ops_api.max_retries = 2
+    ops_api._retry_wait_time = lambda _x: 0.2
+
+    with requests_mock.Mocker() as m:
+      m.get(
+        re.compile("orpheus.network.*action=torrent"),
+        [{"exc": requests.exceptions.ConnectTimeout}, {"json": self.TORRENT_SUCCESS_RESPONSE}],
+      )
+      m.get(re.compile("redacted.ch.*action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+      captured = capsys.readouterr()
+
+      assert "Request timed out" in captured.out
+      assert f"{Fore.LIGHTGREEN_EX}Generated for cross-seeding{Fore.RESET}: 2" in captured.out
+      # The RED torrent didn't have to wait for the OPS retry
+      assert captured.out.index("(1/2) ops_source.torrent") < captured.out.index("(2/2) red_source.torrent")
+
+  def test_counts_retried_lookups_in_the_metrics(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    ops_api.max_retries = 2
+    ops_api._retry_wait_time = lambda _x: 0
+    labels = {"tracker": ops_api.sitename, "action": "torrent"}
+    set_enabled(True)
+
+    try:
+      retries = REGISTRY.get_sample_value("fertilizer_api_retries_total", labels) or 0
+
+      with requests_mock.Mocker() as m:
+        m.get(
+          re.compile("action=torrent"),
+          [{"exc": requests.exceptions.ConnectTimeout}, {"json": self.TORRENT_SUCCESS_RESPONSE}],
+        )
+        m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+        scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None)
+    finally:
+      set_enabled(False)
+
+    assert REGISTRY.get_sample_value("fertilizer_api_retries_total", labels) == retries + 1
+
+  def test_reports_an_error_once_retries_run_out(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), exc=requests.exceptions.ConnectTimeout)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+      captured = capsys.readouterr()
+
+      assert f"{Fore.RED}Request timed out on OPS{Fore.RESET}" in captured.out
+      assert f"{Fore.RED}Errors{Fore.RESET}: 1" in captured.out
+
+  def test_looks_up_torrents_while_earlier_ones_are_injected(self, capsys, red_api, ops_api):
+    for i in range(3):
+      copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/red_source_{i}.torrent")
+      torrent_data = get_bencoded_data(f"/tmp/input/red_source_{i}.torrent")
+      torrent_data[b"info"][b"name"] = f"torrent {i}".encode()
+      save_bencoded_data(f"/tmp/input/red_source_{i}.torrent", torrent_data)
+
+    lookups = []
+    lookup_started = [threading.Event() for _ in range(3)]
+
+    def find_torrent(torrent_hash, should_retry=True, priority=INTERACTIVE):
+      lookup_started[len(lookups)].set()
+      lookups.append(torrent_hash)
+      return self.TORRENT_SUCCESS_RESPONSE
+
+    ops_api.find_torrent = find_torrent
+    injector = MagicMock()
+    overlapped = []
+
+    def inject_torrent(*_args):
+      # Each injection holds on until the next torrent's lookup has started, which it only can in parallel
+      next_lookup = injector.inject_torrent.call_count
+      if next_lookup < 3:
+        overlapped.append(lookup_started[next_lookup].wait(5))
+
+    injector.inject_torrent.side_effect = inject_torrent
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector))
+      captured = capsys.readouterr()
+
+      assert "(3/3)" in captured.out
+      assert injector.inject_torrent.call_count == 3
+      assert overlapped == [True, True]
+
+  def test_bounds_torrents_waiting_between_stages(self, capsys, red_api, ops_api):
+    for i in range(8):
+      copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/red_source_{i}.torrent")
+      torrent_data = get_bencoded_data(f"/tmp/input/red_source_{i}.torrent")
+      torrent_data[b"info"][b"name"] = f"torrent {i}".encode()
+      save_bencoded_data(f"/tmp/input/red_source_{i}.torrent", torrent_data)
+
+    lookup_count = 0
+    max_waiting_for_injection = 0
+
+    def find_torrent(torrent_hash, should_retry=True, priority=INTERACTIVE):
+      nonlocal lookup_count
+      lookup_count += 1
+      return self.TORRENT_SUCCESS_RESPONSE
+
+    def slow_inject_torrent(*_args):
+      nonlocal max_waiting_for_injection
+      max_waiting_for_injection = max(max_waiting_for_injection, lookup_count - injector.inject_torrent.call_count)
+      time.sleep(0.05)
+
+    ops_api.find_torrent = find_torrent
+    injector = MagicMock()
+    injector.inject_torrent.side_effect = slow_inject_torrent
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, injector, queue_size=1))
+      captured = capsys.readouterr()
+
+      assert "(8/8)" in captured.out
+      # One being injected, one in the queue and one finished lookup waiting for room
+      assert max_waiting_for_injection <= 3
+
+  def test_reports_an_error_if_routing_fails_unexpectedly(self, capsys, red_api, ops_api, monkeypatch):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+
+    def get_reciprocal_tracker_for_file(source_torrent_path, *_args):
+      raise RuntimeError("Something broke")
+
+    monkeypatch.setattr("src.scanner.get_reciprocal_tracker_for_file", get_reciprocal_tracker_for_file)
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+      captured = capsys.readouterr()
+
+      assert f"{Fore.RED}Something broke{Fore.RESET}" in captured.out
+      assert f"{Fore.RED}Errors{Fore.RESET}: 2" in captured.out
+
+  def test_reports_an_error_if_a_lookup_fails_unexpectedly(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    def find_torrent(torrent_hash, should_retry=True, priority=INTERACTIVE):
+      raise RuntimeError("Something broke")
+
+    ops_api.find_torrent = find_torrent
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+      captured = capsys.readouterr()
+
+      assert "(1/1) red_source.torrent" in captured.out
+      assert "Something broke" in captured.out
+      assert f"{Fore.RED}Errors{Fore.RESET}: 1" in captured.out
+
+  def test_reads_each_torrent_once_while_looking_it_up(self, capsys, red_api, ops_api, monkeypatch):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    read_paths = []
+
+    def recording_get_raw_data(filename):
+      read_paths.append(filename)
+      return get_raw_data(filename)
+
+    monkeypatch.setattr("src.scanner.get_raw_data", recording_get_raw_data)
+    monkeypatch.setattr("src.torrent.get_raw_data", recording_get_raw_data)
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None))
+      captured = capsys.readouterr()
+
+      assert f"{Fore.LIGHTGREEN_EX}Generated for cross-seeding{Fore.RESET}: 1" in captured.out
+      assert read_paths == ["/tmp/input/red_source.torrent"]
+
+
+class TestScanTorrentDirectoryAsync(SetupTeardown):
+  def scan(self, red_api, ops_api, handler, injector=None, **kwargs):
+    transport = httpx.MockTransport(handler)
+
+    async def run():
+      async with red_api.asynchronous(transport) as async_red_api, ops_api.asynchronous(transport) as async_ops_api:
+        return await scan_torrent_directory_async(
+          "/tmp/input", "/tmp/output", async_red_api, async_ops_api, injector, **kwargs
+        )
+
+    return asyncio.run(run())
+
+  def tracker(self, request):
+    if request.url.params["action"] == "index":
+      return httpx.Response(200, json=self.ANNOUNCE_SUCCESS_RESPONSE)
+    return httpx.Response(200, json=self.TORRENT_SUCCESS_RESPONSE)
+
+  def test_gets_mad_if_input_directory_does_not_exist(self, red_api, ops_api):
+    with pytest.raises(FileNotFoundError):
+      asyncio.run(scan_torrent_directory_async("/tmp/nonexistent", "/tmp/output", red_api, ops_api, None))
+
+  def test_reports_progress_for_mix_of_torrents(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("ops_announce"), "/tmp/input/ops_announce.torrent")
+    copy_and_mkdir(get_torrent_path("no_source"), "/tmp/input/no_source.torrent")
+    copy_and_mkdir(get_torrent_path("broken"), "/tmp/input/broken.torrent")
+
+    report = self.scan(red_api, ops_api, self.tracker)
+
+    assert "Analyzed 3 local torrents" in report
+    assert f"{Fore.LIGHTGREEN_EX}Generated for cross-seeding{Fore.RESET}: 1" in report
+    assert f"{Fore.LIGHTBLACK_EX}Skipped{Fore.RESET}: 1" in report
+    assert f"{Fore.RED}Errors{Fore.RESET}: 1" in report
+    assert os.path.isfile("/tmp/output/RED/foo [RED].torrent")
+
+  def test_calls_injector_if_provided(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    injector = MagicMock()
+
+    self.scan(red_api, ops_api, self.tracker, injector)
+
+    injector.inject_torrent.assert_called_once_with(
+      "/tmp/input/red_source.torrent", "/tmp/output/OPS/foo [OPS].torrent", "OPS"
+    )
+
+  def test_looks_up_torrents_concurrently(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+    ops_torrent_data = get_bencoded_data("/tmp/input/ops_source.torrent")
+    ops_torrent_data[b"info"][b"name"] = b"something else"
+    save_bencoded_data("/tmp/input/ops_source.torrent", ops_torrent_data)
+    lookups_started = set()
+    both_started = asyncio.Event()
+
+    async def handler(request):
+      if request.url.params["action"] == "torrent":
+        lookups_started.add(request.url.host)
+        if len(lookups_started) == 2:
+          both_started.set()
+        # Only returns once both trackers are being asked at the same time
+        await asyncio.wait_for(both_started.wait(), 5)
+        return httpx.Response(200, json=self.TORRENT_KNOWN_BAD_RESPONSE)
+      return self.tracker(request)
+
+    report = self.scan(red_api, ops_api, handler)
+
+    assert lookups_started == {"redacted.ch", "orpheus.network"}
+    assert f"{Fore.LIGHTRED_EX}Not found{Fore.RESET}: 2" in report
+
+  def test_reports_an_error_if_a_lookup_fails_unexpectedly(self, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    def handler(_request):
+      raise RuntimeError("boom")
+
+    report = self.scan(red_api, ops_api, handler)
+
+    assert f"{Fore.RED}Errors{Fore.RESET}: 1" in report
+
+
+class TestCreateTorrentDirectoryWatcher(SetupTeardown):
+  def test_gets_mad_if_input_directory_does_not_exist(self, red_api, ops_api):
+    with pytest.raises(FileNotFoundError):
+      create_torrent_directory_watcher("/tmp/nonexistent", "/tmp/output", red_api, ops_api, None)
+
+  def test_scans_torrents_added_to_the_directory(self, capsys, red_api, ops_api):
+    watcher = create_torrent_directory_watcher("/tmp/input", "/tmp/output", red_api, ops_api, None)
+    watcher.settle_time = 0.05
+    thread = threading.Thread(target=watcher.run)
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      thread.start()
+      time.sleep(0.1)
+      copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+      deadline = time.monotonic() + 2
+      while not os.path.exists("/tmp/output/OPS/foo [OPS].torrent") and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+      watcher.stop()
+      thread.join()
+      captured = capsys.readouterr()
+
+      assert "red_source.torrent" in captured.out
+      assert "Cross-seed saved as '/tmp/output/OPS/foo [OPS].torrent'" in captured.out
+
+  def test_reports_torrents_that_could_not_be_scanned(self, capsys, red_api, ops_api):
+    watcher = create_torrent_directory_watcher("/tmp/input", "/tmp/output", red_api, ops_api, None)
+    watcher.settle_time = 0.05
+    thread = threading.Thread(target=watcher.run)
+
+    thread.start()
+    time.sleep(0.1)
+    copy_and_mkdir(get_torrent_path("no_source"), "/tmp/input/no_source.torrent")
+    time.sleep(0.3)
+    watcher.stop()
+    thread.join()
+    captured = capsys.readouterr()
+
+    assert (
+      f"{Fore.LIGHTBLACK_EX}Torrent not from OPS or RED based on source or announce URL{Fore.RESET}" in captured.out
+    )
+
+
+class TestScanTorrentDirectoryWithIndex(SetupTeardown):
+  def test_lists_generated_torrents(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, "/tmp/output/index.db"))
+      captured = capsys.readouterr()
+
+      assert (
+        f"{Fore.LIGHTGREEN_EX}Found with source 'OPS' and generated as '/tmp/output/OPS/foo [OPS].torrent'.{Fore.RESET}"
+        in captured.out
+      )
+      assert os.path.isfile("/tmp/output/index.db")
+
+  def test_considers_matching_input_torrents_as_already_existing(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+
+    print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, "/tmp/output/index.db"))
+    captured = capsys.readouterr()
+
+    assert f"{Fore.LIGHTYELLOW_EX}Already exists{Fore.RESET}: 2" in captured.out
+
+  def test_considers_matching_output_torrents_as_already_existing(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/output/ops_source.torrent")
+
+    print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, "/tmp/output/index.db"))
+    captured = capsys.readouterr()
+
+    assert f"{Fore.LIGHTYELLOW_EX}Torrent was previously generated.{Fore.RESET}" in captured.out
+
+  def test_reports_progress_for_mix_of_torrents(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("ops_announce"), "/tmp/input/ops_announce.torrent")
+    copy_and_mkdir(get_torrent_path("no_source"), "/tmp/input/no_source.torrent")
+    copy_and_mkdir(get_torrent_path("broken"), "/tmp/input/broken.torrent")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      print(scan_torrent_directory("/tmp/input", "/tmp/output", red_api, ops_api, None, "/tmp/output/index.db"))
+      captured = capsys.readouterr()
+
+      assert f"{Fore.LIGHTGREEN_EX}Generated for cross-seeding{Fore.RESET}: 1" in captured.out
+      assert f"{Fore.LIGHTBLACK_EX}Skipped{Fore.RESET}: 1" in captured.out
+      assert f"{Fore.RED}Errors{Fore.RESET}: 1" in captured.out
+
+  def test_finds_duplicates_among_torrents_modified_before_the_cutoff(self, capsys, red_api, ops_api):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+    copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/ops_source.torrent")
+    os.utime("/tmp/input/ops_source.torrent", (1000, 1000))
+
+    for _ in range(2):
+      print(
+        scan_torrent_directory(
+          "/tmp/input", "/tmp/output", red_api, ops_api, None, "/tmp/output/index.db", modified_after=2000
+        )
+      )
+      captured = capsys.readouterr()
+
+      assert "Analyzed 1 local torrent" in captured.out
+      assert "Torrent already exists in input directory at /tmp/input/ops_source.torrent" in captured.out
@@ -0,0 +1,76 @@
+import time
+import threading
+
+from .helpers import SetupTeardown
+
+from src.rate_limiter import TokenBucket
+from src.scheduler import INTERACTIVE, BACKGROUND, PriorityScheduler
+
+
+def start_waiting(scheduler, priority, granted):
+  waiter_count = len(scheduler._waiters)
+  thread = threading.Thread(target=lambda: (scheduler.acquire(priority), granted.append(priority)))
+  thread.start()
+
+  while len(scheduler._waiters) == waiter_count:
+    time.sleep(0.001)
+
+  return thread
+
+
+class TestPriorityScheduler(SetupTeardown):
+  def test_grants_immediately_when_a_token_is_available(self):
+    scheduler = PriorityScheduler(TokenBucket.from_interval(60))
+
+    start = time.monotonic()
+    scheduler.acquire(BACKGROUND)
+
+    assert time.monotonic() - start < 0.1
+    assert scheduler._waiters == []
+
+  def test_interactive_requests_jump_ahead_of_queued_background_requests(self):
+    scheduler = PriorityScheduler(TokenBucket.from_interval(0.1))
+    scheduler.acquire()
+    granted = []
+
+    threads = [
+      start_waiting(scheduler, BACKGROUND, granted),
+      start_waiting(scheduler, BACKGROUND, granted),
+      start_waiting(scheduler, INTERACTIVE, granted),
+    ]
+    for thread in threads:
+      thread.join()
+
+    assert granted == [INTERACTIVE, BACKGROUND, BACKGROUND]
+
+  def test_promotes_background_requests_that_waited_too_long(self):
+    scheduler = PriorityScheduler(TokenBucket.from_interval(0.1), max_wait=0)
+    scheduler.acquire()
+    granted = []
+
+    threads = [
+      start_waiting(scheduler, BACKGROUND, granted),
+      start_waiting(scheduler, INTERACTIVE, granted),
+    ]
+    for thread in threads:
+      thread.join()
+
+    assert granted == [BACKGROUND, INTERACTIVE]
+
+  def test_try_acquire_yields_to_higher_priority_waiters(self):
+    scheduler = PriorityScheduler(TokenBucket.from_interval(0.2))
+    scheduler.acquire()
+    granted = []
+
+    thread = start_waiting(scheduler, INTERACTIVE, granted)
+    time.sleep(0.25)
+
+    assert scheduler.try_acquire(BACKGROUND) is False
+    thread.join()
+    assert granted == [INTERACTIVE]
+
+  def test_try_acquire_competes_with_equal_priority_waiters(self):
+    scheduler = PriorityScheduler(TokenBucket.from_interval(60))
+
+    assert scheduler.try_acquire(BACKGROUND) is True
+    assert scheduler.try_acquire(BACKGROUND) is False
@@ -0,0 +1,154 @@
+import time
+import threading
+import pytest
+
+from .helpers import SetupTeardown
+
+from src.single_flight import SingleFlight
+
+
+def run_in_threads(count, fn):
+  results = [None] * count
+  threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, fn())) for i in range(count)]
+
+  for thread in threads:
+    thread.start()
+
+  return threads, results
+
+
+class TestSingleFlight(SetupTeardown):
+  def test_returns_the_result_of_the_call(self):
+    assert SingleFlight().do(["a"], lambda x, y=0: x + y, 1, y=2) == 3
+
+  def test_concurrent_calls_share_one_result(self):
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+      calls.append(1)
+      started.set()
+      release.wait(5)
+      return "result"
+
+    threads, results = run_in_threads(1, lambda: single_flight.do(["a"], work))
+    started.wait(5)
+    follower_threads, follower_results = run_in_threads(3, lambda: single_flight.do(["a"], work))
+    # Gives the followers time to attach to the call in flight
+    time.sleep(0.1)
+    release.set()
+
+    for thread in threads + follower_threads:
+      thread.join(5)
+
+    assert calls == [1]
+    assert results + follower_results == ["result"] * 4
+
+  def test_calls_sharing_any_key_are_collapsed(self):
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work(name):
+      calls.append(name)
+      started.set()
+      release.wait(5)
+      return name
+
+    threads, results = run_in_threads(1, lambda: single_flight.do(["a", "b"], work, "leader"))
+    started.wait(5)
+    follower_threads, follower_results = run_in_threads(1, lambda: single_flight.do(["c", "b"], work, "follower"))
+    time.sleep(0.1)
+    release.set()
+
+    for thread in threads + follower_threads:
+      thread.join(5)
+
+    assert calls == ["leader"]
+    assert follower_results == ["leader"]
+
+  def test_followers_get_the_exception_of_the_call(self):
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def fail():
+      started.set()
+      release.wait(5)
+      raise ValueError("boom")
+
+    def call():
+      try:
+        single_flight.do(["a"], fail)
+      except ValueError as e:
+        errors.append(e)
+
+    threads, _results = run_in_threads(1, call)
+    started.wait(5)
+    follower_threads, _results = run_in_threads(1, call)
+    time.sleep(0.1)
+    release.set()
+
+    for thread in threads + follower_threads:
+      thread.join(5)
+
+    assert len(errors) == 2
+    assert errors[0] is errors[1]
+
+  def test_followers_can_run_the_call_themselves_if_it_fails(self):
+    single_flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    errors = []
+
+    def work(name):
+      calls.append(name)
+      if name == "leader":
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+      return name
+
+    def lead():
+      try:
+        single_flight.do(["a"], work, "leader")
+      except ValueError as e:
+        errors.append(e)
+
+    threads, _results = run_in_threads(1, lead)
+    started.wait(5)
+    follower_threads, follower_results = run_in_threads(
+      1, lambda: single_flight.do(["a"], work, "follower", rerun_if=lambda e: isinstance(e, ValueError))
+    )
+    time.sleep(0.1)
+    release.set()
+
+    for thread in threads + follower_threads:
+      thread.join(5)
+
+    assert calls == ["leader", "follower"]
+    assert follower_results == ["follower"]
+    assert len(errors) == 1
+
+  def test_calls_run_again_once_the_previous_call_has_finished(self):
+    single_flight = SingleFlight()
+    calls = []
+
+    single_flight.do(["a"], calls.append, 1)
+    single_flight.do(["a"], calls.append, 2)
+
+    assert calls == [1, 2]
+
+  def test_forgets_keys_of_failed_calls(self):
+    single_flight = SingleFlight()
+
+    with pytest.raises(ValueError):
+      single_flight.do(["a"], int, "not a number")
+
+    assert single_flight.do(["a"], int, "1") == 1
@@ -1,5 +1,7 @@
 import os
 import re
+import time
+import threading
 import pytest
 import requests_mock
 
@@ -7,7 +9,15 @@ from .helpers import get_torrent_path, SetupTeardown, copy_and_mkdir
 
 from src.trackers import RedTracker
 from src.parser import get_bencoded_data
-from src.errors import TorrentAlreadyExistsError, TorrentDecodingError, UnknownTrackerError, TorrentNotFoundError
+from src.errors import (
+  TorrentAlreadyExistsError,
+  TorrentDecodingError,
+  UnknownTrackerError,
+  TorrentNotFoundError,
+  TrackerUnavailableError,
+)
+from src.probe_stats import SourceFlagStats
+from src.scheduler import BACKGROUND, INTERACTIVE
 from src.torrent import generate_new_torrent_from_file
 
 
@@ -202,3 +212,132 @@ class TestGenerateNewTorrentFromFile(SetupTeardown):
       generate_new_torrent_from_file(torrent_path, "/tmp", red_api, ops_api)
 
     assert str(excinfo.value) == "Error decoding torrent file"
+
+  def test_probes_the_most_likely_source_first(self, red_api, ops_api):
+    probe_stats = SourceFlagStats("/tmp/probe_stats.db")
+    probe_stats.record_hit("RED", b"OPS", b"")
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      torrent_path = get_torrent_path("ops_source")
+      _, filepath, _ = generate_new_torrent_from_file(torrent_path, "/tmp", red_api, ops_api, probe_stats=probe_stats)
+
+      assert filepath == "/tmp/RED/foo.torrent"
+      assert len([request for request in m.request_history if "action=torrent" in request.url]) == 1
+
+    os.remove(filepath)
+    probe_stats.close()
+    os.remove("/tmp/probe_stats.db")
+
+  def test_records_which_source_was_found(self, red_api, ops_api):
+    probe_stats = SourceFlagStats("/tmp/probe_stats.db")
+
+    with requests_mock.Mocker() as m:
+      m.get(
+        re.compile("action=torrent"),
+        [{"json": self.TORRENT_KNOWN_BAD_RESPONSE}, {"json": self.TORRENT_SUCCESS_RESPONSE}],
+      )
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      torrent_path = get_torrent_path("ops_source")
+      _, filepath, _ = generate_new_torrent_from_file(torrent_path, "/tmp", red_api, ops_api, probe_stats=probe_stats)
+
+      assert list(probe_stats.order_variants("RED", b"OPS", {b"RED": "a", b"PTH": "b", b"": "c"})) == [
+        b"PTH",
+        b"RED",
+        b"",
+      ]
+
+    os.remove(filepath)
+    probe_stats.close()
+    os.remove("/tmp/probe_stats.db")
+
+  def test_concurrent_calls_for_the_same_torrent_share_one_lookup(self, red_api, ops_api):
+    release = threading.Event()
+    lookups = []
+
+    def find_torrent(infohash, **_kwargs):
+      lookups.append(infohash)
+      release.wait(5)
+      return self.TORRENT_SUCCESS_RESPONSE
+
+    ops_api.find_torrent = find_torrent
+    results = []
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      torrent_path = get_torrent_path("red_source")
+      threads = [
+        threading.Thread(
+          target=lambda: results.append(generate_new_torrent_from_file(torrent_path, "/tmp", red_api, ops_api))
+        )
+        for _ in range(3)
+      ]
+      for thread in threads:
+        thread.start()
+
+      time.sleep(0.1)
+      release.set()
+      for thread in threads:
+        thread.join(5)
+
+    assert len(lookups) == 1
+    assert len(results) == 3
+    assert all(result == results[0] for result in results)
+
+    os.remove(results[0][1])
+
+  def test_retrying_caller_makes_the_lookup_itself_if_the_one_it_shares_gives_up(self, red_api, ops_api):
+    scan_started = threading.Event()
+    release = threading.Event()
+    lookups = []
+
+    def find_torrent(infohash, should_retry=True, priority=INTERACTIVE):
+      lookups.append((should_retry, priority))
+      if should_retry:
+        return self.TORRENT_SUCCESS_RESPONSE
+
+      scan_started.set()
+      release.wait(5)
+      raise TrackerUnavailableError("Request timed out on OPS")
+
+    ops_api.find_torrent = find_torrent
+    errors = []
+    webhook_results = []
+
+    def scan():
+      try:
+        generate_new_torrent_from_file(torrent_path, "/tmp", red_api, ops_api, should_retry=False, priority=BACKGROUND)
+      except TrackerUnavailableError as e:
+        errors.append(e)
+
+    def webhook():
+      webhook_results.append(generate_new_torrent_from_file(torrent_path, "/tmp", red_api, ops_api))
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      torrent_path = get_torrent_path("red_source")
+      scan_thread = threading.Thread(target=scan)
+      scan_thread.start()
+      scan_started.wait(5)
+      webhook_thread = threading.Thread(target=webhook)
+      webhook_thread.start()
+      # Gives the webhook time to join the scan's lookup rather than start its own
+      time.sleep(0.1)
+
+      assert lookups == [(False, BACKGROUND)]
+
+      release.set()
+      scan_thread.join(5)
+      webhook_thread.join(5)
+
+    _, filepath, _ = webhook_results[0]
+    assert os.path.isfile(filepath)
+    assert len(errors) == 1
+    assert lookups == [(False, BACKGROUND), (True, INTERACTIVE)]
+
+    os.remove(filepath)
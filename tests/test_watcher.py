@@ -0,0 +1,149 @@
+import os
+import time
+import pytest
+import threading
+
+from .helpers import SetupTeardown, get_torrent_path, copy_and_mkdir
+
+from src.inotify import Inotify, IN_CLOSE_WRITE
+from src.watcher import TorrentDirectoryWatcher
+
+
+class RunningWatcher:
+  def __init__(self, directory, **kwargs):
+    self.seen = []
+    self.watcher = TorrentDirectoryWatcher(directory, self.seen.append, settle_time=0.05, **kwargs)
+    self.thread = threading.Thread(target=self.watcher.run)
+
+  def __enter__(self):
+    self.thread.start()
+    # Gives the watcher time to add its watches before the test touches any files
+    time.sleep(0.1)
+    return self
+
+  def __exit__(self, *_args):
+    self.watcher.stop()
+    self.thread.join()
+
+  def wait_for(self, count, timeout=2):
+    deadline = time.monotonic() + timeout
+    while len(self.seen) < count and time.monotonic() < deadline:
+      time.sleep(0.01)
+
+    return self.seen
+
+
+class TestInotify(SetupTeardown):
+  def test_reads_events_for_watched_directory(self):
+    with Inotify() as inotify:
+      wd = inotify.add_watch("/tmp/input", IN_CLOSE_WRITE)
+      copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+      events = inotify.read_events()
+
+    assert (wd, IN_CLOSE_WRITE, 0, "red_source.torrent") in events
+
+  def test_returns_no_events_when_nothing_happened(self):
+    with Inotify() as inotify:
+      inotify.add_watch("/tmp/input", IN_CLOSE_WRITE)
+
+      assert inotify.read_events() == []
+
+  def test_raises_for_missing_directories(self):
+    with Inotify() as inotify:
+      with pytest.raises(FileNotFoundError):
+        inotify.add_watch("/tmp/input/missing", IN_CLOSE_WRITE)
+
+
+class TestTorrentDirectoryWatcher(SetupTeardown):
+  def test_hands_off_new_torrents(self):
+    with RunningWatcher("/tmp/input") as running:
+      copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/red_source.torrent")
+
+      assert running.wait_for(1) == ["/tmp/input/red_source.torrent"]
+
+  def test_ignores_existing_and_other_files(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/existing.torrent")
+
+    with RunningWatcher("/tmp/input") as running:
+      with open("/tmp/input/notes.txt", "w") as f:
+        f.write("hello")
+      os.utime("/tmp/input/existing.torrent")
+      time.sleep(0.2)
+
+      assert running.seen == []
+
+  def test_rescans_changed_torrents(self):
+    copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/existing.torrent")
+
+    with RunningWatcher("/tmp/input") as running:
+      copy_and_mkdir(get_torrent_path("ops_source"), "/tmp/input/existing.torrent")
+
+      assert running.wait_for(1) == ["/tmp/input/existing.torrent"]
+
+  def test_waits_for_partially_written_files_to_settle(self):
+    with RunningWatcher("/tmp/input") as running:
+      with open("/tmp/input/slow.torrent", "wb") as f:
+        for _ in range(5):
+          f.write(b"x")
+          f.flush()
+          time.sleep(0.03)
+
+        assert running.seen == []
+
+      assert running.wait_for(1) == ["/tmp/input/slow.torrent"]
+
+  def test_waits_for_fastresume_sidecar_in_bt_backup_directories(self):
+    os.makedirs("/tmp/input/BT_backup")
+    open("/tmp/input/BT_backup/other.fastresume", "w").close()
+
+    with RunningWatcher("/tmp/input", recursive=True) as running:
+      copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/BT_backup/abc.torrent")
+      time.sleep(0.2)
+      assert running.seen == []
+
+      open("/tmp/input/BT_backup/abc.fastresume", "w").close()
+
+      assert running.wait_for(1) == ["/tmp/input/BT_backup/abc.torrent"]
+
+  def test_gives_up_on_missing_sidecars_after_timeout(self):
+    os.makedirs("/tmp/input/BT_backup")
+    open("/tmp/input/BT_backup/other.fastresume", "w").close()
+
+    with RunningWatcher("/tmp/input", recursive=True, sidecar_timeout=0.2) as running:
+      copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/BT_backup/abc.torrent")
+
+      assert running.wait_for(1) == ["/tmp/input/BT_backup/abc.torrent"]
+
+  def test_watches_new_subdirectories_if_recursive(self):
+    with RunningWatcher("/tmp/input", recursive=True) as running:
+      os.makedirs("/tmp/input/nested/deeper")
+      time.sleep(0.1)
+      copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/nested/deeper/red_source.torrent")
+
+      assert running.wait_for(1) == ["/tmp/input/nested/deeper/red_source.torrent"]
+
+  def test_ignores_subdirectories_if_not_recursive(self):
+    with RunningWatcher("/tmp/input") as running:
+      copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/nested/red_source.torrent")
+      time.sleep(0.2)
+
+      assert running.seen == []
+
+  def test_applies_include_and_exclude_globs(self):
+    with RunningWatcher("/tmp/input", include=["keep*"], exclude=["*skip*"]) as running:
+      copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/other.torrent")
+      copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/keep_skip.torrent")
+      copy_and_mkdir(get_torrent_path("red_source"), "/tmp/input/keep.torrent")
+
+      assert running.wait_for(1) == ["/tmp/input/keep.torrent"]
+      time.sleep(0.1)
+      assert running.seen == ["/tmp/input/keep.torrent"]
+
+  def test_stops_while_idle(self):
+    running = RunningWatcher("/tmp/input")
+
+    with running:
+      pass
+
+    assert not running.thread.is_alive()
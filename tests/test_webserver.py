@@ -1,15 +1,22 @@
 import re
 import os
+import json
 import pytest
+import threading
 import requests_mock
 
+from prometheus_client import CONTENT_TYPE_LATEST
+
 from .helpers import SetupTeardown, get_torrent_path, copy_and_mkdir
 
+from src.jobs import JobQueue
+from src.metrics import WEBHOOK_QUEUE_DEPTH, set_enabled
 from src.webserver import app as webserver_app
 
 
 @pytest.fixture()
 def app(red_api, ops_api):
+  job_queue = JobQueue(workers=2)
   webserver_app.config.update(
     {
       "input_dir": "/tmp/input",
@@ -17,11 +24,14 @@ def app(red_api, ops_api):
       "red_api": red_api,
       "ops_api": ops_api,
       "injector": None,
+      "job_queue": job_queue,
     }
   )
 
   yield webserver_app
 
+  job_queue.shutdown()
+
 
 @pytest.fixture()
 def client(app):
@@ -69,7 +79,7 @@ class TestWebserverWebhook(SetupTeardown):
       m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
       m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
 
-      response = client.post("/api/webhook", data={"infohash": infohash})
+      response = client.post("/api/webhook?wait=5", data={"infohash": infohash})
       assert response.status_code == 201
       assert response.json == {"status": "success", "message": "/tmp/output/OPS/foo [OPS].torrent"}
       assert os.path.exists("/tmp/output/OPS/foo [OPS].torrent")
@@ -82,7 +92,7 @@ class TestWebserverWebhook(SetupTeardown):
       m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
       m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
 
-      response = client.post("/api/webhook", data={"infohash": infohash})
+      response = client.post("/api/webhook?wait=5", data={"infohash": infohash})
       assert response.status_code == 201
       assert response.json == {"status": "success", "message": "/tmp/output/OPS/foo [OPS].torrent"}
 
@@ -93,7 +103,7 @@ class TestWebserverWebhook(SetupTeardown):
       m.get(re.compile("action=torrent"), json=self.TORRENT_KNOWN_BAD_RESPONSE)
       m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
 
-      response = client.post("/api/webhook", data={"infohash": infohash})
+      response = client.post("/api/webhook?wait=5", data={"infohash": infohash})
       assert response.status_code == 404
       assert response.json == {"status": "error", "message": "Torrent could not be found on OPS"}
 
@@ -104,6 +114,146 @@ class TestWebserverWebhook(SetupTeardown):
       m.get(re.compile("action=torrent"), json=self.TORRENT_UNKNOWN_BAD_RESPONSE)
       m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
 
-      response = client.post("/api/webhook", data={"infohash": infohash})
+      response = client.post("/api/webhook?wait=5", data={"infohash": infohash})
       assert response.status_code == 500
       assert response.json == {"status": "error", "message": "An unknown error occurred in the API response from OPS"}
+
+  def test_queues_a_job_and_responds_straight_away(self, client, infohash):
+    copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{infohash}.torrent")
+    release_lookup = threading.Event()
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=lambda *_args: release_lookup.wait(5) and self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      response = client.post("/api/webhook", data={"infohash": infohash})
+      job_id = response.json["job_id"]
+
+      assert response.status_code == 202
+      assert response.json["status"] in ("queued", "running")
+      assert response.headers["Location"] == f"/api/jobs/{job_id}"
+
+      release_lookup.set()
+      response = client.get(f"/api/jobs/{job_id}?wait=5")
+
+      assert response.status_code == 201
+      assert response.json == {"status": "success", "message": "/tmp/output/OPS/foo [OPS].torrent"}
+
+  def test_rejects_invalid_wait_parameter(self, client, infohash):
+    copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{infohash}.torrent")
+
+    for wait_time in ("soon", "-1", "inf", "nan"):
+      response = client.post(f"/api/webhook?wait={wait_time}", data={"infohash": infohash})
+
+      assert response.status_code == 400
+      assert response.json == {"status": "error", "message": "Invalid 'wait' parameter"}
+
+
+class TestWebserverWebhookBatch(SetupTeardown):
+  def test_requires_a_json_array(self, client):
+    responses = [
+      client.post("/api/webhook/batch", data="not json", content_type="application/json"),
+      client.post("/api/webhook/batch", json={"infohash": "abc"}),
+    ]
+
+    for response in responses:
+      assert response.status_code == 400
+      assert response.json == {"status": "error", "message": "Request body must be a JSON array of infohashes"}
+
+  def test_streams_a_result_for_each_unique_infohash(self, client, infohash):
+    copy_and_mkdir(get_torrent_path("red_source"), f"/tmp/input/{infohash}.torrent")
+    missing_infohash = "1" * 40
+
+    with requests_mock.Mocker() as m:
+      m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+      m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+      response = client.post("/api/webhook/batch", json=[infohash, "abc", missing_infohash, infohash.upper()])
+      lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert sorted(lines, key=lambda line: line["code"]) == [
+      {"infohash": infohash, "code": 201, "status": "success", "message": "/tmp/output/OPS/foo [OPS].torrent"},
+      {"infohash": "abc", "code": 400, "status": "error", "message": "Invalid infohash"},
+      {
+        "infohash": missing_infohash,
+        "code": 404,
+        "status": "error",
+        "message": f"No torrent found at /tmp/input/{missing_infohash}.torrent",
+      },
+    ]
+
+  def test_streams_nothing_for_an_empty_array(self, client):
+    response = client.post("/api/webhook/batch", json=[])
+
+    assert response.status_code == 200
+    assert response.get_data() == b""
+
+
+class TestWebserverJobStatus(SetupTeardown):
+  def test_returns_not_found_for_unknown_jobs(self, client):
+    response = client.get("/api/jobs/does-not-exist")
+
+    assert response.status_code == 404
+    assert response.json == {"status": "error", "message": "Job not found"}
+
+  def test_returns_accepted_while_job_is_pending(self, app, client):
+    release_job = threading.Event()
+    job = app.config["job_queue"].submit(lambda: release_job.wait(5) and ({"status": "success"}, 201))
+
+    response = client.get(f"/api/jobs/{job.id}?wait=0.05")
+
+    assert response.status_code == 202
+    assert response.json["job_id"] == job.id
+
+    release_job.set()
+    job.wait(5)
+    response = client.get(f"/api/jobs/{job.id}")
+
+    assert response.status_code == 201
+    assert response.json == {"status": "success"}
+
+  def test_returns_server_error_for_jobs_that_raised(self, app, client):
+    def fail():
+      raise Exception("boom")
+
+    job = app.config["job_queue"].submit(fail)
+    job.wait(5)
+
+    response = client.get(f"/api/jobs/{job.id}")
+
+    assert response.status_code == 500
+    assert response.json == {"status": "error", "message": "boom"}
+
+
+class TestWebserverMetrics(SetupTeardown):
+  def test_serves_metrics_in_the_prometheus_format(self, app, client):
+    WEBHOOK_QUEUE_DEPTH.set_function(lambda: app.config["job_queue"].pending_count)
+    response = client.get("/metrics")
+    body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.content_type == CONTENT_TYPE_LATEST
+    assert "# TYPE fertilizer_api_requests_total counter" in body
+    assert "fertilizer_webhook_queue_depth 0.0\n" in body
+
+    WEBHOOK_QUEUE_DEPTH.set_function(lambda: 0)
+
+  def test_counts_tracker_api_requests(self, app, client, infohash):
+    set_enabled(True)
+    torrent_path = get_torrent_path("red_source")
+    copy_and_mkdir(torrent_path, f"/tmp/input/{infohash}.torrent")
+
+    try:
+      with requests_mock.Mocker() as m:
+        m.get(re.compile("action=torrent"), json=self.TORRENT_SUCCESS_RESPONSE)
+        m.get(re.compile("action=index"), json=self.ANNOUNCE_SUCCESS_RESPONSE)
+
+        client.post("/api/webhook?wait=5", data={"infohash": infohash})
+        body = client.get("/metrics").get_data(as_text=True)
+    finally:
+      set_enabled(False)
+
+    assert 'fertilizer_api_requests_total{action="torrent",outcome="success",tracker="OPS"}' in body
+    assert 'fertilizer_api_request_duration_seconds_count{action="torrent",tracker="OPS"}' in body